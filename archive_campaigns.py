@@ -0,0 +1,263 @@
+import argparse
+import re
+import time
+
+from sqlalchemy import text
+from database import engine
+
+# Arquiva campanhas encerradas. responses/answers são particionadas por faixa de application_id
+# (migração 0006, 1000 aplicações por partição). Uma campanha (aplicação) está encerrada quando
+# tem respostas, não recebe nenhuma há --idle-days dias e todo avaliador designado já respondeu.
+# Há dois caminhos:
+#   - partição inteira: nenhuma aplicação nova cai mais na faixa e todas as aplicações dela estão
+#     encerradas (ou já arquivadas); a partição sai de responses (DETACH) e vai para o schema
+#     archive, sem copiar linhas
+#   - por campanha: aplicações encerradas numa faixa ainda viva (inclusive instalações com menos de
+#     1000 aplicações) têm as respostas movidas para archive.responses_campaigns
+# Nos dois casos:
+#   1. as contagens por (grupo, valor) vão para application_score_summaries (relatórios seguem iguais)
+#   2. as respostas em linhas são compactadas em answer_values (smallint[], um array por resposta)
+#      e as linhas de answers são apagadas; não há compressão além disso (o Postgres aplica TOAST
+#      nos arrays grandes)
+#   python archive_campaigns.py --list
+#   python archive_campaigns.py --idle-days 180 --dry-run
+
+LIST_PARTITIONS = text("""
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'public.responses'::regclass
+    ORDER BY c.relname
+""")
+
+# Tabela das campanhas arquivadas uma a uma (mesmas colunas de responses, como as partições arquivadas)
+CAMPAIGNS_TABLE = "archive.responses_campaigns"
+
+# Todas as consultas abaixo valem para as aplicações em :app_ids dentro de uma partição
+SUMMARIZE = """
+    INSERT INTO application_score_summaries (application_id, group_name, value, answers)
+    SELECT application_id, group_name, value, sum(n) FROM (
+        SELECT a.application_id, COALESCE(g.name, '') AS group_name, a.value, count(*) AS n
+        FROM {answers} a
+        JOIN {responses} r ON r.id = a.response_id AND r.answer_values IS NULL
+        JOIN questions q ON q.id = a.question_id
+        LEFT JOIN question_groups g ON g.id = q.group_id
+        WHERE a.application_id = ANY(:app_ids)
+        GROUP BY 1, 2, 3
+        UNION ALL
+        SELECT r.application_id, COALESCE(g.name, ''), v.value, count(*)
+        FROM {responses} r
+        CROSS JOIN LATERAL unnest(r.answer_values) WITH ORDINALITY AS v(value, pos)
+        JOIN (
+            SELECT id, form_id, group_id, row_number() OVER (PARTITION BY form_id ORDER BY id) AS pos
+            FROM questions
+        ) q ON q.form_id = r.form_id AND q.pos = v.pos
+        LEFT JOIN question_groups g ON g.id = q.group_id
+        WHERE r.application_id = ANY(:app_ids) AND r.answer_values IS NOT NULL AND v.value IS NOT NULL
+        GROUP BY 1, 2, 3
+    ) tally
+    GROUP BY 1, 2, 3
+"""
+
+RECORD_ARCHIVES = """
+    INSERT INTO application_archives (application_id, partition_name, response_count, answer_count, archived_at)
+    SELECT a.id, :partition, COALESCE(r.n, 0), COALESCE(s.n, 0), :now
+    FROM applications a
+    LEFT JOIN (SELECT application_id, count(*) AS n FROM {responses} WHERE application_id = ANY(:app_ids) GROUP BY 1) r ON r.application_id = a.id
+    LEFT JOIN (SELECT application_id, sum(answers) AS n FROM application_score_summaries WHERE application_id = ANY(:app_ids) GROUP BY 1) s ON s.application_id = a.id
+    WHERE a.id = ANY(:app_ids)
+"""
+
+# Mesmo layout de pack_answers.py: valores alinhados às perguntas do formulário ordenadas por id
+PACK = """
+    UPDATE {responses} r
+    SET answer_values = ARRAY(
+        SELECT (
+            SELECT a.value FROM {answers} a
+            WHERE a.response_id = r.id AND a.question_id = q.id
+            ORDER BY a.id LIMIT 1
+        )::smallint
+        FROM questions q
+        WHERE q.form_id = r.form_id
+        ORDER BY q.id
+    )
+    WHERE r.application_id = ANY(:app_ids)
+      AND r.answer_values IS NULL
+      AND EXISTS (SELECT 1 FROM {answers} a WHERE a.response_id = r.id)
+"""
+
+# Caminho por campanha: respostas (já compactadas) vão para CAMPAIGNS_TABLE e saem da partição viva
+MOVE_RESPONSES = """
+    INSERT INTO {campaigns} (id, application_id, form_id, evaluator_id, created_at, idempotency_key, answer_values)
+    SELECT id, application_id, form_id, evaluator_id, created_at, idempotency_key, answer_values
+    FROM {responses} WHERE application_id = ANY(:app_ids)
+"""
+
+# Condição de campanha encerrada para a aplicação "a": tem respostas, nenhuma desde :cutoff e
+# nenhum avaliador designado sem resposta (arquivar recusaria a resposta dele com 409)
+CLOSED_APPLICATION = """
+    EXISTS (SELECT 1 FROM {responses} r WHERE r.application_id = a.id)
+    AND NOT EXISTS (SELECT 1 FROM {responses} r WHERE r.application_id = a.id AND r.created_at >= :cutoff)
+    AND NOT EXISTS (
+        SELECT 1 FROM application_evaluators ae
+        WHERE ae.application_id = a.id
+          AND NOT EXISTS (SELECT 1 FROM {responses} r WHERE r.application_id = a.id AND r.evaluator_id = ae.user_id)
+    )
+"""
+
+# Aplicações da faixa ainda não arquivadas que não estão encerradas (a partição só sai inteira com zero)
+OPEN_APPLICATIONS = """
+    SELECT count(*) FROM applications a
+    WHERE a.id >= :lo AND a.id < :hi
+      AND NOT EXISTS (SELECT 1 FROM application_archives x WHERE x.application_id = a.id)
+      AND NOT ({closed})
+"""
+
+# Campanhas encerradas de uma faixa (as já arquivadas não têm linhas vivas)
+IDLE_APPLICATIONS = """
+    SELECT a.id, max(r.created_at), count(*)
+    FROM applications a JOIN {responses} r ON r.application_id = a.id
+    WHERE a.id >= :lo AND a.id < :hi AND {closed}
+    GROUP BY 1
+    ORDER BY 1
+"""
+
+def open_applications(conn, name: str, lo: int, hi: int, cutoff: int) -> int:
+    sql = OPEN_APPLICATIONS.format(closed=CLOSED_APPLICATION.format(responses=name))
+    return conn.execute(text(sql), {"lo": lo, "hi": hi, "cutoff": cutoff}).scalar()
+
+def list_partitions(conn, idle_days: float):
+    # [(nome, lo, hi, última resposta, arquivável)]
+    max_app_id = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM applications")).scalar()
+    cutoff = int(time.time() - idle_days * 86400)
+    partitions = []
+    for name, bound in conn.execute(LIST_PARTITIONS):
+        lo, hi = (int(v) for v in re.findall(r"\d+", bound))
+        last = conn.execute(text(f"SELECT MAX(created_at) FROM {name}")).scalar()
+        # Aplicações novas sempre têm id maior: a faixa está fechada se já há ids além dela.
+        # Uma aplicação sem resposta ou com avaliador pendente mantém a partição viva.
+        closed = hi <= max_app_id + 1 and open_applications(conn, name, lo, hi, cutoff) == 0
+        partitions.append((name, lo, hi, last, closed))
+    return partitions
+
+def list_idle_applications(conn, idle_days: float, partitions):
+    # {partição: [(application_id, última resposta, respostas)]} das campanhas encerradas em partições
+    # que não serão arquivadas inteiras
+    cutoff = int(time.time() - idle_days * 86400)
+    idle = {}
+    for name, lo, hi, _, closed in partitions:
+        if closed:
+            continue
+        sql = IDLE_APPLICATIONS.format(responses=name, closed=CLOSED_APPLICATION.format(responses=name))
+        apps = conn.execute(text(sql), {"lo": lo, "hi": hi, "cutoff": cutoff}).all()
+        if apps:
+            idle[name] = [tuple(row) for row in apps]
+    return idle
+
+def unarchived_ids(conn, lo: int, hi: int):
+    return [row[0] for row in conn.execute(text("""
+        SELECT id FROM applications a
+        WHERE id >= :lo AND id < :hi
+          AND NOT EXISTS (SELECT 1 FROM application_archives x WHERE x.application_id = a.id)
+    """), {"lo": lo, "hi": hi})]
+
+def summarize(conn, name: str, app_ids, archived_to: str):
+    # Passos comuns aos dois caminhos; devolve quantas respostas foram compactadas.
+    # archived_to: tabela do schema archive onde as respostas vão ficar (application_archives.partition_name)
+    answers = name.replace("responses_", "answers_", 1)
+    tables = {"responses": name, "answers": answers}
+    params = {"app_ids": app_ids}
+    conn.execute(text(SUMMARIZE.format(**tables)), params)
+    conn.execute(text(RECORD_ARCHIVES.format(**tables)), {**params, "partition": archived_to, "now": int(time.time())})
+    return conn.execute(text(PACK.format(**tables)), params).rowcount
+
+def archive_partition(name: str, lo: int, hi: int, idle_days: float):
+    answers = name.replace("responses_", "answers_", 1)
+    cutoff = int(time.time() - idle_days * 86400)
+    with engine.begin() as conn:
+        # Mesmo bloqueio do caminho por campanha; se alguma aplicação recebeu resposta ou avaliador
+        # depois da listagem, a partição fica para a próxima execução
+        conn.execute(text("SELECT id FROM applications WHERE id >= :lo AND id < :hi ORDER BY id FOR UPDATE"), {"lo": lo, "hi": hi})
+        if open_applications(conn, name, lo, hi, cutoff):
+            return None
+        packed = summarize(conn, name, unarchived_ids(conn, lo, hi), name)
+        conn.execute(text(f"ALTER TABLE answers DETACH PARTITION {answers}"))
+        conn.execute(text(f"DROP TABLE {answers}"))
+        conn.execute(text(f"ALTER TABLE responses DETACH PARTITION {name}"))
+        conn.execute(text(f"ALTER TABLE {name} SET SCHEMA archive"))
+    # Reescreve a partição sem as versões antigas das linhas compactadas
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM FULL ANALYZE archive.{name}"))
+    return packed
+
+def archive_applications(name: str, app_ids, idle_days: float):
+    answers = name.replace("responses_", "answers_", 1)
+    cutoff = int(time.time() - idle_days * 86400)
+    with engine.begin() as conn:
+        # FOR UPDATE bloqueia novas respostas (a FK delas trava a aplicação em FOR KEY SHARE);
+        # a campanha que recebeu resposta depois da listagem deixa de ser alvo
+        conn.execute(text("SELECT id FROM applications WHERE id = ANY(:app_ids) ORDER BY id FOR UPDATE"), {"app_ids": app_ids})
+        closed = CLOSED_APPLICATION.format(responses=name)
+        app_ids = [row[0] for row in conn.execute(text(f"""
+            SELECT a.id FROM applications a WHERE a.id = ANY(:app_ids) AND {closed} ORDER BY 1
+        """), {"app_ids": app_ids, "cutoff": cutoff})]
+        if not app_ids:
+            return 0, 0
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {CAMPAIGNS_TABLE} (LIKE public.responses INCLUDING DEFAULTS)"))
+        packed = summarize(conn, name, app_ids, CAMPAIGNS_TABLE.split(".", 1)[1])
+        conn.execute(text(MOVE_RESPONSES.format(campaigns=CAMPAIGNS_TABLE, responses=name)), {"app_ids": app_ids})
+        conn.execute(text(f"DELETE FROM {answers} WHERE application_id = ANY(:app_ids)"), {"app_ids": app_ids})
+        conn.execute(text(f"DELETE FROM {name} WHERE application_id = ANY(:app_ids)"), {"app_ids": app_ids})
+    # A partição continua viva: VACUUM simples devolve o espaço das linhas apagadas para reuso
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"VACUUM ANALYZE {name}"))
+        conn.execute(text(f"VACUUM ANALYZE {answers}"))
+    return len(app_ids), packed
+
+def archive_campaigns(idle_days: float, dry_run: bool = False, show_only: bool = False):
+    with engine.connect() as conn:
+        partitions = list_partitions(conn, idle_days)
+        idle_apps = list_idle_applications(conn, idle_days, partitions)
+
+    print(f"{len(partitions)} partições vivas (inativas há {idle_days:g} dias = arquiváveis):")
+    for name, lo, hi, last, closed in partitions:
+        last_txt = time.strftime("%Y-%m-%d", time.localtime(last)) if last else "sem respostas"
+        apps_txt = f"[{len(idle_apps[name])} campanha(s) encerrada(s)]" if name in idle_apps else ""
+        print(f"  {name}  aplicações {lo}-{hi - 1}  última resposta: {last_txt}  {'[arquivável]' if closed else apps_txt}")
+    if show_only:
+        return
+
+    targets = [(name, lo, hi) for name, lo, hi, _, closed in partitions if closed]
+    app_count = sum(len(apps) for apps in idle_apps.values())
+    if not targets and not idle_apps:
+        print("\nNenhuma campanha para arquivar.")
+        return
+    if dry_run:
+        print(f"\n--dry-run: {len(targets)} partição(ões) inteira(s) e {app_count} campanha(s) avulsa(s) seriam arquivadas.")
+        return
+
+    for name, lo, hi in targets:
+        try:
+            packed = archive_partition(name, lo, hi, idle_days)
+            if packed is None:
+                print(f" -> {name} recebeu respostas ou avaliadores desde a listagem, fica para a próxima execução")
+            else:
+                print(f" -> {name} arquivada em archive.{name} ({packed} respostas compactadas)")
+        except Exception as e:
+            print(f"\n[ERRO] Falha ao arquivar {name}: {e}")
+            return
+    for name, apps in idle_apps.items():
+        try:
+            moved, packed = archive_applications(name, [app_id for app_id, _, _ in apps], idle_days)
+            print(f" -> {moved} campanha(s) de {name} movidas para {CAMPAIGNS_TABLE} ({packed} respostas compactadas)")
+        except Exception as e:
+            print(f"\n[ERRO] Falha ao arquivar campanhas de {name}: {e}")
+            return
+    print("\nSucesso! Pontuações das campanhas arquivadas seguem disponíveis nos relatórios.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva partições de campanhas encerradas (responses/answers)")
+    parser.add_argument("--idle-days", type=float, default=180, help="Dias sem respostas para considerar a campanha encerrada")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra o que seria arquivado")
+    parser.add_argument("--list", action="store_true", help="Lista as partições e sai")
+    args = parser.parse_args()
+    archive_campaigns(args.idle_days, args.dry_run, args.list)
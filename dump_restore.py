@@ -0,0 +1,286 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+import models
+from database import SQLALCHEMY_DATABASE_URL
+from schema_migrations import apply_migrations, current_version, LATEST_VERSION
+
+# Cópia completa dos dados do SAAN via COPY binário, uma stream por tabela em paralelo.
+#   python dump_restore.py dump backups/2026-10-19 --jobs 4
+#   python dump_restore.py restore backups/2026-10-19 --jobs 4 [--clean]
+# O dump usa um snapshot exportado (pg_export_snapshot), então todas as tabelas são do mesmo
+# instante. O restore aplica as migrações, confere os checksums, carrega na ordem das FKs e
+# ressincroniza todas as sequências.
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 1
+
+class HashingWriter:
+    # Arquivo de saída que calcula sha256 e tamanho enquanto o COPY escreve
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def table_levels():
+    # Tabelas públicas em níveis de dependência: cada nível só referencia níveis anteriores
+    levels = {}
+    for table in models.Base.metadata.sorted_tables:
+        parents = {fk.column.table.name for fk in table.foreign_keys if fk.column.table is not table}
+        levels[table.name] = 1 + max((levels[p] for p in parents), default=-1)
+    grouped = [[] for _ in range(max(levels.values()) + 1)]
+    for name, level in levels.items():
+        grouped[level].append(name)
+    return grouped
+
+def archive_tables(conn):
+    # Partições arquivadas (archive_campaigns.py) e linhas guardadas pelas migrações também fazem parte do backup
+    return [row[0] for row in conn.execute(text(
+        "SELECT tablename FROM pg_tables WHERE schemaname = 'archive' ORDER BY tablename"
+    ))]
+
+def table_columns(conn, schema: str, table: str):
+    return [row[0] for row in conn.execute(text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = :schema AND table_name = :table
+        ORDER BY ordinal_position
+    """), {"schema": schema, "table": table})]
+
+def column_types(conn, schema: str, table: str):
+    # Tipos na ordem de table_columns, para recriar no restore as tabelas do schema archive
+    return [row[0] for row in conn.execute(text("""
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = CAST(:rel AS regclass) AND attnum > 0 AND NOT attisdropped
+        ORDER BY attnum
+    """), {"rel": f"{schema}.{table}"})]
+
+def sequence_columns(conn):
+    # [(sequência, tabela, coluna)] de toda coluna serial do schema public
+    return conn.execute(text("""
+        SELECT s.relname, t.relname, a.attname
+        FROM pg_class s
+        JOIN pg_namespace n ON n.oid = s.relnamespace AND n.nspname = 'public'
+        JOIN pg_depend d ON d.objid = s.oid AND d.deptype = 'a'
+        JOIN pg_class t ON t.oid = d.refobjid
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = d.refobjsubid
+        WHERE s.relkind = 'S'
+        ORDER BY s.relname
+    """)).all()
+
+def resync_sequences(conn):
+    # Próximo valor = maior id existente + 1, contando as partições arquivadas de responses/answers
+    archived = archive_tables(conn)
+    synced = []
+    for seq, table, column in sequence_columns(conn):
+        sources = [table] + [f"archive.{t}" for t in archived if t.startswith(f"{table}_")]
+        max_id = max(conn.execute(text(f"SELECT COALESCE(MAX({column}), 0) FROM {src}")).scalar() for src in sources)
+        conn.execute(text("SELECT setval(:seq, :val, false)"), {"seq": seq, "val": max_id + 1})
+        synced.append((seq, max_id))
+    return synced
+
+# --- dump ---
+
+def dump_table(engine, snapshot: str, directory: str, schema: str, table: str, columns):
+    filename = f"{table}.bin" if schema == "public" else f"{schema}.{table}.bin"
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        out = HashingWriter(os.path.join(directory, filename))
+        started = time.monotonic()
+        try:
+            # COPY (SELECT ...) também funciona para tabelas particionadas
+            cur.copy_expert(f"COPY (SELECT {', '.join(columns)} FROM {schema}.{table}) TO STDOUT (FORMAT binary)", out)
+        finally:
+            out.close()
+        rows = cur.rowcount
+        raw.rollback()
+    finally:
+        raw.close()
+    print(f" -> {schema}.{table}: {rows} linhas, {out.size / 1e6:.1f} MB em {time.monotonic() - started:.1f}s")
+    return {
+        "schema": schema, "table": table, "file": filename, "columns": columns,
+        "rows": rows, "bytes": out.size, "sha256": out.sha256.hexdigest()
+    }
+
+def dump(url: str, directory: str, jobs: int):
+    os.makedirs(directory, exist_ok=True)
+    engine = create_engine(url, poolclass=NullPool)
+    started = time.monotonic()
+    # Conexão coordenadora segura o snapshot até todas as streams terminarem
+    with engine.connect() as coordinator:
+        coordinator.execute(text("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"))
+        snapshot = coordinator.execute(text("SELECT pg_export_snapshot()")).scalar()
+        version = current_version(coordinator)
+        if version < LATEST_VERSION:
+            print(f"[ERRO] Banco na versão {version} do schema, rode as migrações antes do dump ({LATEST_VERSION}).")
+            return False
+        tables = [("public", name) for level in table_levels() for name in level]
+        tables += [("archive", name) for name in archive_tables(coordinator)]
+        columns = {(schema, name): table_columns(coordinator, schema, name) for schema, name in tables}
+        types = {(schema, name): column_types(coordinator, schema, name) for schema, name in tables if schema == "archive"}
+
+        print(f"Exportando {len(tables)} tabelas com {jobs} streams...")
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            entries = list(pool.map(lambda t: dump_table(engine, snapshot, directory, t[0], t[1], columns[t]), tables))
+        for entry in entries:
+            if entry["schema"] == "archive":
+                entry["types"] = types[("archive", entry["table"])]
+        coordinator.rollback()
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "created_at": int(time.time()),
+        "schema_version": version,
+        "source": make_url(url).render_as_string(hide_password=True),
+        "tables": entries,
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    total = sum(e["bytes"] for e in entries)
+    print(f"\nSucesso! {total / 1e6:.1f} MB em {directory} ({time.monotonic() - started:.1f}s)")
+    return True
+
+# --- restore ---
+
+def verify_checksums(directory: str, entries, jobs: int):
+    def check(entry):
+        path = os.path.join(directory, entry["file"])
+        if not os.path.exists(path):
+            return f"{entry['file']} ausente"
+        if file_sha256(path) != entry["sha256"]:
+            return f"{entry['file']} com checksum diferente do manifesto"
+        return None
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        return [err for err in pool.map(check, entries) if err]
+
+def restore_table(engine, directory: str, entry, skip_fk_checks: bool):
+    raw = engine.raw_connection()
+    started = time.monotonic()
+    try:
+        cur = raw.cursor()
+        # Os dados vêm de um snapshot consistente: sem os gatilhos de FK o COPY fica ~4x mais rápido.
+        # applications mantém os gatilhos, o dela cria as partições de responses/answers.
+        if skip_fk_checks and entry["table"] != "applications":
+            cur.execute("SET session_replication_role = replica")
+        with open(os.path.join(directory, entry["file"]), "rb") as f:
+            cur.copy_expert(
+                f"COPY {entry['schema']}.{entry['table']} ({', '.join(entry['columns'])}) FROM STDIN (FORMAT binary)", f
+            )
+        raw.commit()
+    finally:
+        raw.close()
+    print(f" -> {entry['schema']}.{entry['table']}: {entry['rows']} linhas em {time.monotonic() - started:.1f}s")
+
+def restore(url: str, directory: str, jobs: int, clean: bool):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        print(f"[ERRO] Formato de backup {manifest.get('format')} não suportado.")
+        return False
+    # COPY binário exige as mesmas colunas e tipos: o código precisa estar na versão do backup
+    if manifest["schema_version"] != LATEST_VERSION:
+        print(f"[ERRO] Backup na versão {manifest['schema_version']} do schema, o código está na {LATEST_VERSION}.")
+        return False
+
+    started = time.monotonic()
+    print("Conferindo checksums...")
+    errors = verify_checksums(directory, manifest["tables"], jobs)
+    if errors:
+        for err in errors:
+            print(f"[ERRO] {err}")
+        return False
+
+    engine = create_engine(url, poolclass=NullPool)
+    apply_migrations(engine)
+    with engine.connect() as conn:
+        # session_replication_role exige superusuário; sem ele as FKs são checadas linha a linha
+        skip_fk_checks = conn.execute(text("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")).scalar()
+    public = [e for e in manifest["tables"] if e["schema"] == "public"]
+    archived = [e for e in manifest["tables"] if e["schema"] == "archive"]
+
+    with engine.begin() as conn:
+        if clean:
+            print("Limpando o banco de destino (--clean)...")
+            conn.execute(text(f"TRUNCATE {', '.join(e['table'] for e in public)} RESTART IDENTITY CASCADE"))
+            for name in archive_tables(conn):
+                conn.execute(text(f"DROP TABLE archive.{name}"))
+        else:
+            non_empty = [e["table"] for e in public if conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {e['table']})")).scalar()]
+            if non_empty:
+                print(f"[ERRO] Banco de destino já tem dados ({', '.join(non_empty)}). Use --clean para substituir.")
+                return False
+        # Partições arquivadas antes das aplicações: o gatilho não recria essas faixas em public
+        for entry in archived:
+            name = entry["table"]
+            if name.startswith("responses_") or "types" not in entry:
+                conn.execute(text(f"CREATE TABLE archive.{name} (LIKE public.responses INCLUDING DEFAULTS)"))
+            else:
+                # Cópias guardadas pelas migrações (duplicate_*, orphan_*): mesmas colunas e tipos da origem
+                columns = ", ".join(f"{c} {t}" for c, t in zip(entry["columns"], entry["types"]))
+                conn.execute(text(f"CREATE TABLE archive.{name} ({columns})"))
+            # A migração já cria a primeira faixa vazia em public; a arquivada ocupa o lugar dela
+            if conn.execute(text(f"SELECT to_regclass('public.{name}') IS NOT NULL")).scalar():
+                answers = name.replace("responses_", "answers_", 1)
+                for parent, partition in (("answers", answers), ("responses", name)):
+                    conn.execute(text(f"ALTER TABLE {parent} DETACH PARTITION public.{partition}"))
+                    conn.execute(text(f"DROP TABLE public.{partition}"))
+
+    by_table = {e["table"]: e for e in public}
+    print(f"Carregando {len(manifest['tables'])} tabelas com {jobs} streams"
+          f"{'' if skip_fk_checks else ' (sem superusuário: FKs checadas durante o COPY)'}...")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(lambda e: restore_table(engine, directory, e, skip_fk_checks), archived))
+        # Tabelas do mesmo nível não se referenciam: carregam em paralelo
+        for level in table_levels():
+            list(pool.map(lambda name: restore_table(engine, directory, by_table[name], skip_fk_checks), [n for n in level if n in by_table]))
+
+    with engine.begin() as conn:
+        for seq, max_id in resync_sequences(conn):
+            print(f" -> Sequência '{seq}' ajustada (max id = {max_id})")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    print(f"\nSucesso! Backup de {time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['created_at']))} "
+          f"restaurado em {time.monotonic() - started:.1f}s")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dump/restore dos dados do SAAN com COPY binário em paralelo")
+    parser.add_argument("command", choices=["dump", "restore"])
+    parser.add_argument("directory")
+    parser.add_argument("--jobs", type=int, default=4, help="streams COPY simultâneas")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--clean", action="store_true", help="restore: apaga os dados do destino antes")
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        ok = dump(args.database_url, args.directory, args.jobs)
+    else:
+        ok = restore(args.database_url, args.directory, args.jobs, args.clean)
+    sys.exit(0 if ok else 1)
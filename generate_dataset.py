@@ -0,0 +1,231 @@
+import argparse
+import io
+import math
+import random
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from database import SQLALCHEMY_DATABASE_URL
+from dump_restore import resync_sequences
+from security import hash_password
+from schema_migrations import apply_migrations
+
+# Gera dados sintéticos em volume de produção para benchmarks, direto via COPY.
+# Formulários seguem os grupos de questoes.txt; a mesma --seed (e --now) gera sempre os mesmos dados.
+#   python generate_dataset.py --apps 2000 --evaluators 5000 --per-app 20
+#   python generate_dataset.py --apps 50000 --per-app 40 --distribution skewed-high --packed
+# Usuários gerados entram com a senha --password (padrão "bench123").
+
+# Pesos das notas 1..5 da escala Likert
+DISTRIBUTIONS = {
+    "uniform": [1, 1, 1, 1, 1],
+    "normal": [5, 20, 40, 25, 10],
+    "skewed-high": [3, 7, 15, 35, 40],
+    "skewed-low": [35, 30, 20, 10, 5],
+    "bimodal": [30, 10, 5, 15, 40],
+}
+
+ROLES = [("admin", "admins"), ("engenheiro", "engineers"), ("stakeholder", "stakeholders"), ("avaliador", "evaluators")]
+
+def parse_questions(path: str):
+    # questoes.txt: "# Grupo" seguido das perguntas indentadas ("texto exemplo: exemplo")
+    groups = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#"):
+                groups.append((line.lstrip("# ").strip(), []))
+            elif line and groups:
+                question, _, example = line.partition(" exemplo: ")
+                groups[-1][1].append((question.strip(), example.strip()))
+    return [(name, questions) for name, questions in groups if questions]
+
+def tilted_weights(base, tilt: float):
+    # Desloca a distribuição para notas altas (tilt > 0) ou baixas (tilt < 0)
+    return [w * math.exp(tilt * (v - 3)) for v, w in zip(range(1, 6), base)]
+
+def copy_rows(cur, table: str, columns, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row) + "\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+def next_ids(conn):
+    # Ids explícitos a partir do maior existente: o gerador também roda sobre um banco com dados
+    tables = ["users", "forms", "question_groups", "questions", "applications", "responses", "answers", "assignment_events"]
+    return {t: conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {t}")).scalar() + 1 for t in tables}
+
+def generate(args):
+    rng = random.Random(args.seed)
+    base_weights = [float(w) for w in args.score_weights.split(",")] if args.score_weights else DISTRIBUTIONS[args.distribution]
+    if len(base_weights) != 5:
+        print("[ERRO] --score-weights precisa de 5 pesos (notas 1 a 5).")
+        return False
+    groups = parse_questions(args.questions)
+    if args.groups:
+        groups = groups[:args.groups]
+    now = args.now or int(time.time())
+    started = time.monotonic()
+
+    engine = create_engine(args.database_url, poolclass=NullPool)
+    apply_migrations(engine)
+    with engine.connect() as conn:
+        ids = next_ids(conn)
+        skip_fk_checks = conn.execute(text("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")).scalar()
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+
+        # --- usuários ---
+        password_hash = hash_password(args.password)
+        users = {}
+        rows = []
+        uid = ids["users"]
+        for role, option in ROLES:
+            users[role] = []
+            for _ in range(getattr(args, option)):
+                users[role].append(uid)
+                rows.append((uid, f"{args.prefix}_{role}_{uid}", password_hash, role))
+                uid += 1
+        copy_rows(cur, "users", ["id", "username", "password_hash", "role"], rows)
+        if not users["avaliador"]:
+            print("[ERRO] --evaluators precisa ser maior que zero.")
+            raw.rollback()
+            return False
+        if args.per_app > len(users["avaliador"]):
+            print(f"[ERRO] --per-app ({args.per_app}) maior que o número de avaliadores ({len(users['avaliador'])}).")
+            raw.rollback()
+            return False
+
+        # --- formulários, grupos e perguntas (layout de questoes.txt) ---
+        form_rows, group_rows, question_rows = [], [], []
+        form_questions = {}  # form_id -> [question_id] ordenadas por id
+        fid, gid, qid = ids["forms"], ids["question_groups"], ids["questions"]
+        creator = (users["engenheiro"] or users["admin"] or [None])[0]
+        for n in range(args.forms):
+            form_rows.append((fid, f"Avaliação de acessibilidade cognitiva {n + 1}", "Gerado por generate_dataset.py", creator))
+            form_questions[fid] = []
+            for name, questions in groups:
+                group_rows.append((gid, fid, name))
+                for question, example in questions:
+                    question_rows.append((qid, fid, gid, question, example, "5-point"))
+                    form_questions[fid].append(qid)
+                    qid += 1
+                gid += 1
+            fid += 1
+        copy_rows(cur, "forms", ["id", "title", "description", "created_by"], form_rows)
+        copy_rows(cur, "question_groups", ["id", "form_id", "name"], group_rows)
+        copy_rows(cur, "questions", ["id", "form_id", "group_id", "text", "example", "scale_type"], question_rows)
+
+        # --- aplicações (o gatilho cria as partições de responses/answers) ---
+        form_ids = list(form_questions)
+        apps = []  # (app_id, form_id, tilt)
+        app_rows = []
+        for n in range(args.apps):
+            app_id = ids["applications"] + n
+            form_id = rng.choice(form_ids)
+            # Qualidade de cada aplicação: desloca a distribuição base das notas
+            apps.append((app_id, form_id, rng.gauss(0, args.app_spread)))
+            kind = "mobile" if rng.random() < 0.3 else "web"
+            app_rows.append((app_id, f"Aplicação {app_id}", kind, f"https://app{app_id}.example.com", form_id))
+        copy_rows(cur, "applications", ["id", "name", "type", "url", "form_id"], app_rows)
+        raw.commit()
+        print(f" -> {uid - ids['users']} usuários, {len(form_rows)} formulários ({len(question_rows)} perguntas), {len(app_rows)} aplicações")
+
+        # Dados gerados são consistentes por construção: sem os gatilhos de FK o COPY fica ~4x mais rápido
+        if skip_fk_checks:
+            cur.execute("SET session_replication_role = replica")
+
+        # --- atribuições, respostas e answers em lotes ---
+        rid, aid, eid = ids["responses"], ids["answers"], ids["assignment_events"]
+        stats = {"assignments": 0, "responses": 0, "answers": 0}
+        assign_rows, event_rows, response_rows, answer_rows = [], [], [], []
+        values = [1, 2, 3, 4, 5]
+
+        def flush():
+            copy_rows(cur, "application_evaluators", ["application_id", "user_id"], assign_rows)
+            copy_rows(cur, "assignment_events", ["id", "user_id", "application_id", "kind", "created_at"], event_rows)
+            if args.packed:
+                copy_rows(cur, "responses", ["id", "application_id", "form_id", "evaluator_id", "created_at", "answer_values"], response_rows)
+            else:
+                copy_rows(cur, "responses", ["id", "application_id", "form_id", "evaluator_id", "created_at"], response_rows)
+                copy_rows(cur, "answers", ["id", "application_id", "response_id", "question_id", "value"], answer_rows)
+            raw.commit()
+            for rows in (assign_rows, event_rows, response_rows, answer_rows):
+                rows.clear()
+            elapsed = time.monotonic() - started
+            print(f" -> {stats['responses']} respostas, {stats['answers']} answers ({stats['answers'] / elapsed:.0f} answers/s)")
+
+        for app_id, form_id, tilt in apps:
+            cum_weights = []
+            total = 0.0
+            for w in tilted_weights(base_weights, tilt):
+                total += w
+                cum_weights.append(total)
+            questions = form_questions[form_id]
+            assigned_at = now - rng.randrange(args.days * 86400 + 1)
+            for user_id in rng.sample(users["avaliador"], args.per_app):
+                assign_rows.append((app_id, user_id))
+                event_rows.append((eid, user_id, app_id, "assigned", assigned_at))
+                eid += 1
+                stats["assignments"] += 1
+                if rng.random() >= args.response_rate:
+                    continue
+                created_at = rng.randint(assigned_at, now)
+                scores = rng.choices(values, cum_weights=cum_weights, k=len(questions))
+                if args.packed:
+                    response_rows.append((rid, app_id, form_id, user_id, created_at, "{" + ",".join(map(str, scores)) + "}"))
+                else:
+                    response_rows.append((rid, app_id, form_id, user_id, created_at))
+                    for q_id, value in zip(questions, scores):
+                        answer_rows.append((aid, app_id, rid, q_id, value))
+                        aid += 1
+                event_rows.append((eid, user_id, app_id, "completed", created_at))
+                eid += 1
+                rid += 1
+                stats["responses"] += 1
+                stats["answers"] += len(scores)
+            if len(response_rows) >= args.batch_size:
+                flush()
+        flush()
+    finally:
+        raw.close()
+
+    with engine.begin() as conn:
+        resync_sequences(conn)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"\nSucesso! {stats['assignments']} atribuições, {stats['responses']} respostas, {stats['answers']} answers "
+          f"em {time.monotonic() - started:.1f}s (seed {args.seed})")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos do SAAN em volume de produção (COPY, determinístico)")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--prefix", default="gen", help="prefixo dos usernames gerados")
+    parser.add_argument("--password", default="bench123", help="senha de todos os usuários gerados")
+    parser.add_argument("--admins", type=int, default=2)
+    parser.add_argument("--engineers", type=int, default=10)
+    parser.add_argument("--stakeholders", type=int, default=50)
+    parser.add_argument("--evaluators", type=int, default=2000)
+    parser.add_argument("--forms", type=int, default=20)
+    parser.add_argument("--questions", default="questoes.txt", help="arquivo com os grupos e perguntas")
+    parser.add_argument("--groups", type=int, default=0, help="usa só os N primeiros grupos (0 = todos)")
+    parser.add_argument("--apps", type=int, default=1000)
+    parser.add_argument("--per-app", type=int, default=20, help="avaliadores atribuídos por aplicação")
+    parser.add_argument("--response-rate", type=float, default=0.75, help="fração das atribuições já respondidas")
+    parser.add_argument("--distribution", choices=sorted(DISTRIBUTIONS), default="normal", help="distribuição base das notas")
+    parser.add_argument("--score-weights", help="pesos das notas 1..5, ex: 5,10,20,35,30 (substitui --distribution)")
+    parser.add_argument("--app-spread", type=float, default=0.5, help="variação de qualidade entre aplicações (0 = todas iguais)")
+    parser.add_argument("--days", type=int, default=90, help="janela das datas de atribuição/resposta")
+    parser.add_argument("--now", type=int, help="epoch de referência das datas (fixe para reproduzir byte a byte)")
+    parser.add_argument("--packed", action="store_true", help="grava as notas em responses.answer_values (ANSWER_STORAGE=packed)")
+    parser.add_argument("--batch-size", type=int, default=20000, help="respostas por COPY")
+    args = parser.parse_args()
+    sys.exit(0 if generate(args) else 1)
@@ -0,0 +1,299 @@
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, o modo fila não sobe (ver IngestQueue.start)
+    fcntl = None
+
+from sqlalchemy.exc import OperationalError
+
+# Modo de ingestão opcional para POST /responses: "sync" (padrão) grava na requisição;
+# "queue" grava num log local durável, responde na hora e um writer em background
+# persiste no Postgres em lotes.
+# Cada processo (worker do uvicorn, réplica no mesmo volume) escreve no seu próprio log,
+# data/ingest.<pid>.log, preso com flock enquanto o processo vive. Na subida, logs sem dono
+# (processo que morreu) são adotados: o pendente deles vai para o log novo e o arquivo é removido.
+INGEST_MODE = os.getenv("RESPONSE_INGEST_MODE", "sync").strip().lower()
+INGEST_LOG_PATH = os.getenv("INGEST_LOG_PATH", "data/ingest.log")
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", "0.2"))  # segundos
+INGEST_RETRY_DELAY = 2.0
+INGEST_STATUS_CACHE = 10000
+
+log = logging.getLogger("saan.ingest")
+
+def process_log_path(path: str, pid: int) -> str:
+    # data/ingest.log -> data/ingest.1234.log
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid}{ext}"
+
+def sibling_log_paths(path: str):
+    # Logs de todos os processos, mais o caminho sem pid (versões anteriores usavam um log só)
+    root, ext = os.path.splitext(path)
+    pattern = re.compile(rf"^{re.escape(os.path.basename(root))}\.\d+{re.escape(ext)}$")
+    found = sorted(p for p in glob.glob(f"{glob.escape(root)}.*{ext}") if pattern.match(os.path.basename(p)))
+    return found + ([path] if os.path.exists(path) else [])
+
+def try_lock(f) -> bool:
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+class IngestQueue:
+    """Fila write-behind de submissões com log append-only (JSON lines).
+
+    Cada submissão vira uma linha {"op": "submit"} sincronizada com fsync antes do ack;
+    quando o writer persiste o lote, grava {"op": "done"}. Na subida, submissões sem
+    "done" (deste processo ou de processos mortos) são reenfileiradas. O log do processo
+    é truncado sempre que não há nada pendente.
+
+    O fsync é agrupado: quem grava escreve as linhas e espera; a thread ingest-fsync faz um
+    fsync para todas as linhas escritas até ali e acorda quem estava esperando.
+    """
+
+    def __init__(self, writer, path: str = INGEST_LOG_PATH):
+        # writer(records) -> {submission_id: {"status": ..., "responseId": ...}}
+        self.writer = writer
+        self.base_path = path
+        self.path = None  # log deste processo, definido em start()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._status = OrderedDict()
+        self._thread = None
+        self._stop = threading.Event()
+        self._log = None
+        # fsync em grupo: _written = linhas escritas, _synced = linhas já no disco
+        self._synced_cond = threading.Condition(self._lock)
+        self._written = 0
+        self._synced = 0
+        self._sync_error = None
+        self._sync_thread = None
+        self._closing = False  # a thread de fsync só sai depois do writer
+
+    # --- log ---
+
+    def _append_log(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._log.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._written += 1
+            target = self._written
+            self._synced_cond.notify_all()
+            while self._synced < target and self._sync_error is None:
+                self._synced_cond.wait()
+            if self._synced < target:
+                raise self._sync_error
+
+    def _sync_loop(self):
+        while True:
+            with self._lock:
+                while self._synced == self._written and not self._closing:
+                    self._synced_cond.wait()
+                if self._synced == self._written:
+                    return
+                self._log.flush()
+                target = self._written
+                fd = self._log.fileno()
+            # Fora do lock: novas linhas continuam sendo escritas e entram no próximo fsync
+            try:
+                os.fsync(fd)
+            except OSError as e:
+                log.exception("Falha no fsync do log de ingestão")
+                with self._lock:
+                    self._sync_error = e
+                    self._synced_cond.notify_all()
+                return
+            with self._lock:
+                self._synced = target
+                self._synced_cond.notify_all()
+
+    def _compact(self):
+        # Nada pendente: tudo já está no Postgres, o log pode recomeçar vazio
+        with self._lock:
+            if not self._pending and self._synced == self._written:
+                self._log.truncate(0)
+                self._log.seek(0)
+
+    def _read_log(self, f, submitted: OrderedDict):
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # última linha incompleta (queda durante a escrita)
+            if entry.get("op") == "submit":
+                submitted[entry["id"]] = entry
+            elif entry.get("op") == "done":
+                submitted.pop(entry["id"], None)
+                self._set_status(entry["id"], entry["result"])
+
+    def _adopt_orphans(self, submitted: OrderedDict):
+        # Lê os logs de processos que não existem mais (o flock deles está livre).
+        # Devolve os arquivos adotados, ainda abertos e presos, para remover depois do fsync.
+        adopted = []
+        for path in sibling_log_paths(self.base_path):
+            if path == self.path:
+                continue
+            try:
+                f = open(path, "r+")
+            except FileNotFoundError:
+                continue  # outro processo acabou de adotar
+            if not try_lock(f):
+                f.close()  # dono vivo
+                continue
+            try:
+                same_file = os.fstat(f.fileno()).st_ino == os.stat(path).st_ino
+            except FileNotFoundError:
+                same_file = False
+            if not same_file:
+                f.close()  # adotado e removido enquanto esperávamos
+                continue
+            self._read_log(f, submitted)
+            adopted.append((path, f))
+        return adopted
+
+    # --- status ---
+
+    def _set_status(self, submission_id, result):
+        self._status[submission_id] = result
+        self._status.move_to_end(submission_id)
+        while len(self._status) > INGEST_STATUS_CACHE:
+            self._status.popitem(last=False)
+
+    def status(self, submission_id):
+        return self._status.get(submission_id)
+
+    # --- API ---
+
+    def start(self):
+        if fcntl is None:
+            raise RuntimeError("RESPONSE_INGEST_MODE=queue precisa de flock (Linux/macOS)")
+        os.makedirs(os.path.dirname(self.base_path) or ".", exist_ok=True)
+        self.path = process_log_path(self.base_path, os.getpid())
+        self._log = open(self.path, "a+")
+        if not try_lock(self._log):
+            raise RuntimeError(f"Log de ingestão em uso por outro processo: {self.path}")
+
+        # O log deste pid pode existir de uma execução anterior (pid reaproveitado no container)
+        submitted = OrderedDict()
+        self._log.seek(0)
+        self._read_log(self._log, submitted)
+        adopted = self._adopt_orphans(submitted)
+        pending = list(submitted.values())
+
+        # Reescreve só o que ficou pendente, descartando o histórico já persistido
+        self._log.truncate(0)
+        self._stop.clear()
+        self._closing = False
+        self._sync_error = None
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="ingest-fsync", daemon=True)
+        self._sync_thread.start()
+        if pending:
+            log.info("Reprocessando submissões pendentes do log", extra={"pending": len(pending), "adoptedLogs": len(adopted)})
+            self._append_log(pending)
+        # Pendentes já estão no log deste processo: os órfãos podem sumir
+        for path, f in adopted:
+            f.truncate(0)
+            os.remove(path)
+            f.close()
+        for record in pending:
+            self._pending.add(record["id"])
+            self._set_status(record["id"], {"status": "queued", "userId": record["evaluatorId"]})
+            self._queue.put(record)
+
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        with self._lock:
+            self._closing = True
+            self._synced_cond.notify_all()
+        if self._sync_thread:
+            self._sync_thread.join(timeout)
+        if self._log:
+            self._log.close()  # solta o flock: o próximo processo adota o que ficou pendente
+
+    def submit(self, record: dict) -> str:
+        # Bloqueia até o fsync do grupo: em rota async, chamar via run_in_threadpool
+        record = dict(record, op="submit", id=uuid.uuid4().hex)
+        with self._lock:
+            self._pending.add(record["id"])
+        self._set_status(record["id"], {"status": "queued", "userId": record["evaluatorId"]})
+        self._append_log([record])
+        self._queue.put(record)
+        return record["id"]
+
+    # --- writer ---
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=INGEST_FLUSH_INTERVAL)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + INGEST_FLUSH_INTERVAL
+        while len(batch) < INGEST_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            return self.writer(batch)
+        except OperationalError:
+            raise  # banco indisponível: o lote inteiro espera e tenta de novo
+        except Exception as e:
+            if len(batch) == 1:
+                return {batch[0]["id"]: {"status": "failed", "detail": str(getattr(e, "orig", e))}}
+            # Isola o registro problemático gravando um a um
+            results = {}
+            for record in batch:
+                results.update(self._write([record]))
+            return results
+
+    def _run(self):
+        batch = []
+        while not (self._stop.is_set() and self._queue.empty() and not batch):
+            if not batch:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+            try:
+                results = self._write(batch)
+            except OperationalError as e:
+                log.warning("Banco indisponível, nova tentativa", extra={"retryIn": INGEST_RETRY_DELAY, "error": str(e)})
+                if self._stop.wait(INGEST_RETRY_DELAY):
+                    break  # desligando: pendentes continuam no log e voltam no replay
+                continue
+
+            done = []
+            for record in batch:
+                result = results.get(record["id"], {"status": "failed", "detail": "sem resultado"})
+                done.append({"op": "done", "id": record["id"], "result": dict(result, userId=record["evaluatorId"])})
+            self._append_log(done)
+            for entry in done:
+                self._set_status(entry["id"], entry["result"])
+                with self._lock:
+                    self._pending.discard(entry["id"])
+            batch = []
+            if self._queue.empty():
+                self._compact()
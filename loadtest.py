@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Teste de carga das rotas quentes com mix realista (login, /my-assignments, POST /responses,
+# relatório e PDF). Mostra vazão e p50/p95/p99 por rota e compara com a baseline salva.
+#   python loadtest.py --base-url http://127.0.0.1:8000        (servidor já rodando)
+#   python loadtest.py --save-baseline                          (grava loadtest_baseline.json)
+#   python loadtest.py --mix my-assignments=70,responses=30     (só essas rotas)
+#   python loadtest.py --compare-db-modes                       (sobe o uvicorn com DB_ASYNC=0 e 1 e compara)
+
+BASE_URL = "http://127.0.0.1:8000"
+PASSWORD = "load123"
+
+def log(msg, status="INFO"):
+    print(f"[{status}] {msg}")
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+# Peso de cada rota no mix padrão (proporção aproximada do uso real)
+DEFAULT_MIX = "login=5,my-assignments=40,responses=15,report=30,pdf=10"
+ROUTE_NAMES = {
+    "login": "POST /auth/login",
+    "my-assignments": "GET /my-assignments",
+    "responses": "POST /responses",
+    "report": "GET /reports/application-score",
+    "pdf": "GET /reports/export-pdf",
+}
+BASELINE_PATH = "loadtest_baseline.json"
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        key, _, weight = item.partition("=")
+        key = key.strip()
+        if key not in ROUTE_NAMES:
+            raise SystemExit(f"Rota desconhecida no --mix: {key} (opções: {', '.join(ROUTE_NAMES)})")
+        if float(weight or 0) > 0:
+            mix[key] = float(weight)
+    return mix
+
+def login(base_url, username, role=None):
+    # role: registra o usuário antes (fixture); sem role só faz login
+    s = requests.Session()
+    if role:
+        s.post(f"{base_url}/auth/register", json={"username": username, "password": PASSWORD, "role": role})
+    r = s.post(f"{base_url}/auth/login", json={"username": username, "password": PASSWORD})
+    r.raise_for_status()
+    return s
+
+def setup_fixture(base_url, evaluators, apps):
+    # Um formulário, --apps aplicações com todos os avaliadores e uma sessão por avaliador.
+    # Na primeira aplicação metade já respondeu (dados do relatório); o resto fica pendente para POST /responses.
+    tag = uuid.uuid4().hex[:6]
+    admin = login(base_url, f"load_admin_{tag}", "admin")
+    r = admin.post(f"{base_url}/forms", json={
+        "title": f"Load {tag}",
+        "questions": [{"text": f"Q{i}", "scaleType": "5-point", "group": f"Grupo {i % 4}"} for i in range(20)]
+    })
+    r.raise_for_status()
+    form_id = r.json()["formId"]
+
+    names = [f"load_eval_{tag}_{i}" for i in range(evaluators)]
+    sessions = [login(base_url, name, "avaliador") for name in names]
+    app_ids = []
+    for n in range(apps):
+        r = admin.post(f"{base_url}/applications", json={"name": f"Load App {tag} {n}", "appType": "web", "formId": form_id, "evaluators": names})
+        r.raise_for_status()
+        app_ids.append(r.json()["application"]["id"])
+
+    questions = sessions[0].get(f"{base_url}/my-assignments").json()[-1]["form"]["questions"]
+    answers = [{"questionId": q["id"], "value": 1 + (q["id"] % 5)} for q in questions]
+    for s in sessions[: evaluators // 2]:
+        s.post(f"{base_url}/responses", json={"applicationId": app_ids[0], "formId": form_id, "answers": answers})
+
+    pending = deque((i, app_id) for app_id in app_ids[1:] for i in range(evaluators))
+    random.Random(0).shuffle(pending)
+    return {
+        "admin": admin, "sessions": sessions, "names": names, "report_app": app_ids[0],
+        "form_id": form_id, "answers": answers, "pending": pending,
+    }
+
+def make_routes(base_url, fx):
+    def submit(i):
+        try:
+            evaluator, app_id = fx["pending"].popleft()
+        except IndexError:
+            evaluator, app_id = i % len(fx["sessions"]), fx["report_app"]  # pendentes esgotados: reenvio (duplicate)
+        return fx["sessions"][evaluator].post(f"{base_url}/responses", json={
+            "applicationId": app_id, "formId": fx["form_id"], "answers": fx["answers"]
+        })
+
+    return {
+        "login": lambda i: requests.post(f"{base_url}/auth/login", json={"username": fx["names"][i % len(fx["names"])], "password": PASSWORD}),
+        "my-assignments": lambda i: fx["sessions"][i % len(fx["sessions"])].get(f"{base_url}/my-assignments"),
+        "responses": submit,
+        "report": lambda i: fx["admin"].get(f"{base_url}/reports/application-score", params={"applicationId": fx["report_app"]}),
+        "pdf": lambda i: fx["admin"].get(f"{base_url}/reports/export-pdf", params={"applicationId": fx["report_app"]}),
+    }
+
+def summarize(latencies, errors, elapsed):
+    return {
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "errors": errors,
+    }
+
+def run_load(base_url, concurrency, duration, evaluators, mix=None, apps=25, seed=0):
+    mix = mix or parse_mix(DEFAULT_MIX)
+    fx = setup_fixture(base_url, evaluators, apps)
+    calls = make_routes(base_url, fx)
+    keys = list(mix)
+    weights = [mix[k] for k in keys]
+
+    def worker(worker_id):
+        # Sorteio ponderado com semente por worker: a sequência de rotas é reproduzível
+        rng = random.Random(seed * 1000 + worker_id)
+        samples = []
+        deadline = time.monotonic() + duration
+        i = worker_id
+        while time.monotonic() < deadline:
+            key = rng.choices(keys, weights)[0]
+            start = time.perf_counter()
+            ok = calls[key](i).status_code < 400
+            samples.append((key, time.perf_counter() - start, ok))
+            i += concurrency
+        return samples
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = [s for chunk in pool.map(worker, range(concurrency)) for s in chunk]
+    elapsed = time.monotonic() - started
+
+    report = {}
+    for key in keys:
+        latencies = [lat for k, lat, _ in samples if k == key]
+        errors = sum(1 for k, _, ok in samples if k == key and not ok)
+        report[ROUTE_NAMES[key]] = summarize(latencies, errors, elapsed)
+    report["TOTAL"] = summarize([lat for _, lat, _ in samples], sum(1 for *_, ok in samples if not ok), elapsed)
+    if "responses" in mix and not fx["pending"]:
+        log("Atribuições pendentes esgotadas: parte dos POST /responses foram reenvios (aumente --apps)", "WARN")
+    return report
+
+def print_report(title, report):
+    log(title)
+    for name, r in report.items():
+        print(f"  {name:<34} {r['rps']:>8} req/s  p50 {r['p50_ms']:>7} ms  p95 {r['p95_ms']:>7} ms  "
+              f"p99 {r.get('p99_ms', 0):>7} ms  erros {r['errors']}")
+
+# --- baseline ---
+
+def run_config(args):
+    return {"concurrency": args.concurrency, "duration": args.duration, "evaluators": args.evaluators, "apps": args.apps, "mix": args.mix}
+
+def save_baseline(path, args, report):
+    with open(path, "w") as f:
+        json.dump({"created_at": int(time.time()), "config": run_config(args), "routes": report}, f, indent=2)
+    log(f"Baseline salva em {path}")
+
+def compare_baseline(path, args, report, tolerance):
+    # Regressão: p95/p99 acima de (1 + tolerância) x baseline ou vazão abaixo de (1 - tolerância) x baseline
+    with open(path) as f:
+        baseline = json.load(f)
+    if baseline["config"] != run_config(args):
+        log(f"Configuração diferente da baseline ({baseline['config']}): comparação aproximada", "WARN")
+    regressions = 0
+    log(f"Comparação com {path} (tolerância {tolerance:.0%}):")
+    for name, r in report.items():
+        base = baseline["routes"].get(name)
+        if not base:
+            print(f"  {name:<34} sem baseline")
+            continue
+        problems = []
+        for metric in ("p95_ms", "p99_ms"):
+            if base.get(metric) and r[metric] > base[metric] * (1 + tolerance):
+                problems.append(f"{metric} {base[metric]} -> {r[metric]}")
+        if base["rps"] and r["rps"] < base["rps"] * (1 - tolerance):
+            problems.append(f"rps {base['rps']} -> {r['rps']}")
+        if r["errors"] > base["errors"]:
+            problems.append(f"erros {base['errors']} -> {r['errors']}")
+        ratio = r["p95_ms"] / base["p95_ms"] if base["p95_ms"] else 0
+        status = "REGRESSÃO " + "; ".join(problems) if problems else "ok"
+        print(f"  {name:<34} p95 {ratio:.2f}x  rps {r['rps'] / base['rps'] if base['rps'] else 0:.2f}x  {status}")
+        regressions += bool(problems)
+    return regressions == 0
+
+def wait_ready(base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/", timeout=1).status_code == 200:
+                return True
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    return False
+
+def compare_db_modes(args):
+    port = 8765
+    base_url = f"http://127.0.0.1:{port}"
+    results = {}
+    for mode in ("0", "1"):
+        env = dict(os.environ, DB_ASYNC=mode)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            env=env
+        )
+        try:
+            if not wait_ready(base_url):
+                log(f"Servidor não subiu (DB_ASYNC={mode})", "ERROR")
+                return False
+            results[mode] = run_load(base_url, args.concurrency, args.duration, args.evaluators, parse_mix(args.mix), args.apps, args.seed)
+            print_report(f"DB_ASYNC={mode}", results[mode])
+        finally:
+            server.terminate()
+            server.wait()
+
+    log("Comparação (async / sync):")
+    for name in results["0"]:
+        sync_rps, async_rps = results["0"][name]["rps"], results["1"][name]["rps"]
+        ratio = async_rps / sync_rps if sync_rps else 0
+        print(f"  {name:<34} {ratio:.2f}x req/s")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga das rotas quentes do SAAN")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=15.0, help="segundos por execução")
+    parser.add_argument("--evaluators", type=int, default=40)
+    parser.add_argument("--apps", type=int, default=25, help="aplicações da fixture (atribuições pendentes para POST /responses)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"pesos por rota (padrão {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="arquivo de baseline para comparar (se existir)")
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como nova baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="folga antes de acusar regressão (0.2 = 20%%)")
+    parser.add_argument("--compare-db-modes", action="store_true")
+    args = parser.parse_args()
+
+    if args.compare_db_modes:
+        sys.exit(0 if compare_db_modes(args) else 1)
+    report = run_load(args.base_url, args.concurrency, args.duration, args.evaluators, parse_mix(args.mix), args.apps, args.seed)
+    print_report(args.base_url, report)
+    if args.save_baseline:
+        save_baseline(args.baseline, args, report)
+    elif os.path.exists(args.baseline):
+        sys.exit(0 if compare_baseline(args.baseline, args, report, args.tolerance) else 1)
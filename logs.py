@@ -0,0 +1,200 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import metrics
+import tracing
+
+# Logs estruturados do servidor (logger "saan" e filhos: saan.api, saan.auth, saan.db...).
+# Quem loga só formata a mensagem e põe o registro numa fila limitada; uma thread escreve no stdout.
+# Fila cheia descarta o registro (conta em saan_log_records_dropped_total) em vez de travar a requisição.
+#   LOG_LEVEL=INFO                           nível padrão
+#   LOG_LEVELS=saan.auth=ERROR,saan.db=DEBUG  níveis por logger
+#   LOG_FORMAT=json | text                    JSON uma linha por registro (padrão) ou texto para desenvolvimento
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Eventos ruidosos (falhas de autenticação): no máximo N registros por chave a cada janela
+LOG_RATE_LIMIT = int(os.getenv("LOG_RATE_LIMIT", "10"))
+LOG_RATE_WINDOW = float(os.getenv("LOG_RATE_WINDOW", "60"))
+LOG_RATE_KEYS = 10000  # chaves acompanhadas (cliente/usuário/rota); as de janela vencida saem primeiro
+
+REQUEST_ID_HEADER = b"x-request-id"
+_REQUEST_ID_PATTERN = re.compile(r"^[\w.-]{1,64}$")
+
+# Atributos padrão do LogRecord; o resto veio de extra={...} e vira campo do JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "request_id", "trace_id"}
+
+request_id = ContextVar("saan_request_id", default=None)
+# Scope ASGI da requisição atual: a rota ("route") aparece nele depois do roteamento
+request_scope = ContextVar("saan_request_scope", default=None)
+
+def fields(record) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            data["request_id"] = record.request_id
+        if record.trace_id:
+            data["trace_id"] = record.trace_id
+        data.update(fields(record))
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str, separators=(",", ":"))
+
+class TextFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        line = f"{time.strftime('%H:%M:%S', time.localtime(record.created))} {record.levelname:<7} {record.name}"
+        if record.request_id:
+            line += f" [{record.request_id}]"
+        line += f" {record.getMessage()}"
+        extra = fields(record)
+        if extra:
+            line += " " + " ".join(f"{k}={v}" for k, v in extra.items())
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+class RequestIdFilter(logging.Filter):
+    # Roda na thread de quem loga: é lá que os ContextVars da requisição existem
+    def filter(self, record) -> bool:
+        record.request_id = request_id.get()
+        record.trace_id = tracing.current_trace_id()
+        return True
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Formata mensagem e traceback aqui (objetos de frame não devem atravessar a fila);
+        # o JSON é montado na thread de escrita
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.registry.inc("saan_log_records_dropped_total", ())
+
+class RateLimiter:
+    # Janela fixa por chave; o primeiro registro liberado depois de uma supressão leva "suppressed": N
+    def __init__(self, limit: int, window: float, max_keys: int = LOG_RATE_KEYS):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._state = {}  # chave -> [início da janela, registros na janela, suprimidos]
+
+    def _evict(self, now: float):
+        # Chaves vêm de clientes/usuários: o dicionário não pode crescer sem limite
+        for key in [k for k, state in self._state.items() if now - state[0] >= self.window]:
+            del self._state[key]
+        while len(self._state) >= self.max_keys:
+            del self._state[next(iter(self._state))]  # a mais antiga
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(key)
+            if state is None and len(self._state) >= self.max_keys:
+                self._evict(now)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._state[key] = [now, 1, 0]
+                return True, suppressed
+            if state[1] < self.limit:
+                state[1] += 1
+                return True, 0
+            state[2] += 1
+            return False, 0
+
+_limiter = RateLimiter(LOG_RATE_LIMIT, LOG_RATE_WINDOW)
+
+def log_limited(logger, key, level, msg, **extra):
+    # Para eventos que um atacante consegue disparar à vontade (403, login inválido).
+    # key separa quem é limitado junto: (evento, rota, usuário), (evento, cliente)...
+    if not logger.isEnabledFor(level):
+        return
+    allowed, suppressed = _limiter.allow((logger.name, key))
+    if not allowed:
+        return
+    if suppressed:
+        extra["suppressed"] = suppressed
+    logger.log(level, msg, extra=extra)
+
+_listener = None
+
+def setup():
+    # Idempotente: main chama na importação
+    global _listener
+    if _listener is not None:
+        return
+    root = logging.getLogger("saan")
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    for item in LOG_LEVELS.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            logging.getLogger(name.strip()).setLevel(level.strip().upper())
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+    root.addHandler(handler)
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    # Esvazia a fila na saída do processo
+    atexit.register(_listener.stop)
+
+class RequestIdMiddleware:
+    # Usa o X-Request-Id do proxy (se for um id razoável) ou gera um; devolve na resposta
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        rid = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    rid = candidate
+                break
+        rid = rid or uuid.uuid4().hex[:16]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, rid.encode())]
+            await send(message)
+
+        token = request_id.set(rid)
+        scope_token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_scope.reset(scope_token)
+            request_id.reset(token)
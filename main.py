@@ -1,28 +1,72 @@
-from fastapi import FastAPI, HTTPException, Request, Response, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Depends, Header
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 from fpdf import FPDF
 import io
 from datetime import datetime
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, delete, tuple_, exists, func, true, text
+from collections import Counter
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import time
 import os
+import asyncio
+import threading
+import anyio
 import hmac
 import hashlib
 import base64
+import logging
 import models
-from database import get_db, engine
-
-# Cria tabelas se não existirem (idealmente use alembic para migrações em prod)
-models.Base.metadata.create_all(bind=engine)
+from database import get_db, get_async_db, engine, async_engine, SessionLocal, DB_ASYNC, replica, read_session_factory, async_read_session_factory
+from ingest import IngestQueue, INGEST_MODE
+from schema_migrations import check_schema, current_version, LATEST_VERSION
+import metrics
+import query_audit
+import profiling
+import logs
+import tracing
+import slow_queries
+from security import hash_password, verify_password
 
 # ------------------------------
 # App & CORS
 # ------------------------------
 
-app = FastAPI()
+logs.setup()
+tracing.setup()
+log = logging.getLogger("saan.api")
+auth_log = logging.getLogger("saan.auth")
+
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "0"))  # 0 = padrão do anyio (40)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # O schema é criado/atualizado por schema_migrations.py (entrypoint); aqui só conferimos a versão
+    await run_in_threadpool(check_schema, engine)
+    # Rotas sync rodam no threadpool do anyio: o limite precisa acompanhar o pool do banco
+    if THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if replica:
+        replica.start()
+    # Fila de ingestão opcional: reprocessa o log pendente antes de aceitar requisições
+    if ingest_queue:
+        ingest_queue.start()
+    yield
+    if ingest_queue:
+        ingest_queue.stop()
+    if replica:
+        replica.stop()
+
+app = FastAPI(lifespan=lifespan)
+# Antes das rotas: cada endpoint marca a própria thread quando a requisição está sendo perfilada
+if profiling.PROFILING_ENABLED:
+    app.router.route_class = profiling.ProfiledRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,8 +74,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-Id", "X-Request-Id", "traceparent"],
 )
 
+# Engines instrumentadas pelos eventos de cursor (primário, async e réplica)
+INSTRUMENTED_ENGINES = [
+    getattr(bind, "sync_engine", bind)
+    for bind in (engine, async_engine, replica and replica.engine, replica and replica.async_engine)
+    if bind is not None
+]
+
+# Telemetria (/metrics): por fora do CORS, mede a requisição inteira, CORS incluído
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware, router=app.router)
+    for bind in INSTRUMENTED_ENGINES:
+        metrics.instrument_engine(bind)
+
 # ------------------------------
 # Schemas (Pydantic)
 # ------------------------------
@@ -87,15 +145,56 @@ ALLOWED_ROLES = [
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-production")
 TOKEN_EXP_SECONDS = 60 * 60 * 8  # 8h
 
-# ------------------------------
-# Utilidades: Senhas e JWT
-# ------------------------------
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "500"))
+
+# Read-your-writes: após uma escrita, as leituras do usuário ficam no primário por esse tempo
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+PIN_COOKIE = "db_pin"
+MAX_BATCH_RESPONSES = int(os.getenv("MAX_BATCH_RESPONSES", "500"))
+
+# Layout de gravação das respostas: "rows" (uma linha em answers por pergunta) ou
+# "packed" (um smallint[] em responses.answer_values). A leitura entende os dois.
+ANSWER_STORAGE = os.getenv("ANSWER_STORAGE", "rows").strip().lower()
+
+# Long-poll do feed de atribuições
+FEED_MAX_TIMEOUT = 60          # segundos máximos que a requisição fica aberta
+FEED_WAKE_INTERVAL = 0.5       # checagem da versão em memória (não toca no banco)
+FEED_DB_RECHECK = int(os.getenv("FEED_DB_RECHECK", "10"))  # eventos gravados por outros workers
+FEED_PAGE_SIZE = 500
+FEED_LOCK_ID = 7303            # pg_advisory_xact_lock(FEED_LOCK_ID, user_id): eventos de um avaliador em fila
+
+# Orçamento de consultas por rota ("MÉTODO /template": statements por requisição).
+# Com QUERY_AUDIT=1 a rota que estoura (ou repete consultas / faz lazy load em laço) é logada;
+# verify_query_budgets.py falha. Ao mudar uma rota, ajuste o número junto.
+# Rotas que gravam assignment_events contam uma consulta a mais: o lock por avaliador do feed.
+QUERY_BUDGETS = {
+    "POST /auth/login": 1,
+    "POST /auth/register": 3,
+    "GET /auth/me": 1,
+    "GET /users": 1,
+    "POST /forms": 5,
+    "GET /forms": 2,
+    "POST /applications": 10,
+    "GET /applications": 2,
+    "PUT /assignments": 6,
+    "GET /my-assignments": 2,
+    "GET /my-assignments/changes": 3,
+    # +1 na primeira submissão de cada formulário depois de subir (get_form_validators fora do cache)
+    "POST /responses": 6,
+    "POST /responses/batch": 8,
+    # 5 consultas; 6 quando a aplicação tem campanhas arquivadas (application_score_summaries)
+    "GET /reports/application-score": 6,
+    "GET /reports/export-pdf": 6,
+}
 
-def hash_password(password: str, salt: str = "static-salt") -> str:
-    return hashlib.sha256((salt + password).encode()).hexdigest()
+if query_audit.QUERY_AUDIT:
+    app.add_middleware(query_audit.QueryAuditMiddleware, budgets=QUERY_BUDGETS)
+    for bind in INSTRUMENTED_ENGINES:
+        query_audit.instrument_engine(bind)
 
-def verify_password(password: str, password_hash: str) -> bool:
-    return hash_password(password) == password_hash
+# ------------------------------
+# Utilidades: Senhas (security.py) e JWT
+# ------------------------------
 
 def b64url_encode(data: bytes) -> str:
     return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
@@ -117,6 +216,7 @@ def jwt_encode(payload: dict, secret: str) -> str:
     signature_b64 = b64url_encode(signature)
     return f"{header_b64}.{payload_b64}.{signature_b64}"
 
+@tracing.traced("auth.jwt_decode")
 def jwt_decode(token: str, secret: str) -> dict:
     try:
         parts = token.split(".")
@@ -152,22 +252,252 @@ def get_user_from_token(request: Request) -> dict:
     return payload
 
 def require_roles(roles: Optional[List[str]] = None):
-    def _dependency(request: Request):
+    # async sem I/O: roda direto no event loop, sem ocupar o threadpool
+    async def _dependency(request: Request):
         payload = get_user_from_token(request)
         user_role = payload.get("role")
         if roles and user_role not in roles:
-            print(f"[AUTH DEBUG] 403 Forbidden. User Role: '{user_role}'. Required one of: {roles}")
             # Try Case insensitive
             roles_lower = [r.lower() for r in roles]
             if user_role and user_role.lower() in roles_lower:
                  # Allow if case mismatch was the only issue, but warn
-                 print(f"[AUTH WARN] Allowed due to case-insensitive match.")
+                 logs.log_limited(auth_log, ("case_match", user_role), logging.WARNING, "Papel aceito por comparação sem maiúsculas", role=user_role, required=roles)
                  return payload
 
+            # Com limite por (rota, usuário): um cliente insistindo em rota proibida não enche o log
+            # nem esconde os 403 dos outros
+            route = getattr(request.scope.get("route"), "path", request.url.path)
+            logs.log_limited(auth_log, ("forbidden", route, payload.get("id")), logging.WARNING, "Acesso negado", role=user_role, required=roles, path=request.url.path, userId=payload.get("id"))
             raise HTTPException(status_code=403, detail="Sem permissão")
         return payload
     return _dependency
 
+# Profiler sob demanda (profiling.py): header X-Profile só vale com token de admin
+def is_admin_request(scope) -> bool:
+    try:
+        return get_user_from_token(Request(scope)).get("role") == "admin"
+    except HTTPException:
+        return False
+
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilerMiddleware, is_admin=is_admin_request)
+
+# Tracing: span da requisição envolvendo os outros middlewares, um span por statement SQL
+if tracing.TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+    for bind in INSTRUMENTED_ENGINES:
+        tracing.instrument_engine(bind)
+
+# Consultas lentas (acima de SLOW_QUERY_MS) com EXPLAIN amostrado: GET /admin/slow-queries
+if slow_queries.SLOW_QUERY_ENABLED:
+    for bind in INSTRUMENTED_ENGINES:
+        slow_queries.instrument_engine(bind)
+
+# Cada add_middleware envolve os anteriores. Ordem final, de fora para dentro:
+# RequestId -> Tracing -> Profiler -> QueryAudit -> Metrics -> CORS -> rotas
+# (Tracing, Profiler, QueryAudit e Metrics só quando habilitados).
+# O request id vem primeiro para valer também nos logs dos outros middlewares
+app.add_middleware(logs.RequestIdMiddleware)
+
+# ------------------------------
+# Roteamento de leitura (réplica) e read-your-writes
+# ------------------------------
+
+_primary_pins: Dict[int, int] = {}  # user_id -> expira_em (epoch)
+
+def pin_to_primary(response: Response, user_id: Optional[int]):
+    # Cookie cobre vários workers; o mapa em memória cobre clientes que só usam o header Bearer
+    if not replica:
+        return
+    now = int(time.time())
+    until = now + READ_YOUR_WRITES_SECONDS
+    if user_id:
+        if len(_primary_pins) > 10000:
+            for u_id in [u for u, exp in _primary_pins.items() if exp <= now]:
+                _primary_pins.pop(u_id, None)
+        _primary_pins[user_id] = until
+    response.set_cookie(PIN_COOKIE, str(until), max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax", path="/")
+
+def is_pinned(request: Request) -> bool:
+    if not replica:
+        return True
+    now = int(time.time())
+    cookie = request.cookies.get(PIN_COOKIE)
+    if cookie and cookie.isdigit() and int(cookie) > now:
+        return True
+    try:
+        user_id = get_user_from_token(request).get("id")
+    except HTTPException:
+        return False
+    return _primary_pins.get(user_id, 0) > now
+
+def get_read_db(request: Request):
+    # Rotas só de leitura (relatórios, listagens): réplica quando configurada e saudável
+    db = read_session_factory(is_pinned(request))()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    async with async_read_session_factory(is_pinned(request))() as db:
+        yield db
+
+# ------------------------------
+# Listagens: paginação (keyset) e campos esparsos
+# ------------------------------
+
+def paginate(query, id_column, response: Response, cursor: Optional[int], limit: Optional[int]):
+    # Keyset no id: a próxima página começa depois do último id devolvido (header X-Next-Cursor).
+    # Sem cursor nem limit mantém o comportamento antigo (lista completa).
+    query = query.order_by(id_column)
+    if cursor is not None:
+        query = query.filter(id_column > cursor)
+    if cursor is None and limit is None:
+        return query.all()
+
+    page_size = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+    rows = query.limit(page_size + 1).all()
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return rows
+
+def parse_fields(fields: Optional[str], allowed: List[str]) -> List[str]:
+    # fields=id,title -> apenas esses campos no payload (ex: para omitir "questions")
+    if not fields:
+        return allowed
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown)}. Use: {', '.join(allowed)}")
+    return selected
+
+def load_questions_by_form(db: Session, form_ids) -> Dict[int, List[models.Question]]:
+    # Perguntas (com grupo) de vários formulários numa única consulta, na ordem de criação
+    by_form = {f_id: [] for f_id in form_ids}
+    if not by_form:
+        return by_form
+    questions = (
+        db.query(models.Question)
+        .options(joinedload(models.Question.group))
+        .filter(models.Question.form_id.in_(by_form.keys()))
+        .order_by(models.Question.id)
+        .all()
+    )
+    for q in questions:
+        by_form[q.form_id].append(q)
+    return by_form
+
+# ------------------------------
+# Validadores de submissão compilados por formulário
+# ------------------------------
+
+# Limites por scale_type; tipos desconhecidos usam a escala Likert padrão (a pontuação assume 1..5)
+SCALE_BOUNDS = {"5-point": (1, 5)}
+DEFAULT_SCALE_BOUNDS = (1, 5)
+
+class FormValidator:
+    # Regras de um formulário compiladas uma vez. Formulários não são editados após criados,
+    # então a entrada vale pelo processo inteiro.
+    __slots__ = ("form_id", "layout", "bounds")
+
+    def __init__(self, form_id: int, questions):
+        # questions: [(question_id, nome_do_grupo, scale_type)] ordenadas por id
+        self.form_id = form_id
+        self.layout = [(q_id, g_name or "") for q_id, g_name, _ in questions]
+        self.bounds = {q_id: SCALE_BOUNDS.get(scale_type, DEFAULT_SCALE_BOUNDS) for q_id, _, scale_type in questions}
+
+    def check(self, answers):
+        # Uma passada só: cada resposta é um lookup no dicionário de limites.
+        # Pergunta repetida contaria duas vezes em "rows" e só a última em "packed": é recusada.
+        bounds = self.bounds
+        seen = set()
+        for ans in answers:
+            if ans.questionId in seen:
+                raise HTTPException(status_code=400, detail=f"Pergunta respondida mais de uma vez: {ans.questionId}")
+            seen.add(ans.questionId)
+            limits = bounds.get(ans.questionId)
+            if limits is None:
+                # Compatibilidade: Se o frontend enviar IDs antigos (1,2,3) mas o banco tem IDs novos (45,46...)
+                # isso vai quebrar. O frontend deve usar os IDs que vieram do GET /my-assignments ou GET /forms
+                # Assumimos que o fluxo é: GET form (recebe IDs reais) -> POST response (usa IDs reais)
+                raise HTTPException(status_code=400, detail=f"Pergunta inválida para este formulário: {ans.questionId}")
+            if ans.value < limits[0] or ans.value > limits[1]:
+                raise HTTPException(status_code=400, detail=f"Valor fora da escala ({limits[0]}-{limits[1]})")
+
+_form_validators: Dict[int, FormValidator] = {}
+_form_validators_lock = threading.Lock()
+
+def get_form_validators(db: Session, form_ids) -> Dict[int, FormValidator]:
+    # Formulários fora do cache são compilados juntos numa única consulta
+    form_ids = set(form_ids)
+    missing = form_ids - _form_validators.keys()
+    if missing:
+        questions = {f_id: [] for f_id in missing}
+        rows = (
+            db.query(models.Question.form_id, models.Question.id, models.QuestionGroup.name, models.Question.scale_type)
+            .outerjoin(models.QuestionGroup, models.QuestionGroup.id == models.Question.group_id)
+            .filter(models.Question.form_id.in_(missing))
+            .order_by(models.Question.id)
+        )
+        for f_id, q_id, g_name, scale_type in rows:
+            questions[f_id].append((q_id, g_name, scale_type))
+        # Form sem perguntas pode ser um id inexistente: não fica no cache
+        compiled = {f_id: FormValidator(f_id, qs) for f_id, qs in questions.items() if qs}
+        with _form_validators_lock:
+            _form_validators.update(compiled)
+    return {f_id: _form_validators.get(f_id) or FormValidator(f_id, []) for f_id in form_ids}
+
+def load_form_layouts(db: Session, form_ids) -> Dict[int, List[tuple]]:
+    # Perguntas de cada formulário na ordem do layout compacto: [(question_id, nome_do_grupo)]
+    return {f_id: v.layout for f_id, v in get_form_validators(db, form_ids).items()}
+
+def pack_answers(layout, answers) -> List[Optional[int]]:
+    # Alinha os valores à ordem das perguntas do formulário (None = sem resposta)
+    position = {q_id: idx for idx, (q_id, _) in enumerate(layout)}
+    packed = [None] * len(layout)
+    for ans in answers:
+        packed[position[ans["questionId"]]] = ans["value"]
+    return packed
+
+# ------------------------------
+# Feed de mudanças de atribuições
+# ------------------------------
+
+class AssignmentFeed:
+    # Versão em memória por avaliador. O long-poll só vai ao banco quando ela muda
+    # (ou a cada FEED_DB_RECHECK s, para enxergar eventos gravados por outros workers).
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = {}
+
+    def notify(self, user_ids):
+        with self._lock:
+            for u_id in user_ids:
+                self._versions[u_id] = self._versions.get(u_id, 0) + 1
+
+    def version(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+assignment_feed = AssignmentFeed()
+
+def record_assignment_events(db: Session, events):
+    # events: [(user_id, application_id, kind)] -> um INSERT multi-linha, na mesma transação da mudança.
+    # O id (cursor do feed) sai do SERIAL no INSERT, não no commit: sem o lock por avaliador, duas
+    # transações dele poderiam commitar fora da ordem dos ids e o cliente pularia o id menor.
+    # O lock vai até o commit; usuários em ordem crescente para não haver deadlock entre transações.
+    if not events:
+        return
+    db.execute(
+        text("SELECT pg_advisory_xact_lock(:lock_id, u) FROM (SELECT u FROM unnest(CAST(:users AS integer[])) AS u ORDER BY u) ordered"),
+        {"lock_id": FEED_LOCK_ID, "users": sorted({u_id for u_id, _, _ in events})}
+    )
+    now = int(time.time())
+    db.execute(insert(models.AssignmentEvent), [
+        {"user_id": u_id, "application_id": a_id, "kind": kind, "created_at": now} for u_id, a_id, kind in events
+    ])
+
 # ------------------------------
 # Rotas
 # ------------------------------
@@ -176,6 +506,66 @@ def require_roles(roles: Optional[List[str]] = None):
 def read_root():
     return {"status": "online", "message": "API de Formulários rodando com PostgreSQL."}
 
+@app.get("/health/ready")
+def readiness(response: Response):
+    # Probe de prontidão (compose/orquestrador): banco acessível e schema na versão esperada
+    try:
+        with engine.connect() as conn:
+            version = current_version(conn)
+    except Exception as e:
+        response.status_code = 503
+        return {"ready": False, "detail": f"Banco indisponível: {e.__class__.__name__}"}
+    if version < LATEST_VERSION:
+        response.status_code = 503
+        return {"ready": False, "detail": f"Schema na versão {version}, esperado {LATEST_VERSION}"}
+    return {"ready": True, "schemaVersion": version}
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Métricas desativadas")
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profiles")
+def list_profiles(_=Depends(require_roles(["admin"]))):
+    # Perfis recentes (mais novos primeiro); pedir um: header "X-Profile: 1" com token de admin
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler desativado")
+    return profiling.list_profiles()
+
+@app.get("/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, _=Depends(require_roles(["admin"]))):
+    # Pilhas colapsadas: abrir no speedscope ou gerar o SVG com flamegraph.pl
+    path = profiling.profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{profile_id}.collapsed")
+
+def memory_traces() -> tracing.MemoryExporter:
+    tracing.flush()
+    if not isinstance(tracing.exporter, tracing.MemoryExporter):
+        raise HTTPException(status_code=404, detail="Traces em memória desativados (TRACE_EXPORTER=memory)")
+    return tracing.exporter
+
+@app.get("/admin/traces")
+def list_traces(limit: int = 20, _=Depends(require_roles(["admin"]))):
+    # Desenvolvimento: traces mais recentes do exportador em memória
+    return memory_traces().traces(max(1, min(limit, tracing.MEMORY_TRACES)))
+
+@app.get("/admin/slow-queries")
+def list_slow_queries(route: Optional[str] = None, limit: int = 50, _=Depends(require_roles(["admin"]))):
+    # route no formato "GET /reports/export-pdf"; resumo ordenado pelo tempo total gasto
+    if not slow_queries.SLOW_QUERY_ENABLED:
+        raise HTTPException(status_code=404, detail="Captura de consultas lentas desativada")
+    return slow_queries.report(route, max(1, min(limit, slow_queries.SLOW_QUERY_KEEP)))
+
+@app.get("/admin/traces/{trace_id}")
+def get_trace(trace_id: str, _=Depends(require_roles(["admin"]))):
+    spans = memory_traces().trace(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace não encontrado")
+    return {"traceId": trace_id, "spans": spans}
+
 # --- AUTH ---
 
 @app.post("/auth/register")
@@ -200,11 +590,13 @@ def register_user(payload: RegisterSchema, db: Session = Depends(get_db)):
     return {"status": "success", "message": "Usuário cadastrado"}
 
 @app.post("/auth/login")
-def login_user(payload: LoginSchema, response: Response, db: Session = Depends(get_db)):
+def login_user(payload: LoginSchema, request: Request, response: Response, db: Session = Depends(get_db)):
     username = payload.username.strip().lower()
     user = db.query(models.User).filter(models.User.username == username).first()
     
     if not user or not verify_password(payload.password, user.password_hash):
+        client = request.client.host if request.client else None
+        logs.log_limited(auth_log, ("login_failed", client), logging.WARNING, "Login inválido", username=username[:64], client=client)
         raise HTTPException(status_code=401, detail="Credenciais inválidas")
 
     token = create_token(user)
@@ -231,8 +623,8 @@ def me(user=Depends(require_roles())):
 # --- FORMS ---
 
 @app.post("/forms")
-def create_form(form: FormSchema, user=Depends(require_roles(["admin"])), db: Session = Depends(get_db)):
-    print(f"[LOG] Recebendo novo formulário: {form.title}")
+def create_form(form: FormSchema, response: Response, user=Depends(require_roles(["admin"])), db: Session = Depends(get_db)):
+    log.info("Recebendo novo formulário", extra={"title": form.title})
     
     try:
         creator_id = user.get("id") 
@@ -248,36 +640,29 @@ def create_form(form: FormSchema, user=Depends(require_roles(["admin"])), db: Se
         db.add(new_form)
         db.flush()
 
-        # Dicionário para cachear grupos criados: nome -> objeto QuestionGroup
+        # Grupos primeiro, todos num flush só (um INSERT em lote, não um por grupo): nome -> QuestionGroup
         groups_map = {}
-
         for q in form.questions:
-            group_id = None
-            if q.group:
-                # Normaliza nome
-                g_name = q.group.strip()
-                if g_name:
-                    if g_name not in groups_map:
-                        # Cria novo grupo
-                        new_group = models.QuestionGroup(
-                            form_id=new_form.id,
-                            name=g_name
-                        )
-                        db.add(new_group)
-                        db.flush() # Precisa do ID
-                        groups_map[g_name] = new_group
-                    group_id = groups_map[g_name].id
-
-            new_q = models.Question(
+            # Normaliza nome
+            g_name = (q.group or "").strip()
+            if g_name and g_name not in groups_map:
+                groups_map[g_name] = models.QuestionGroup(form_id=new_form.id, name=g_name)
+        db.add_all(groups_map.values())
+        db.flush() # Precisa dos IDs
+
+        db.add_all([
+            models.Question(
                 form_id=new_form.id,
-                group_id=group_id,
+                group_id=groups_map[(q.group or "").strip()].id if (q.group or "").strip() else None,
                 text=q.text,
                 example=q.example,
                 scale_type=q.scaleType
             )
-            db.add(new_q)
+            for q in form.questions
+        ])
         
         db.commit()
+        pin_to_primary(response, creator_id)
         db.refresh(new_form)
         
         count = db.query(models.Form).count()
@@ -289,43 +674,57 @@ def create_form(form: FormSchema, user=Depends(require_roles(["admin"])), db: Se
         }
         
     except Exception as e:
-        print(f"[ERRO] Falha ao salvar: {str(e)}")
+        log.exception("Falha ao salvar formulário", extra={"title": form.title})
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Erro interno ao salvar dados: {str(e)}")
 
+FORM_FIELDS = ["id", "title", "description", "questions"]
+
 @app.get("/forms")
-def get_forms(user=Depends(require_roles(["admin", "avaliador", "stakeholder", "engenheiro"])), db: Session = Depends(get_db)):
-    forms = db.query(models.Form).all()
-    result = []
-    for f in forms:
-        questions_data = []
-        for q in f.questions:
-            questions_data.append({
+def get_forms(response: Response, cursor: Optional[int] = None, limit: Optional[int] = None, fields: Optional[str] = None, user=Depends(require_roles(["admin", "avaliador", "stakeholder", "engenheiro"])), db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, FORM_FIELDS)
+    forms = paginate(db.query(models.Form), models.Form.id, response, cursor, limit)
+
+    # Perguntas (e grupos) da página inteira numa única consulta
+    questions_by_form = {f.id: [] for f in forms}
+    if "questions" in selected:
+        for f_id, questions in load_questions_by_form(db, questions_by_form.keys()).items():
+            questions_by_form[f_id] = [{
                 "id": q.id,
                 "text": q.text,
                 "example": q.example,
                 "scaleType": q.scale_type,
                 "group": q.group.name if q.group else None,
                 "groupId": q.group_id
-            })
+            } for q in questions]
 
-        result.append({
+    result = []
+    for f in forms:
+        item = {
             "id": f.id,
             "title": f.title,
             "description": f.description,
-            "questions": questions_data
-        })
+            "questions": questions_by_form[f.id]
+        }
+        result.append({k: item[k] for k in selected})
     return result
 
 # --- USERS ---
 
+USER_FIELDS = ["id", "username", "role"]
+
 @app.get("/users")
-def list_users(role: Optional[str] = None, _=Depends(require_roles(["admin", "engenheiro"])), db: Session = Depends(get_db)):
+def list_users(response: Response, role: Optional[str] = None, cursor: Optional[int] = None, limit: Optional[int] = None, fields: Optional[str] = None, _=Depends(require_roles(["admin", "engenheiro"])), db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, USER_FIELDS)
     query = db.query(models.User)
     if role:
         query = query.filter(models.User.role == role.strip().lower())
-    users = query.all()
-    return [{"id": u.id, "username": u.username, "role": u.role} for u in users]
+    users = paginate(query, models.User.id, response, cursor, limit)
+    result = []
+    for u in users:
+        item = {"id": u.id, "username": u.username, "role": u.role}
+        result.append({k: item[k] for k in selected})
+    return result
 
 # --- APPLICATIONS ---
 
@@ -345,49 +744,73 @@ class ResponseSchema(BaseModel):
     applicationId: int
     formId: int
     answers: List[AnswerItem]
+    idempotencyKey: Optional[str] = None # Alternativa ao header Idempotency-Key (usada no lote)
+
+class ResponseBatchSchema(BaseModel):
+    responses: List[ResponseSchema]
+
+class AssignmentRow(BaseModel):
+    applicationId: int
+    evaluators: List[str]  # usernames (ou ids), como em ApplicationSchema
+
+class AssignmentMatrixSchema(BaseModel):
+    assignments: List[AssignmentRow]
+
+APPLICATION_FIELDS = ["id", "name", "type", "url", "formId", "evaluators"]
+
+def load_evaluator_names(db: Session, app_ids) -> Dict[int, List[str]]:
+    # Filtra direto em application_evaluators.application_id (usa a PK); o selectinload da relação
+    # filtrava só em applications e o Postgres varria a tabela de associação inteira
+    by_app = {}
+    if not app_ids:
+        return by_app
+    ae = models.application_evaluators
+    rows = (
+        db.query(ae.c.application_id, models.User.username)
+        .join(models.User, models.User.id == ae.c.user_id)
+        .filter(ae.c.application_id.in_(app_ids))
+        .order_by(ae.c.application_id, models.User.id)
+    )
+    for app_id, username in rows:
+        by_app.setdefault(app_id, []).append(username)
+    return by_app
 
 @app.get("/applications")
-def get_applications(_=Depends(require_roles(["admin", "engenheiro", "stakeholder"])), db: Session = Depends(get_db)):
-    apps = db.query(models.Application).all()
+def get_applications(response: Response, cursor: Optional[int] = None, limit: Optional[int] = None, fields: Optional[str] = None, _=Depends(require_roles(["admin", "engenheiro", "stakeholder"])), db: Session = Depends(get_read_db)):
+    selected = parse_fields(fields, APPLICATION_FIELDS)
+    apps = paginate(db.query(models.Application), models.Application.id, response, cursor, limit)
+    evaluators_by_app = load_evaluator_names(db, [a.id for a in apps]) if "evaluators" in selected else {}
     result = []
     for a in apps:
-        result.append({
+        item = {
             "id": a.id,
             "name": a.name,
             "type": a.type,
             "url": a.url,
             "formId": a.form_id,
-            "evaluators": [u.username for u in a.evaluators] # Compatibilidade: devolver nomes
-        })
+            "evaluators": evaluators_by_app.get(a.id, []) if "evaluators" in selected else None # Compatibilidade: devolver nomes
+        }
+        result.append({k: item[k] for k in selected})
     return result
 
 @app.post("/applications")
-def create_application(app_data: ApplicationSchema, user=Depends(require_roles(["engenheiro", "admin"])), db: Session = Depends(get_db)):
+def create_application(app_data: ApplicationSchema, response: Response, user=Depends(require_roles(["engenheiro", "admin"])), db: Session = Depends(get_db)):
     # valida formId
     form = db.query(models.Form).filter(models.Form.id == app_data.formId).first()
     if not form:
         raise HTTPException(status_code=400, detail="formId inválido")
 
     # Mapear evaluators (usernames ou ids?) - Schema diz str (usernames)
-    evaluators_objects = []
-    for ident in app_data.evaluators:
-        # Tenta achar por username
-        u = db.query(models.User).filter(models.User.username == ident).first()
-        if not u:
-             # Se falhar, tenta achar por ID (caso venha string de numero)
-             if ident.isdigit():
-                 u = db.query(models.User).filter(models.User.id == int(ident)).first()
-        
-        if u and u.role == "avaliador":
-            evaluators_objects.append(u)
-        else:
-             raise HTTPException(status_code=400, detail=f"Avaliador inválido ou não encontrado: {ident}")
+    # Resolve todos de uma vez (uma consulta por lote, não uma por avaliador)
+    user_ids = resolve_evaluators(db, app_data.evaluators)
+    users_by_id = {u.id: u for u in db.query(models.User).filter(models.User.id.in_(set(user_ids.values())))} if user_ids else {}
+    evaluators_objects = list({user_ids[ident]: users_by_id[user_ids[ident]] for ident in app_data.evaluators}.values())
 
     # Verifica se já existe aplicação com mesmo nome
     existing_app = db.query(models.Application).filter(models.Application.name == app_data.name).first()
 
     if existing_app:
-        print(f"[LOG] Atualizando aplicação existente ID {existing_app.id}")
+        log.info("Atualizando aplicação existente", extra={"applicationId": existing_app.id})
         # Atualiza campos
         existing_app.type = app_data.appType
         if app_data.url:
@@ -397,13 +820,15 @@ def create_application(app_data: ApplicationSchema, user=Depends(require_roles([
 
         # Merge de avaliadores
         current_ids = {u.id for u in existing_app.evaluators}
+        added_ids = []
         for u in evaluators_objects:
             if u.id not in current_ids:
                 existing_app.evaluators.append(u)
+                added_ids.append(u.id)
         
         target_app = existing_app
     else:
-        print(f"[LOG] Criando nova aplicação")
+        log.info("Criando nova aplicação", extra={"applicationName": app_data.name})
         new_app = models.Application(
             name=app_data.name,
             type=app_data.appType,
@@ -413,8 +838,10 @@ def create_application(app_data: ApplicationSchema, user=Depends(require_roles([
         new_app.evaluators = evaluators_objects
         db.add(new_app)
         target_app = new_app
+        added_ids = [u.id for u in evaluators_objects]
     
     db.flush() 
+    record_assignment_events(db, [(u_id, target_app.id, "assigned") for u_id in added_ids])
 
     # Salvar Pesos (Atualiza ou Cria)
     if app_data.groupWeights:
@@ -440,6 +867,8 @@ def create_application(app_data: ApplicationSchema, user=Depends(require_roles([
                 pass 
     
     db.commit()
+    assignment_feed.notify(added_ids)
+    pin_to_primary(response, user.get("id"))
     db.refresh(target_app)
     
     return {
@@ -453,109 +882,485 @@ def create_application(app_data: ApplicationSchema, user=Depends(require_roles([
 
 # --- ASSIGNMENTS ---
 
-@app.get("/my-assignments")
-def my_assignments(me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
-    username = me.get("sub")
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-        return []
+def resolve_evaluators(db: Session, idents) -> Dict[str, int]:
+    # Resolve usernames (ou ids numéricos) de avaliadores em lote: ident -> user_id
+    idents = set(idents)
+    resolved = {}
+    rows = db.query(models.User.id, models.User.username, models.User.role).filter(models.User.username.in_(idents)).all()
+    by_username = {username for _, username, _ in rows}
+    for u_id, username, role in rows:
+        if role == "avaliador":
+            resolved[username] = u_id
+
+    # Como antes: username encontrado decide (outro papel é erro); id numérico só sem username
+    # Guardado pelo ident original: "007" resolve o id 7, como o int() da versão anterior
+    numeric = {i: int(i) for i in idents - by_username if i.isdigit()}
+    if numeric:
+        rows = db.query(models.User.id, models.User.role).filter(models.User.id.in_(set(numeric.values()))).all()
+        evaluator_ids = {u_id for u_id, role in rows if role == "avaliador"}
+        for ident, u_id in numeric.items():
+            if u_id in evaluator_ids:
+                resolved[ident] = u_id
+
+    missing = idents - set(resolved)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Avaliador inválido ou não encontrado: {', '.join(sorted(missing))}")
+    return resolved
+
+@app.put("/assignments")
+def sync_assignments(payload: AssignmentMatrixSchema, response: Response, user=Depends(require_roles(["engenheiro", "admin"])), db: Session = Depends(get_db)):
+    # Sincroniza a matriz avaliadores x aplicações: para cada aplicação enviada,
+    # os avaliadores passam a ser exatamente os informados. Aplicações fora do payload não mudam.
+    app_ids = {row.applicationId for row in payload.assignments}
+    if not app_ids:
+        return {"status": "success", "added": 0, "removed": 0, "total": 0}
+
+    found = {a_id for (a_id,) in db.query(models.Application.id).filter(models.Application.id.in_(app_ids))}
+    missing_apps = app_ids - found
+    if missing_apps:
+        raise HTTPException(status_code=400, detail=f"Aplicação inválida: {', '.join(str(i) for i in sorted(missing_apps))}")
+
+    user_ids = resolve_evaluators(db, {ident for row in payload.assignments for ident in row.evaluators})
+    desired = {(row.applicationId, user_ids[ident]) for row in payload.assignments for ident in row.evaluators}
+
+    ae = models.application_evaluators
+    current = {
+        (a_id, u_id)
+        for a_id, u_id in db.execute(select(ae.c.application_id, ae.c.user_id).where(ae.c.application_id.in_(app_ids)))
+    }
+
+    to_add = sorted(desired - current)
+    to_remove = sorted(current - desired)
+
+    # Um DELETE e um INSERT multi-linha, em vez de uma operação ORM por vínculo
+    if to_remove:
+        db.execute(delete(ae).where(tuple_(ae.c.application_id, ae.c.user_id).in_(to_remove)))
+    if to_add:
+        db.execute(insert(ae), [{"application_id": a_id, "user_id": u_id} for a_id, u_id in to_add])
+
+    record_assignment_events(
+        db,
+        [(u_id, a_id, "assigned") for a_id, u_id in to_add] + [(u_id, a_id, "unassigned") for a_id, u_id in to_remove]
+    )
+    db.commit()
+    assignment_feed.notify({u_id for _, u_id in to_add + to_remove})
+    pin_to_primary(response, user.get("id"))
+    return {"status": "success", "added": len(to_add), "removed": len(to_remove), "total": len(desired)}
+
+def build_assignment_tasks(db: Session, user_id: int, application_ids=None) -> List[dict]:
+    # Pendentes = atribuídas sem resposta do avaliador (anti-join), numa única consulta.
+    # Campanhas arquivadas não aparecem mais.
+    ae = models.application_evaluators
+    answered = exists().where(
+        models.Response.application_id == models.Application.id,
+        models.Response.evaluator_id == user_id
+    )
+    archived = exists().where(models.ApplicationArchive.application_id == models.Application.id)
+    query = (
+        db.query(models.Application.id, models.Application.name, models.Application.form_id, models.Form.title)
+        .join(ae, ae.c.application_id == models.Application.id)
+        .outerjoin(models.Form, models.Form.id == models.Application.form_id)
+        .filter(ae.c.user_id == user_id, ~answered, ~archived)
+    )
+    if application_ids is not None:
+        query = query.filter(models.Application.id.in_(application_ids))
+    pending = query.order_by(models.Application.id).all()
+
+    questions_by_form = load_questions_by_form(db, {form_id for _, _, form_id, title in pending if title is not None})
 
-    # SQLAlchemy relationship
-    assigned_apps = user.assigned_applications
-    
     tasks = []
-    for app_obj in assigned_apps:
-        # Check if already responded
-        resp = db.query(models.Response).filter(
-            models.Response.application_id == app_obj.id,
-            models.Response.evaluator_id == user.id
-        ).first()
-
-        # Requirement: Do not show if completed
-        if resp:
-            continue
-        
-        form_obj = app_obj.form
-        
-        q_list = []
-        if form_obj:
-            for q in form_obj.questions:
-                g_name = "Geral"
-                if q.group:
-                    g_name = q.group.name
-                q_list.append({
-                    "id": q.id, 
-                    "text": q.text, 
+    for app_id, app_name, form_id, form_title in pending:
+        form_payload = None
+        if form_title is not None:
+            form_payload = {
+                "id": form_id,
+                "title": form_title,
+                "questions": [{
+                    "id": q.id,
+                    "text": q.text,
                     "scaleType": q.scale_type,
-                    "example": q.example, # Include example too
-                    "group": g_name
-                })
-
+                    "example": q.example,
+                    "group": q.group.name if q.group else "Geral"
+                } for q in questions_by_form[form_id]]
+            }
         tasks.append({
-            "applicationId": app_obj.id,
-            "applicationName": app_obj.name,
-            "formId": app_obj.form_id,
-            "form": {
-                 "id": form_obj.id, 
-                 "title": form_obj.title,
-                 "questions": q_list
-            } if form_obj else None
+            "applicationId": app_id,
+            "applicationName": app_name,
+            "formId": form_id,
+            "form": form_payload
         })
     return tasks
 
-# --- RESPONSES ---
+def resolve_user_id(db: Session, me: dict) -> Optional[int]:
+    # Tokens atuais já trazem o id; tokens antigos só o username
+    if me.get("id"):
+        return me["id"]
+    user = db.query(models.User).filter(models.User.username == me.get("sub")).first()
+    return user.id if user else None
 
-@app.post("/responses")
-def submit_response(payload: ResponseSchema, me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
-    # Pegar usuario
-    username = me.get("sub")
-    user = db.query(models.User).filter(models.User.username == username).first()
-    if not user:
-         raise HTTPException(status_code=403, detail="Usuário não encontrado")
+def list_my_assignments(db: Session, me: dict) -> List[dict]:
+    user_id = resolve_user_id(db, me)
+    if not user_id:
+        return []
+    return build_assignment_tasks(db, user_id)
+
+# Rotas quentes: no modo async (DB_ASYNC=1) a mesma lógica roda via AsyncSession.run_sync,
+# no event loop, em vez de ocupar uma thread do threadpool por requisição.
+if DB_ASYNC:
+    @app.get("/my-assignments")
+    async def my_assignments(me=Depends(require_roles(["avaliador"])), db: AsyncSession = Depends(get_async_db)):
+        return await db.run_sync(list_my_assignments, me)
+else:
+    @app.get("/my-assignments")
+    def my_assignments(me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
+        return list_my_assignments(db, me)
+
+def fetch_assignment_changes(user_id: int, cursor: int) -> dict:
+    # Sessão curta própria: o long-poll não segura conexão do pool enquanto espera
+    db = SessionLocal()
+    try:
+        events = (
+            db.query(models.AssignmentEvent)
+            .filter(models.AssignmentEvent.user_id == user_id, models.AssignmentEvent.id > cursor)
+            .order_by(models.AssignmentEvent.id)
+            .limit(FEED_PAGE_SIZE)
+            .all()
+        )
+        assigned_ids = {e.application_id for e in events if e.kind == "assigned"}
+        tasks = {}
+        if assigned_ids:
+            tasks = {t["applicationId"]: t for t in build_assignment_tasks(db, user_id, assigned_ids)}
+        return {
+            "cursor": events[-1].id if events else cursor,
+            "events": [{
+                "seq": e.id,
+                "applicationId": e.application_id,
+                "kind": e.kind,
+                "createdAt": e.created_at,
+                # Para novas atribuições ainda pendentes, já devolve o payload da tarefa
+                "assignment": tasks.get(e.application_id) if e.kind == "assigned" else None
+            } for e in events]
+        }
+    finally:
+        db.close()
+
+@app.get("/my-assignments/changes")
+async def my_assignments_changes(cursor: int = 0, timeout: int = 25, me=Depends(require_roles(["avaliador"]))):
+    # Long-poll: devolve os eventos com seq > cursor; sem eventos, espera até algo mudar ou o timeout
+    user_id = me.get("id")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Token sem id de usuário, faça login novamente")
+
+    deadline = time.monotonic() + max(0, min(timeout, FEED_MAX_TIMEOUT))
+    while True:
+        version = assignment_feed.version(user_id)
+        result = await run_in_threadpool(profiling.call, fetch_assignment_changes, user_id, cursor)
+        if result["events"] or time.monotonic() >= deadline:
+            return result
+
+        recheck_at = min(deadline, time.monotonic() + FEED_DB_RECHECK)
+        while time.monotonic() < recheck_at and assignment_feed.version(user_id) == version:
+            await asyncio.sleep(FEED_WAKE_INTERVAL)
 
-    # Valida Application
-    app_obj = db.query(models.Application).filter(models.Application.id == payload.applicationId).first()
-    if not app_obj:
+# --- RESPONSES ---
+
+def check_submission(payload: ResponseSchema, app_form_id: Optional[int], assigned: bool, validator: Optional[FormValidator], archived: bool = False):
+    # Regras de validação de uma submissão; levanta HTTPException com o mesmo status/mensagem do POST /responses
+    if app_form_id is None:
         raise HTTPException(status_code=400, detail="Aplicação inválida")
-    
+
+    # Campanha arquivada: a partição das respostas não existe mais
+    if archived:
+        raise HTTPException(status_code=409, detail="Aplicação arquivada, não recebe mais avaliações")
+
     # Verifica permissão (se está na lista de evaluators)
-    if user not in app_obj.evaluators:
+    if not assigned:
         raise HTTPException(status_code=403, detail="Não atribuído a esta aplicação")
-        
-    if payload.formId != app_obj.form_id:
+
+    if payload.formId != app_form_id:
         raise HTTPException(status_code=400, detail="Formulário não corresponde à aplicação")
-    
+
     # Valida perguntas
-    form_questions_ids = {q.id for q in app_obj.form.questions}
-    for ans in payload.answers:
-        if ans.questionId not in form_questions_ids:
-            # Compatibilidade: Se o frontend enviar IDs antigos (1,2,3) mas o banco tem IDs novos (45,46...)
-            # isso vai quebrar. O frontend deve usar os IDs que vieram do GET /my-assignments ou GET /forms
-            # Assumimos que o fluxo é: GET form (recebe IDs reais) -> POST response (usa IDs reais)
-            raise HTTPException(status_code=400, detail=f"Pergunta inválida para este formulário: {ans.questionId}")
-        if ans.value < 1 or ans.value > 5:
-            raise HTTPException(status_code=400, detail="Valor fora da escala (1-5)")
-
-    # Criar Response
-    new_resp = models.Response(
-        application_id=payload.applicationId,
-        form_id=payload.formId,
-        evaluator_id=user.id,
-        created_at=int(time.time())
+    validator.check(payload.answers)
+
+def check_idempotency(key: Optional[str], existing_key: Optional[str]):
+    # Já existe avaliação deste avaliador para a aplicação: com outra chave de idempotência
+    # não é uma retentativa, é um envio diferente
+    if key and existing_key and key != existing_key:
+        raise HTTPException(status_code=409, detail="Avaliação já enviada para esta aplicação")
+
+def submission_record(payload: ResponseSchema, user_id: int, idempotency_key: Optional[str] = None) -> dict:
+    # Forma serializável de uma submissão validada (usada no lote e no log da fila de ingestão)
+    return {
+        "applicationId": payload.applicationId,
+        "formId": payload.formId,
+        "evaluatorId": user_id,
+        "idempotencyKey": idempotency_key or payload.idempotencyKey,
+        "answers": [{"questionId": ans.questionId, "value": ans.value} for ans in payload.answers],
+        # O lote gravado pela fila de ingestão entra no trace da requisição que submeteu
+        "traceparent": tracing.current_traceparent(),
+    }
+
+def persist_responses(db: Session, records) -> Dict[tuple, tuple]:
+    # Grava submissões já validadas com INSERTs multi-linha, sem commit.
+    # Retorna {(application_id, evaluator_id): (response_id, inserida_agora, idempotency_key gravada)}.
+    firsts = {}
+    for rec in records:
+        firsts.setdefault((rec["applicationId"], rec["evaluatorId"]), rec)
+    if not firsts:
+        return {}
+
+    packed = ANSWER_STORAGE == "packed"
+    layouts = load_form_layouts(db, {rec["formId"] for rec in firsts.values()}) if packed else {}
+
+    now = int(time.time())
+    # ON CONFLICT: avaliações já gravadas (ex: reenvio do mesmo lote) não geram novas linhas
+    inserted = {
+        (a_id, e_id): (r_id, key) for a_id, e_id, r_id, key in db.execute(
+            pg_insert(models.Response)
+            .values([{
+                "application_id": a_id,
+                "form_id": rec["formId"],
+                "evaluator_id": e_id,
+                "created_at": now,
+                "idempotency_key": rec.get("idempotencyKey") or rec.get("id"),
+                "answer_values": pack_answers(layouts[rec["formId"]], rec["answers"]) if packed else None
+            } for (a_id, e_id), rec in firsts.items()])
+            .on_conflict_do_nothing(index_elements=["application_id", "evaluator_id"])
+            .returning(models.Response.application_id, models.Response.evaluator_id, models.Response.id, models.Response.idempotency_key)
+        )
+    }
+
+    if not packed:
+        answer_rows = []
+        for key, (resp_id, _) in inserted.items():
+            answer_rows.extend(
+                {"application_id": key[0], "response_id": resp_id, "question_id": ans["questionId"], "value": ans["value"]}
+                for ans in firsts[key]["answers"]
+            )
+        if answer_rows:
+            db.execute(insert(models.Answer), answer_rows)
+    record_assignment_events(db, [(e_id, a_id, "completed") for a_id, e_id in inserted])
+
+    existing = {}
+    missing = [key for key in firsts if key not in inserted]
+    if missing:
+        existing = {
+            (a_id, e_id): (r_id, key) for a_id, e_id, r_id, key in db.query(
+                models.Response.application_id, models.Response.evaluator_id, models.Response.id, models.Response.idempotency_key
+            ).filter(tuple_(models.Response.application_id, models.Response.evaluator_id).in_(missing))
+        }
+
+    outcome = {}
+    for key in firsts:
+        if key in inserted:
+            resp_id, stored_key = inserted[key]
+            outcome[key] = (resp_id, True, stored_key)
+        else:
+            resp_id, stored_key = existing.get(key, (None, None))
+            outcome[key] = (resp_id, False, stored_key)
+    return outcome
+
+def write_queued_submissions(records) -> dict:
+    # Writer da fila de ingestão: persiste um lote inteiro numa transação
+    with tracing.background("ingest.write_batch", [rec.get("traceparent") for rec in records], **{"batch.size": len(records)}):
+        db = SessionLocal()
+        try:
+            outcome = persist_responses(db, records)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    results = {}
+    seen = set()
+    for rec in records:
+        key = (rec["applicationId"], rec["evaluatorId"])
+        resp_id, is_new, _ = outcome[key]
+        results[rec["id"]] = {"status": "committed" if is_new and key not in seen else "duplicate", "responseId": resp_id}
+        seen.add(key)
+    assignment_feed.notify({e_id for (_, e_id), (_, is_new, _) in outcome.items() if is_new})
+    return results
+
+ingest_queue = IngestQueue(write_queued_submissions) if INGEST_MODE == "queue" else None
+
+def validate_submission(db: Session, payload: ResponseSchema, me: dict):
+    # Pegar usuario
+    user_id = resolve_user_id(db, me)
+    if not user_id:
+         raise HTTPException(status_code=403, detail="Usuário não encontrado")
+
+    # Valida Application (form + atribuição numa consulta; perguntas vêm do cache de validadores)
+    ae = models.application_evaluators
+    app_row = (
+        db.query(models.Application.form_id, ae.c.user_id, models.ApplicationArchive.application_id)
+        .outerjoin(ae, (ae.c.application_id == models.Application.id) & (ae.c.user_id == user_id))
+        .outerjoin(models.ApplicationArchive, models.ApplicationArchive.application_id == models.Application.id)
+        .filter(models.Application.id == payload.applicationId)
+        .first()
     )
-    db.add(new_resp)
-    db.flush() # ID
-    
-    for ans in payload.answers:
-        new_ans = models.Answer(
-            response_id=new_resp.id,
-            question_id=ans.questionId,
-            value=ans.value
+    if not app_row:
+        raise HTTPException(status_code=400, detail="Aplicação inválida")
+    app_form_id, assigned_user, archived_id = app_row
+    validator = get_form_validators(db, [app_form_id])[app_form_id] if app_form_id is not None else None
+
+    check_submission(payload, app_form_id, assigned_user is not None, validator, archived_id is not None)
+    return user_id, validator
+
+def queued_response(response: Response, submission_id: str) -> dict:
+    response.status_code = 202
+    return {"status": "queued", "submissionId": submission_id}
+
+def handle_submit_response(db: Session, payload: ResponseSchema, response: Response, idempotency_key: Optional[str], me: dict) -> dict:
+    user_id, validator = validate_submission(db, payload, me)
+
+    if ingest_queue:
+        # Modo fila: grava no log local durável e confirma; o writer persiste em lote
+        return queued_response(response, ingest_queue.submit(submission_record(payload, user_id, idempotency_key)))
+
+    # Criar Response. Retentativas (timeout no cliente) caem no ON CONFLICT e viram no-op
+    record = submission_record(payload, user_id, idempotency_key)
+    key = record["idempotencyKey"]
+    answer_values = None
+    if ANSWER_STORAGE == "packed":
+        answer_values = pack_answers(validator.layout, record["answers"])
+    new_resp_id = db.execute(
+        pg_insert(models.Response)
+        .values(
+            application_id=payload.applicationId,
+            form_id=payload.formId,
+            evaluator_id=user_id,
+            created_at=int(time.time()),
+            idempotency_key=key,
+            answer_values=answer_values
         )
-        db.add(new_ans)
+        .on_conflict_do_nothing(index_elements=["application_id", "evaluator_id"])
+        .returning(models.Response.id)
+    ).scalar()
+
+    if new_resp_id is None:
+        existing_id, existing_key = db.query(models.Response.id, models.Response.idempotency_key).filter(
+            models.Response.application_id == payload.applicationId,
+            models.Response.evaluator_id == user_id
+        ).one()
+        db.rollback()
+        check_idempotency(key, existing_key)
+        return {"status": "success", "responseId": existing_id, "duplicate": True}
+
+    if answer_values is None and record["answers"]:
+        db.execute(insert(models.Answer), [
+            {"application_id": payload.applicationId, "response_id": new_resp_id, "question_id": ans["questionId"], "value": ans["value"]}
+            for ans in record["answers"]
+        ])
     
+    record_assignment_events(db, [(user_id, payload.applicationId, "completed")])
     db.commit()
-    return {"status": "success", "responseId": new_resp.id}
+    assignment_feed.notify([user_id])
+    pin_to_primary(response, user_id)
+    return {"status": "success", "responseId": new_resp_id}
+
+if DB_ASYNC:
+    @app.post("/responses")
+    async def submit_response(payload: ResponseSchema, response: Response, idempotency_key: Optional[str] = Header(None), me=Depends(require_roles(["avaliador"])), db: AsyncSession = Depends(get_async_db)):
+        if ingest_queue:
+            # submit() espera o fsync do log: no threadpool, não no event loop
+            user_id, _ = await db.run_sync(validate_submission, payload, me)
+            record = submission_record(payload, user_id, idempotency_key)
+            return queued_response(response, await run_in_threadpool(profiling.call, ingest_queue.submit, record))
+        return await db.run_sync(handle_submit_response, payload, response, idempotency_key, me)
+else:
+    @app.post("/responses")
+    def submit_response(payload: ResponseSchema, response: Response, idempotency_key: Optional[str] = Header(None), me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
+        return handle_submit_response(db, payload, response, idempotency_key, me)
+
+@app.post("/responses/batch")
+def submit_responses_batch(payload: ResponseBatchSchema, response: Response, me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
+    # Envio de várias avaliações (ex: sessões offline). Itens inválidos são reportados
+    # individualmente; os válidos entram numa única transação com INSERTs multi-linha.
+    if len(payload.responses) > MAX_BATCH_RESPONSES:
+        raise HTTPException(status_code=400, detail=f"Lote excede o limite de {MAX_BATCH_RESPONSES} respostas")
+
+    user_id = resolve_user_id(db, me)
+    if not user_id:
+        raise HTTPException(status_code=403, detail="Usuário não encontrado")
+
+    # Contexto de validação do lote inteiro: 3 consultas (+1 para formulários fora do cache)
+    app_ids = {item.applicationId for item in payload.responses}
+    app_forms = dict(db.query(models.Application.id, models.Application.form_id).filter(models.Application.id.in_(app_ids)).all())
+    ae = models.application_evaluators
+    assigned = {
+        a_id for (a_id,) in db.execute(
+            select(ae.c.application_id).where(ae.c.user_id == user_id, ae.c.application_id.in_(app_ids))
+        )
+    }
+    archived = {
+        a_id for (a_id,) in db.query(models.ApplicationArchive.application_id).filter(models.ApplicationArchive.application_id.in_(app_ids))
+    }
+    validators = get_form_validators(db, {f_id for f_id in app_forms.values() if f_id is not None})
+
+    results = []
+    accepted = []
+    for idx, item in enumerate(payload.responses):
+        form_id = app_forms.get(item.applicationId)
+        try:
+            check_submission(item, form_id, item.applicationId in assigned, validators.get(form_id), item.applicationId in archived)
+        except HTTPException as e:
+            results.append({"index": idx, "status": "error", "code": e.status_code, "detail": e.detail})
+            continue
+        results.append({"index": idx, "status": "success", "responseId": None})
+        accepted.append((idx, item))
+
+    outcome = persist_responses(db, [submission_record(item, user_id) for _, item in accepted])
+    db.commit()
+
+    inserted = set()
+    duplicates = 0
+    for idx, item in accepted:
+        key = (item.applicationId, user_id)
+        resp_id, is_new, stored_key = outcome[key]
+        if is_new and key not in inserted:
+            inserted.add(key)
+            results[idx]["responseId"] = resp_id
+            continue
+        # Mesma regra do POST /responses: chave diferente da gravada é conflito, não retentativa
+        try:
+            check_idempotency(item.idempotencyKey, stored_key)
+        except HTTPException as e:
+            results[idx] = {"index": idx, "status": "error", "code": e.status_code, "detail": e.detail}
+            continue
+        results[idx]["responseId"] = resp_id
+        results[idx]["duplicate"] = True
+        duplicates += 1
+    if inserted:
+        assignment_feed.notify([user_id])
+        pin_to_primary(response, user_id)
+
+    return {
+        "status": "success",
+        "accepted": len(inserted),
+        "duplicates": duplicates,
+        "rejected": sum(1 for r in results if r["status"] == "error"),
+        "results": results
+    }
+
+@app.get("/responses/submissions/{submission_id}")
+def submission_status(submission_id: str, me=Depends(require_roles(["avaliador"])), db: Session = Depends(get_db)):
+    # Situação de uma submissão aceita no modo fila (RESPONSE_INGEST_MODE=queue)
+    user_id = resolve_user_id(db, me)
+    status = ingest_queue.status(submission_id) if ingest_queue else None
+    if status and status.get("userId") == user_id:
+        return {"submissionId": submission_id, **{k: v for k, v in status.items() if k != "userId"}}
+
+    # Fora do cache em memória (ex: após reinício): a resposta gravada guarda o id como idempotency_key
+    resp_id = db.query(models.Response.id).filter(
+        models.Response.idempotency_key == submission_id,
+        models.Response.evaluator_id == user_id
+    ).scalar()
+    if resp_id:
+        return {"submissionId": submission_id, "status": "committed", "responseId": resp_id}
+    raise HTTPException(status_code=404, detail="Submissão não encontrada")
 
 # --- REPORTS ---
 
@@ -638,9 +1443,91 @@ def get_weight_for_group(profile_name: str, group_name: str) -> float:
 def likert_to_score_0_10(v: int) -> float:
     return (max(1, min(5, v)) - 1) * 2.5
 
-@app.get("/reports/application-score")
-def application_score(applicationId: Optional[int] = None, name: Optional[str] = None, _=Depends(require_roles(["stakeholder", "admin", "engenheiro"])), db: Session = Depends(get_db)):
-    
+@tracing.traced("report.score")
+def score_applications(db: Session, app_ids):
+    # Soma ponderada por perfil sobre todas as respostas das aplicações, nos dois layouts.
+    # As respostas são contadas por (grupo, valor), então os pesos são calculados uma vez por combinação.
+    count_resp = db.query(func.count(models.Response.id)).filter(models.Response.application_id.in_(app_ids)).scalar()
+
+    tally = Counter()
+    # application_id nas duas tabelas: o Postgres só lê as partições das aplicações pedidas
+    rows = (
+        db.query(models.QuestionGroup.name, models.Answer.value, func.count(models.Answer.id))
+        .select_from(models.Answer)
+        .join(models.Response, (models.Response.application_id == models.Answer.application_id) & (models.Response.id == models.Answer.response_id))
+        .join(models.Question, models.Question.id == models.Answer.question_id)
+        .outerjoin(models.QuestionGroup, models.QuestionGroup.id == models.Question.group_id)
+        .filter(models.Answer.application_id.in_(app_ids), models.Response.answer_values.is_(None))
+        .group_by(models.QuestionGroup.name, models.Answer.value)
+    )
+    for g_name, value, n in rows:
+        tally[(g_name or "", value)] += n
+
+    # Campanhas arquivadas: contagens pré-calculadas no arquivamento
+    archived = db.query(func.sum(models.ApplicationArchive.response_count)).filter(models.ApplicationArchive.application_id.in_(app_ids)).scalar()
+    if archived:
+        count_resp += archived
+        summaries = db.query(models.ApplicationScoreSummary.group_name, models.ApplicationScoreSummary.value, models.ApplicationScoreSummary.answers).filter(
+            models.ApplicationScoreSummary.application_id.in_(app_ids)
+        )
+        for g_name, value, n in summaries:
+            tally[(g_name, value)] += n
+
+    # Layout compacto: o Postgres desempacota answer_values e agrupa (mesma consulta do
+    # SUMMARIZE do archive_campaigns.py); só voltam linhas (grupo, valor, quantidade)
+    for g_name, value, n in packed_tally_query(db, app_ids):
+        tally[(g_name or "", value)] += n
+
+    profiles_data, count_ans = profile_scores(tally)
+    return profiles_data, count_resp, count_ans
+
+def packed_tally_query(db: Session, app_ids):
+    R = models.Response
+    values = func.unnest(R.answer_values).table_valued("value", with_ordinality="pos").render_derived().lateral()
+    # Posição de cada pergunta no layout (perguntas do formulário ordenadas por id), só dos formulários envolvidos
+    positions = (
+        select(
+            models.Question.form_id,
+            models.Question.group_id,
+            func.row_number().over(partition_by=models.Question.form_id, order_by=models.Question.id).label("pos")
+        )
+        .where(models.Question.form_id.in_(select(R.form_id).where(R.application_id.in_(app_ids), R.answer_values.isnot(None))))
+        .subquery()
+    )
+    return (
+        db.query(models.QuestionGroup.name, values.c.value, func.count())
+        .select_from(R)
+        .join(values, true())
+        .join(positions, (positions.c.form_id == R.form_id) & (positions.c.pos == values.c.pos))
+        .outerjoin(models.QuestionGroup, models.QuestionGroup.id == positions.c.group_id)
+        .filter(R.application_id.in_(app_ids), R.answer_values.isnot(None), values.c.value.isnot(None))
+        .group_by(models.QuestionGroup.name, values.c.value)
+    )
+
+@tracing.traced("scoring.profile_scores")
+def profile_scores(tally: Counter):
+    # tally: {(grupo, valor): quantidade} -> somas ponderadas por perfil e total de answers
+    profiles_data = {k: {"w_sum": 0.0, "w_total": 0.0} for k in NEURODIVERGENCY_PROFILES.keys()}
+    profiles_data["Standard"] = {"w_sum": 0.0, "w_total": 0.0} # Equal weights
+
+    count_ans = 0
+    for (g_name, value), n in tally.items():
+        count_ans += n
+        raw_score = likert_to_score_0_10(value)
+
+        # 1. Standard Score (Weight 1.0)
+        profiles_data["Standard"]["w_sum"] += raw_score * n
+        profiles_data["Standard"]["w_total"] += n
+
+        # 2. Neuro Profiles
+        for p_name in NEURODIVERGENCY_PROFILES.keys():
+            w = get_weight_for_group(p_name, g_name)
+            profiles_data[p_name]["w_sum"] += raw_score * w * n
+            profiles_data[p_name]["w_total"] += w * n
+
+    return profiles_data, count_ans
+
+def compute_application_score(db: Session, applicationId: Optional[int], name: Optional[str]) -> dict:
     target_apps = []
     app_name = None
     
@@ -664,41 +1551,7 @@ def application_score(applicationId: Optional[int] = None, name: Optional[str] =
 
     # Calcula scores
     # Estrutura: { "MCI": {weighted_sum: x, weight_sum: y}, ... "Standard": ... }
-    
-    profiles_data = {k: {"w_sum": 0.0, "w_total": 0.0} for k in NEURODIVERGENCY_PROFILES.keys()}
-    profiles_data["Standard"] = {"w_sum": 0.0, "w_total": 0.0} # Equal weights
-
-    count_resp = 0
-    count_ans = 0
-
-    for app in target_apps:
-        # Carrega respostas
-        responses = db.query(models.Response).filter(models.Response.application_id == app.id).all()
-        count_resp += len(responses)
-
-        for r in responses:
-            for ans in r.answers:
-                count_ans += 1
-                q = ans.question
-                raw_score = likert_to_score_0_10(ans.value)
-                
-                # Group Name
-                g_name = ""
-                if q.group_id:
-                    # Need to fetch group name. accessing q.group might need explicit join or lazy load
-                    # Assuming lazy load works:
-                    if q.group:
-                         g_name = q.group.name
-                
-                # 1. Standard Score (Weight 1.0)
-                profiles_data["Standard"]["w_sum"] += raw_score * 1.0
-                profiles_data["Standard"]["w_total"] += 1.0
-                
-                # 2. Neuro Profiles
-                for p_name in NEURODIVERGENCY_PROFILES.keys():
-                    w = get_weight_for_group(p_name, g_name)
-                    profiles_data[p_name]["w_sum"] += raw_score * w
-                    profiles_data[p_name]["w_total"] += w
+    profiles_data, count_resp, count_ans = score_applications(db, [a.id for a in target_apps])
 
     if profiles_data["Standard"]["w_total"] == 0:
          return {"applicationName": app_name, "applicationIds": [a.id for a in target_apps], "score": None, "neuroScores": {}, "countResponses": count_resp, "countAnswers": 0}
@@ -723,6 +1576,16 @@ def application_score(applicationId: Optional[int] = None, name: Optional[str] =
         "scale": "0-10",
         "method": "multi-profile-weighted"
     }
+
+if DB_ASYNC:
+    @app.get("/reports/application-score")
+    async def application_score(applicationId: Optional[int] = None, name: Optional[str] = None, _=Depends(require_roles(["stakeholder", "admin", "engenheiro"])), db: AsyncSession = Depends(get_async_read_db)):
+        return await db.run_sync(compute_application_score, applicationId, name)
+else:
+    @app.get("/reports/application-score")
+    def application_score(applicationId: Optional[int] = None, name: Optional[str] = None, _=Depends(require_roles(["stakeholder", "admin", "engenheiro"])), db: Session = Depends(get_read_db)):
+        return compute_application_score(db, applicationId, name)
+
 class PDF(FPDF):
     def header(self):
         self.set_font('Arial', 'B', 15)
@@ -745,109 +1608,114 @@ class PDF(FPDF):
         self.multi_cell(0, 5, body)
         self.ln()
 
-@app.get("/reports/export-pdf")
-def export_pdf(applicationId: int, db: Session = Depends(get_db)):
-    try:
-        # 1. Fetch App
-        app_obj = db.query(models.Application).filter(models.Application.id == applicationId).first()
-        if not app_obj:
-            raise HTTPException(status_code=404, detail="Application not found")
+@tracing.traced("report.load")
+def load_report_data(db: Session, applicationId: int) -> dict:
+    # 1. Fetch App
+    app_obj = db.query(models.Application).filter(models.Application.id == applicationId).first()
+    if not app_obj:
+        raise HTTPException(status_code=404, detail="Application not found")
 
-        # 2. Calculate Scores (Reusing Logic)
-        profiles_data = {k: {"w_sum": 0.0, "w_total": 0.0} for k in NEURODIVERGENCY_PROFILES.keys()}
-        profiles_data["Standard"] = {"w_sum": 0.0, "w_total": 0.0}
-        
-        responses = db.query(models.Response).filter(models.Response.application_id == app_obj.id).all()
-        count_resp = len(responses)
-        
-        for r in responses:
-            for ans in r.answers:
-                q = ans.question
-                raw_score = likert_to_score_0_10(ans.value)
-                g_name = q.group.name if q.group else ""
-                
-                # Standard
-                profiles_data["Standard"]["w_sum"] += raw_score
-                profiles_data["Standard"]["w_total"] += 1.0
-                
-                # Profiles
-                for p_name in NEURODIVERGENCY_PROFILES.keys():
-                    w = get_weight_for_group(p_name, g_name)
-                    profiles_data[p_name]["w_sum"] += raw_score * w
-                    profiles_data[p_name]["w_total"] += w
-
-        final_scores = {}
-        for p_name, data in profiles_data.items():
-            if data["w_total"] > 0:
-                final_scores[p_name] = round(data["w_sum"] / data["w_total"], 2)
-            else:
-                final_scores[p_name] = 0.0
-
-        standard_score = final_scores.pop("Standard")
-
-        # 3. Generate PDF
-        pdf = PDF()
-        pdf.alias_nb_pages()
-        pdf.add_page()
-        
-        # Title Info
-        pdf.set_font('Arial', '', 12)
-        pdf.cell(0, 10, f"Aplicação: {app_obj.name}", 0, 1)
-        pdf.cell(0, 10, f"Data: {datetime.now().strftime('%d/%m/%Y')}", 0, 1)
-        pdf.cell(0, 10, f"Total de Avaliações: {count_resp}", 0, 1)
-        pdf.ln(10)
-
-        # Main Score
-        pdf.set_font('Arial', 'B', 16)
-        score_text = f"Nota Geral: {standard_score}/10"
-        pdf.cell(0, 10, score_text, 0, 1, 'C')
-        pdf.ln(10)
-
-        # Breakdown Table
-        pdf.chapter_title("Detalhamento por Neurodivergência")
-        
-        pdf.set_font('Arial', 'B', 10)
-        pdf.cell(60, 10, 'Neurodivergência', 1)
-        pdf.cell(40, 10, 'Nota (0-10)', 1)
-        pdf.cell(90, 10, 'Status', 1)
-        pdf.ln()
+    # 2. Calculate Scores (Reusing Logic)
+    profiles_data, count_resp, _ = score_applications(db, [app_obj.id])
 
-        pdf.set_font('Arial', '', 10)
-        for p_name, score in final_scores.items():
-            status_txt = "Excelente" if score >= 8 else "Bom" if score >= 5 else "Precisa Melhorar"
-            pdf.cell(60, 10, p_name, 1)
-            pdf.cell(40, 10, str(score), 1)
-            pdf.cell(90, 10, status_txt, 1)
-            pdf.ln()
-        
-        pdf.ln(10)
+    final_scores = {}
+    for p_name, data in profiles_data.items():
+        if data["w_total"] > 0:
+            final_scores[p_name] = round(data["w_sum"] / data["w_total"], 2)
+        else:
+            final_scores[p_name] = 0.0
 
-        # Detailed Info
-        pdf.chapter_title("Guias de Acessibilidade")
-        
-        for p_name, info in NEURO_INFO.items():
-            pdf.set_font('Arial', 'B', 11)
-            pdf.cell(0, 10, f"{p_name} (Nota: {final_scores.get(p_name, 0)})", 0, 1)
-            
-            pdf.set_font('Arial', 'I', 10)
-            pdf.multi_cell(0, 5, f"Descrição: {info['description']}")
-            pdf.ln(2)
-            
-            pdf.set_font('Arial', '', 10)
-            pdf.multi_cell(0, 5, f"Dicas de Acessibilidade: {info['tips']}")
-            pdf.ln(5)
+    standard_score = final_scores.pop("Standard")
+    return {"id": app_obj.id, "name": app_obj.name, "count_resp": count_resp, "standard_score": standard_score, "final_scores": final_scores}
 
-        # Output
-        pdf_bytes = bytes(pdf.output())
-        buffer = io.BytesIO(pdf_bytes)
-        
-        headers = {
-            'Content-Disposition': f'attachment; filename="report_{app_obj.id}.pdf"'
-        }
-        return StreamingResponse(buffer, media_type='application/pdf', headers=headers)
+@tracing.traced("pdf.render")
+def render_report_pdf(report: dict) -> bytes:
+    started = time.perf_counter()
+    final_scores = report["final_scores"]
 
-    except Exception as e:
-        print(f"[PDF ERROR] {str(e)}")
-        import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail=str(e))
+    # 3. Generate PDF
+    pdf = PDF()
+    pdf.alias_nb_pages()
+    pdf.add_page()
+    
+    # Title Info
+    pdf.set_font('Arial', '', 12)
+    pdf.cell(0, 10, f"Aplicação: {report['name']}", 0, 1)
+    pdf.cell(0, 10, f"Data: {datetime.now().strftime('%d/%m/%Y')}", 0, 1)
+    pdf.cell(0, 10, f"Total de Avaliações: {report['count_resp']}", 0, 1)
+    pdf.ln(10)
+
+    # Main Score
+    pdf.set_font('Arial', 'B', 16)
+    score_text = f"Nota Geral: {report['standard_score']}/10"
+    pdf.cell(0, 10, score_text, 0, 1, 'C')
+    pdf.ln(10)
+
+    # Breakdown Table
+    pdf.chapter_title("Detalhamento por Neurodivergência")
+    
+    pdf.set_font('Arial', 'B', 10)
+    pdf.cell(60, 10, 'Neurodivergência', 1)
+    pdf.cell(40, 10, 'Nota (0-10)', 1)
+    pdf.cell(90, 10, 'Status', 1)
+    pdf.ln()
+
+    pdf.set_font('Arial', '', 10)
+    for p_name, score in final_scores.items():
+        status_txt = "Excelente" if score >= 8 else "Bom" if score >= 5 else "Precisa Melhorar"
+        pdf.cell(60, 10, p_name, 1)
+        pdf.cell(40, 10, str(score), 1)
+        pdf.cell(90, 10, status_txt, 1)
+        pdf.ln()
+    
+    pdf.ln(10)
+
+    # Detailed Info
+    pdf.chapter_title("Guias de Acessibilidade")
+    
+    for p_name, info in NEURO_INFO.items():
+        pdf.set_font('Arial', 'B', 11)
+        pdf.cell(0, 10, f"{p_name} (Nota: {final_scores.get(p_name, 0)})", 0, 1)
+        
+        pdf.set_font('Arial', 'I', 10)
+        pdf.multi_cell(0, 5, f"Descrição: {info['description']}")
+        pdf.ln(2)
+        
+        pdf.set_font('Arial', '', 10)
+        pdf.multi_cell(0, 5, f"Dicas de Acessibilidade: {info['tips']}")
+        pdf.ln(5)
+
+    # Output
+    pdf_bytes = bytes(pdf.output())
+    metrics.observe_pdf(time.perf_counter() - started, len(pdf_bytes))
+    return pdf_bytes
+
+def pdf_response(report: dict, pdf_bytes: bytes) -> StreamingResponse:
+    buffer = io.BytesIO(pdf_bytes)
+    headers = {
+        'Content-Disposition': f'attachment; filename="report_{report["id"]}.pdf"'
+    }
+    return StreamingResponse(buffer, media_type='application/pdf', headers=headers)
+
+def pdf_error(e: Exception):
+    log.exception("Falha ao gerar PDF")
+    raise HTTPException(status_code=500, detail=str(e))
+
+if DB_ASYNC:
+    @app.get("/reports/export-pdf")
+    async def export_pdf(applicationId: int, db: AsyncSession = Depends(get_async_read_db)):
+        try:
+            report = await db.run_sync(load_report_data, applicationId)
+            # Renderização é CPU: vai para o threadpool para não travar o event loop
+            pdf_bytes = await run_in_threadpool(profiling.call, render_report_pdf, report)
+            return pdf_response(report, pdf_bytes)
+        except Exception as e:
+            pdf_error(e)
+else:
+    @app.get("/reports/export-pdf")
+    def export_pdf(applicationId: int, db: Session = Depends(get_read_db)):
+        try:
+            report = load_report_data(db, applicationId)
+            return pdf_response(report, render_report_pdf(report))
+        except Exception as e:
+            pdf_error(e)
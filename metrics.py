@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+# Métricas no formato texto do Prometheus, expostas em /metrics.
+# Cada thread escreve no próprio shard (sem lock no caminho da requisição); o scrape soma os shards.
+# Requisição: contagem, latência, em andamento e erros por rota (template, não a URL) e, via eventos
+# do SQLAlchemy, tempo de banco e número de consultas. PDF: tempo de renderização e tamanho.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (10_000, 25_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+ROUTE_CACHE_SIZE = 10_000
+
+# nome -> (tipo, ajuda, buckets)
+FAMILIES = {
+    "saan_http_requests_total": ("counter", "Requisições por rota, método e status", None),
+    "saan_http_request_errors_total": ("counter", "Respostas 5xx (ou exceções) por rota e método", None),
+    "saan_http_requests_in_flight": ("gauge", "Requisições em andamento por rota", None),
+    "saan_http_request_duration_seconds": ("histogram", "Latência das requisições por rota", LATENCY_BUCKETS),
+    "saan_http_request_db_seconds": ("histogram", "Tempo em consultas ao banco por requisição", LATENCY_BUCKETS),
+    "saan_http_request_db_queries": ("histogram", "Consultas ao banco por requisição", QUERY_BUCKETS),
+    "saan_pdf_render_seconds": ("histogram", "Tempo de renderização do PDF de relatório", LATENCY_BUCKETS),
+    "saan_pdf_size_bytes": ("histogram", "Tamanho do PDF de relatório", SIZE_BUCKETS),
+    "saan_log_records_dropped_total": ("counter", "Registros de log descartados com a fila de escrita cheia", None),
+    "saan_trace_spans_dropped_total": ("counter", "Spans descartados com a fila do exportador cheia", None),
+}
+
+class Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()  # só para registrar o shard de uma thread nova
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, labels: tuple, value: float = 1):
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        # Histograma: [contagem por bucket (+Inf no fim), soma]
+        shard = self._shard()
+        key = (name, labels)
+        hist = shard.get(key)
+        buckets = FAMILIES[name][2]
+        if hist is None:
+            hist = shard[key] = [[0] * (len(buckets) + 1), 0.0]
+        hist[0][bisect_left(buckets, value)] += 1
+        hist[1] += value
+
+    def collect(self):
+        # Soma dos shards: {(nome, labels): valor ou [buckets, soma]}
+        with self._lock:
+            shards = list(self._shards)
+        totals = {}
+        for shard in shards:
+            for key, value in list(shard.items()):
+                if isinstance(value, list):
+                    total = totals.setdefault(key, [[0] * len(value[0]), 0.0])
+                    total[0] = [a + b for a, b in zip(total[0], value[0])]
+                    total[1] += value[1]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self) -> str:
+        totals = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in FAMILIES.items():
+            series = sorted((labels, value) for (n, labels), value in totals.items() if n == name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in series:
+                if kind != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, n in zip(list(buckets) + ["+Inf"], counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+def format_value(value) -> str:
+    if isinstance(value, str):
+        return value
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in labels) + "}"
+
+registry = Registry()
+
+# --- banco: tempo e consultas da requisição atual ---
+
+# [segundos, consultas] da requisição em andamento; run_in_threadpool copia o contexto para a thread da rota
+_request_db = ContextVar("saan_request_db", default=None)
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("saan_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["saan_query_start"].pop()
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += time.perf_counter() - started
+            stats[1] += 1
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("saan_query_start"):
+            conn.info["saan_query_start"].pop()
+
+def observe_pdf(seconds: float, size: int):
+    registry.observe("saan_pdf_render_seconds", (), seconds)
+    registry.observe("saan_pdf_size_bytes", (), size)
+
+# --- middleware ---
+
+class MetricsMiddleware:
+    # Middleware ASGI puro (sem BaseHTTPMiddleware): não cria task extra nem bufferiza o corpo
+    def __init__(self, app, router):
+        self.app = app
+        self.router = router
+        self._templates = {}
+
+    def route_template(self, scope) -> str:
+        # Template da rota ("/responses/submissions/{submission_id}"): a URL crua explodiria a cardinalidade.
+        # Casar com as rotas custa ~50µs; o resultado fica em cache por (método, path).
+        key = (scope["method"], scope["path"])
+        template = self._templates.get(key)
+        if template is None:
+            template = "unmatched"
+            for route in self.router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    template = route.path
+                    break
+            if len(self._templates) >= ROUTE_CACHE_SIZE:
+                self._templates.clear()
+            self._templates[key] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        labels = (("route", self.route_template(scope)), ("method", scope["method"]))
+        status = [500]
+        stats = [0.0, 0]
+        token = _request_db.set(stats)
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        registry.inc("saan_http_requests_in_flight", labels)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_db.reset(token)
+            registry.inc("saan_http_requests_in_flight", labels, -1)
+            registry.inc("saan_http_requests_total", labels + (("status", status[0]),))
+            if status[0] >= 500:
+                registry.inc("saan_http_request_errors_total", labels)
+            registry.observe("saan_http_request_duration_seconds", labels, elapsed)
+            registry.observe("saan_http_request_db_seconds", labels, stats[0])
+            registry.observe("saan_http_request_db_queries", labels, stats[1])
@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import Counter
+
+import main
+
+# Microbenchmarks das funções puras quentes (JWT, pesos, Likert, pontuação e PDF), no processo,
+# em vários tamanhos de entrada. Sem banco: a pontuação recebe as contagens/linhas já no formato
+# que as consultas de score_applications devolvem.
+#   python microbench.py --save-baseline        (grava microbench_baseline.json)
+#   python microbench.py                        (compara com a baseline, sai com erro se regredir)
+#   python microbench.py --filter jwt --threshold 0.15
+
+BASELINE_PATH = "microbench_baseline.json"
+SECRET = "bench-secret"
+
+GROUPS = main.STANDARD_GROUPS + ["Grupo livre", "1. Reduz a carga cognitiva?", ""]
+PROFILES = list(main.NEURODIVERGENCY_PROFILES)
+
+def log(msg, status="INFO"):
+    print(f"[{status}] {msg}")
+
+# --- casos: cada um devolve (rótulo, função sem argumentos) ---
+
+def jwt_cases():
+    for claims in (5, 50, 500):
+        payload = {"sub": "avaliador", "role": "avaliador", "id": 42, "iat": 0, "exp": 2 ** 31}
+        payload.update({f"c{i}": i for i in range(claims - len(payload))})
+        token = main.jwt_encode(payload, SECRET)
+        yield f"jwt_encode[{claims} claims]", lambda p=payload: main.jwt_encode(p, SECRET)
+        yield f"jwt_decode[{claims} claims]", lambda t=token: main.jwt_decode(t, SECRET)
+
+def weight_cases():
+    for n in (1, 100, 1000):
+        pairs = [(PROFILES[i % len(PROFILES)], GROUPS[i % len(GROUPS)]) for i in range(n)]
+        yield f"get_weight_for_group[{n}]", lambda pairs=pairs: [main.get_weight_for_group(p, g) for p, g in pairs]
+
+def likert_cases():
+    for n in (1, 1000, 100000):
+        values = [1 + i % 5 for i in range(n)]
+        yield f"likert_to_score_0_10[{n}]", lambda values=values: [main.likert_to_score_0_10(v) for v in values]
+
+def scoring_cases():
+    # profile_scores: uma entrada por (grupo, valor) -> tamanho = grupos distintos x 5 notas
+    for groups in (8, 80, 800):
+        names = [GROUPS[i % len(main.STANDARD_GROUPS)] + ("" if i < len(main.STANDARD_GROUPS) else f" {i}") for i in range(groups)]
+        tally = Counter({(g, v): 100 + i for i, (g, v) in enumerate((g, v) for g in names for v in range(1, 6))})
+        yield f"profile_scores[{groups} grupos]", lambda tally=tally: main.profile_scores(tally)
+
+def pdf_cases():
+    # Relatório com os perfis padrão e com tabelas maiores (mais linhas = mais páginas)
+    for rows in (7, 50, 200):
+        scores = {f"{PROFILES[i % len(PROFILES)]} {i}" if i >= len(PROFILES) else PROFILES[i]: round(i % 11 * 0.9, 2) for i in range(rows)}
+        report = {"id": 1, "name": "Aplicação de benchmark", "count_resp": 1234, "standard_score": 6.5, "final_scores": scores}
+        yield f"render_report_pdf[{rows} linhas]", lambda report=report: main.render_report_pdf(report)
+
+SUITES = {
+    "jwt": jwt_cases,
+    "weights": weight_cases,
+    "likert": likert_cases,
+    "scoring": scoring_cases,
+    "pdf": pdf_cases,
+}
+
+# --- medição ---
+
+def measure(fn, min_time: float, repeats: int):
+    # Calibra o número de chamadas por rodada para durar ~min_time; devolve µs por chamada de cada rodada
+    fn()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)))
+    runs = [elapsed / loops]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        runs.append((time.perf_counter() - start) / loops)
+    return [r * 1e6 for r in runs], loops
+
+def run_suites(names, min_time: float, repeats: int):
+    results = {}
+    for name in names:
+        for label, fn in SUITES[name]():
+            runs, loops = measure(fn, min_time, repeats)
+            results[label] = {
+                "median_us": round(statistics.median(runs), 3),
+                "min_us": round(min(runs), 3),
+                "stdev_us": round(statistics.stdev(runs), 3) if len(runs) > 1 else 0.0,
+                "loops": loops,
+            }
+            r = results[label]
+            print(f"  {label:<40} mediana {r['median_us']:>12.2f} µs  min {r['min_us']:>12.2f} µs  ±{r['stdev_us']:.2f}")
+    return results
+
+def compare(baseline: dict, results: dict, threshold: float) -> bool:
+    # Regressão: melhor rodada acima de (1 + threshold) x baseline (o mínimo é o menos sensível a ruído)
+    regressions = 0
+    log(f"Comparação com a baseline ({baseline.get('python')}, limite +{threshold:.0%}):")
+    for label, r in results.items():
+        base = baseline["results"].get(label)
+        if not base:
+            print(f"  {label:<40} sem baseline")
+            continue
+        ratio = r["min_us"] / base["min_us"] if base["min_us"] else 0
+        status = "REGRESSÃO" if ratio > 1 + threshold else "melhorou" if ratio < 1 - threshold else "ok"
+        print(f"  {label:<40} {base['min_us']:>12.2f} -> {r['min_us']:>12.2f} µs  {ratio:.2f}x  {status}")
+        regressions += status == "REGRESSÃO"
+    if regressions:
+        log(f"{regressions} benchmark(s) regrediram mais de {threshold:.0%}", "ERROR")
+    return regressions == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks das funções puras quentes do SAAN")
+    parser.add_argument("--filter", nargs="*", choices=sorted(SUITES), help="suítes a rodar (padrão: todas)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="segundos mínimos por rodada")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como nova baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="piora tolerada no melhor tempo (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    names = args.filter or list(SUITES)
+    log(f"Rodando {', '.join(names)} ({args.repeats} rodadas de {args.min_time}s)")
+    results = run_suites(names, args.min_time, args.repeats)
+
+    if args.save_baseline:
+        existing = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                existing = json.load(f).get("results", {})
+        # --filter atualiza só as suítes rodadas, mantendo as outras da baseline
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "created_at": int(time.time()),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": dict(existing, **results),
+            }, f, indent=2)
+        log(f"Baseline salva em {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            sys.exit(0 if compare(json.load(f), results, args.threshold) else 1)
+    else:
+        log(f"Sem baseline em {args.baseline}; rode com --save-baseline para criar")
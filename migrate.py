@@ -1,166 +1,292 @@
+import argparse
+import codecs
+import io
 import json
 import os
-from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+import time
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import SessionLocal
+from schema_migrations import apply_migrations
 import models
 
-def migrate():
+# Importa o legado (users.json + database.json) para o Postgres.
+# database.json é lido em streaming: forms/applications ficam em memória (são pequenos),
+# responses são processadas em lotes sem carregar o arquivo inteiro.
+#   python migrate.py
+#   python migrate.py --database-json /backup/database.json --batch-size 10000
+
+CHUNK_SIZE = 1 << 20  # bytes lidos por vez
+
+class JsonStream:
+    # Leitor incremental de um objeto JSON no topo: {"chave": [item, item, ...], ...}
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.size = os.path.getsize(path)
+        self.bytes_read = 0
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def close(self):
+        self.file.close()
+
+    def progress(self) -> float:
+        return 100.0 * self.bytes_read / self.size if self.size else 100.0
+
+    def _fill(self):
+        chunk = self.file.read(CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        # Descarta o que já foi consumido para o buffer não crescer com o arquivo
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"JSON inválido perto do byte {self.bytes_read}: esperado '{char}'")
+        self.pos += 1
+
+    def _value(self):
+        # Um valor completo a partir da posição atual, lendo mais do arquivo se ele estiver cortado
+        while True:
+            self._peek()
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # Número encostado no fim do buffer pode continuar no próximo bloco
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _items(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._peek() == ",":
+                self.pos += 1
+            else:
+                self._expect("]")
+                return
+
+    def sections(self):
+        # Gera (chave, iterador dos itens); cada iterador precisa ser consumido antes do próximo
+        self._expect("{")
+        while self._peek() not in ("}", ""):
+            key = self._value()
+            self._expect(":")
+            if self._peek() == "[":
+                items = self._items()
+                yield key, items
+                for _ in items:  # seção ignorada pelo chamador
+                    pass
+            else:
+                self._value()
+            if self._peek() == ",":
+                self.pos += 1
+
+def migrate_users(db, path: str):
+    print("Migrando Usuários...")
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        users_data = json.load(f)
+    existing = set(db.scalars(select(models.User.username)))
+    rows = [{
+        # Mantém os IDs originais do legado; a sequência é ajustada logo abaixo
+        "id": u["id"], "username": u["username"], "password_hash": u["password_hash"], "role": u["role"]
+    } for u in users_data if u["username"] not in existing]
+    if rows:
+        db.execute(insert(models.User), rows)
+    db.execute(text("SELECT setval('users_id_seq', GREATEST((SELECT COALESCE(MAX(id), 0) FROM users), 1))"))
+    db.commit()
+    print(f" -> {len(rows)} usuários criados, {len(users_data) - len(rows)} já existiam")
+
+def migrate_forms(db, forms_data, creator_id):
+    # Retorna {id_antigo_form: id_novo} e {(id_antigo_form, id_antigo_pergunta): id_nova_pergunta}
+    print("Migrando Formulários e Perguntas...")
+    forms_map = {}
+    questions_map = {}
+    if not forms_data:
+        return forms_map, questions_map
+    new_ids = db.scalars(
+        insert(models.Form).returning(models.Form.id, sort_by_parameter_order=True),
+        [{"title": f["title"], "description": f.get("description", ""), "created_by": creator_id} for f in forms_data]
+    ).all()
+    question_keys = []
+    question_rows = []
+    for f_data, form_id in zip(forms_data, new_ids):
+        forms_map[f_data["id"]] = form_id
+        for q_data in f_data.get("questions", []):
+            question_keys.append((f_data["id"], q_data.get("id")))
+            question_rows.append({
+                "form_id": form_id,
+                "text": q_data["text"],
+                "example": q_data.get("example", ""),
+                "scale_type": q_data.get("scaleType", "5-point")
+            })
+    if question_rows:
+        q_ids = db.scalars(
+            insert(models.Question).returning(models.Question.id, sort_by_parameter_order=True), question_rows
+        ).all()
+        questions_map = dict(zip(question_keys, q_ids))
+    db.commit()
+    print(f" -> {len(forms_map)} formulários, {len(questions_map)} perguntas")
+    return forms_map, questions_map
+
+def migrate_applications(db, apps_data, forms_map, users_map):
+    # Retorna {id_antigo_aplicação: id_novo}
+    print("Migrando Aplicações...")
+    apps = [a for a in apps_data if a.get("formId") in forms_map]
+    for a_data in apps_data:
+        if a_data.get("formId") not in forms_map:
+            print(f"Skipping application {a_data['name']} due to missing form {a_data.get('formId')}")
+    apps_map = {}
+    if not apps:
+        return apps_map
+    new_ids = db.scalars(
+        insert(models.Application).returning(models.Application.id, sort_by_parameter_order=True),
+        [{"name": a["name"], "type": a["type"], "url": a.get("url", ""), "form_id": forms_map[a["formId"]]} for a in apps]
+    ).all()
+    evaluator_rows = []
+    for a_data, app_id in zip(apps, new_ids):
+        apps_map[a_data["id"]] = app_id
+        user_ids = {users_map[name] for name in a_data.get("evaluators", []) if name in users_map}
+        evaluator_rows.extend({"application_id": app_id, "user_id": u_id} for u_id in user_ids)
+    if evaluator_rows:
+        db.execute(insert(models.application_evaluators), evaluator_rows)
+    db.commit()
+    print(f" -> {len(apps_map)} aplicações, {len(evaluator_rows)} atribuições")
+    return apps_map
+
+def copy_answers(db, rows):
+    # COPY é bem mais rápido que INSERT para o volume de answers
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row) + "\n")
+    buf.seek(0)
+    cursor = db.connection().connection.cursor()
+    cursor.copy_expert("COPY answers (application_id, response_id, question_id, value) FROM STDIN", buf)
+
+def flush_responses(db, batch, stats):
+    # batch: [(app_id, form_id, evaluator_id, created_at, [(question_id, value)])]
+    # ON CONFLICT: a mesma avaliação repetida no legado vira uma só
+    firsts = {}
+    for item in batch:
+        firsts.setdefault((item[0], item[2]), item)
+    inserted = db.execute(
+        pg_insert(models.Response)
+        .values([{
+            "application_id": app_id, "form_id": form_id, "evaluator_id": evaluator_id, "created_at": created_at
+        } for app_id, form_id, evaluator_id, created_at, _ in firsts.values()])
+        .on_conflict_do_nothing(index_elements=["application_id", "evaluator_id"])
+        .returning(models.Response.application_id, models.Response.evaluator_id, models.Response.id)
+    ).all()
+    answer_rows = []
+    for app_id, evaluator_id, resp_id in inserted:
+        answer_rows.extend((app_id, resp_id, q_id, value) for q_id, value in firsts[(app_id, evaluator_id)][4])
+    if answer_rows:
+        copy_answers(db, answer_rows)
+    db.commit()
+    stats["responses"] += len(inserted)
+    stats["duplicates"] += len(batch) - len(inserted)
+    stats["answers"] += len(answer_rows)
+
+def migrate_responses(db, items, forms_map, questions_map, apps_map, users_map, stream, batch_size):
+    print("Migrando Respostas...")
+    stats = {"responses": 0, "answers": 0, "duplicates": 0, "skipped": 0}
+    started = time.monotonic()
+    batch = []
+    for r_data in items:
+        app_id = apps_map.get(r_data.get("applicationId"))
+        old_form_id = r_data.get("formId")
+        evaluator_id = users_map.get(r_data.get("evaluator"))
+        if app_id is None or old_form_id not in forms_map or evaluator_id is None:
+            stats["skipped"] += 1
+            continue
+        answers = []
+        for ans in r_data.get("answers", []):
+            q_id = questions_map.get((old_form_id, ans["questionId"]))
+            if q_id is not None:
+                answers.append((q_id, ans["value"]))
+        batch.append((app_id, forms_map[old_form_id], evaluator_id, r_data.get("created_at", 0), answers))
+
+        if len(batch) >= batch_size:
+            flush_responses(db, batch, stats)
+            batch = []
+            elapsed = time.monotonic() - started
+            print(f" -> {stats['responses']} respostas, {stats['answers']} answers "
+                  f"({stream.progress():.1f}% do arquivo, {stats['responses'] / elapsed:.0f} respostas/s)")
+    if batch:
+        flush_responses(db, batch, stats)
+    print(f" -> {stats['responses']} respostas, {stats['answers']} answers, "
+          f"{stats['duplicates']} duplicadas, {stats['skipped']} ignoradas por relações ausentes "
+          f"({time.monotonic() - started:.1f}s)")
+
+def migrate(database_json: str = "database.json", users_json: str = "users.json", batch_size: int = 5000):
     print("Criando tabelas no banco de dados...")
-    models.Base.metadata.create_all(bind=engine)
-    
+    apply_migrations()
+
     db = SessionLocal()
-    
-    # 1. Migrar Usuários
-    print("Migrando Usuários...")
-    if os.path.exists("users.json"):
-        with open("users.json", "r") as f:
-            users_data = json.load(f)
-            for u_data in users_data:
-                # Verifica se já existe
-                existing = db.query(models.User).filter(models.User.username == u_data["username"]).first()
-                if not existing:
-                    user = models.User(
-                        # id=u_data["id"], # Deixar o banco gerar ou forçar ID? 
-                        # Vamos tentar manter os IDs originais se possível, mas Postgres usa serial.
-                        # Para simplificar e garantir consistência futura, vamos deixar o Postgres gerar,
-                        # exceto se quisermos forçar. SQLAlchemy permite insert explícito de ID.
-                        # Mas como vamos remapear tudo, melhor deixar o banco decidir os IDs novos?
-                        # O problema é que se os JSONs já tem IDs, manter eles ajuda.
-                        # Vamos tentar forçar o ID.
-                        id=u_data.get("id"),
-                        username=u_data["username"],
-                        password_hash=u_data["password_hash"],
-                        role=u_data["role"]
-                    )
-                    db.add(user)
-            db.commit()
-    
-    # Recarregar mapa de usuários para lookup (username -> user object)
-    users_map = {u.username: u for u in db.query(models.User).all()}
-    
-    # 2. Migrar Dados do database.json
-    if os.path.exists("database.json"):
-        with open("database.json", "r") as f:
-            data = json.load(f)
-            
-            # Forms
-            print("Migrando Formulários e Perguntas...")
-            forms_map = {} # old_id -> new_obj
-            for f_data in data.get("forms", []):
-                # Assumindo admin como criador padrão se não houver info
-                admin = db.query(models.User).filter(models.User.role == "admin").first()
-                creator_id = admin.id if admin else None
-                
-                form = models.Form(
-                    title=f_data["title"],
-                    description=f_data.get("description", ""),
-                    created_by=creator_id
-                )
-                db.add(form)
-                db.flush() # Para gerar ID
-                forms_map[f_data["id"]] = form
-                
-                # Perguntas
-                for q_data in f_data.get("questions", []):
-                    question = models.Question(
-                        form_id=form.id,
-                        text=q_data["text"],
-                        example=q_data.get("example", ""),
-                        scale_type=q_data.get("scaleType", "5-point")
-                    )
-                    db.add(question)
-            
-            db.commit()
-
-            # Applications
-            print("Migrando Aplicações...")
-            apps_map = {} # old_id -> new_obj
-            for a_data in data.get("applications", []):
-                old_form_id = a_data.get("formId")
-                new_form = forms_map.get(old_form_id)
-                
-                if not new_form:
-                    print(f"Skipping application {a_data['name']} due to missing form {old_form_id}")
-                    continue
-
-                app = models.Application(
-                    name=a_data["name"],
-                    type=a_data["type"],
-                    url=a_data.get("url", ""),
-                    form_id=new_form.id
-                )
-                
-                # Evaluators (names -> ids)
-                for eval_name in a_data.get("evaluators", []):
-                    user = users_map.get(eval_name)
-                    if user:
-                        app.evaluators.append(user)
-                
-                db.add(app)
-                db.flush()
-                apps_map[a_data["id"]] = app
-            
-            db.commit()
-
-            # Responses
-            print("Migrando Respostas...")
-            for r_data in data.get("responses", []):
-                old_app_id = r_data.get("applicationId")
-                new_app = apps_map.get(old_app_id)
-                
-                old_form_id = r_data.get("formId")
-                new_form = forms_map.get(old_form_id)
-                
-                evaluator_name = r_data.get("evaluator")
-                evaluator = users_map.get(evaluator_name)
-                
-                if not new_app or not new_form or not evaluator:
-                    print(f"Skipping response due to missing relations")
-                    continue
-                
-                response = models.Response(
-                    application_id=new_app.id,
-                    form_id=new_form.id,
-                    evaluator_id=evaluator.id,
-                    created_at=r_data.get("created_at", 0)
-                )
-                db.add(response)
-                db.flush()
-                
-                # Mapear perguntas do form novo para identificar IDs
-                # O problema é que as respostas antigas usam question IDs antigos (1, 2, 3...)
-                # E as perguntas novas geraram novos IDs.
-                # Assumindo que a ORDEM das perguntas ou o TEXTO não mudou.
-                # database.json questions tem "id": 1, 2...
-                # Vamos tentar mapear pelo ID antigo local (dentro do form)
-                
-                # Recarrega perguntas do novo form
-                new_questions = {q.text: q for q in new_form.questions}
-                # No database.json, precisamos pegar o texto da pergunta antiga com aquele ID para achar a nova
-                # Ineficiente, mas funciona pra migração única.
-                
-                # Ache o form original dados
-                original_form = next((f for f in data["forms"] if f["id"] == old_form_id), None)
-                if original_form:
-                    original_questions = {q["id"]: q["text"] for q in original_form.get("questions", [])}
-                    
-                    for ans in r_data.get("answers", []):
-                        old_q_id = ans["questionId"]
-                        q_text = original_questions.get(old_q_id)
-                        new_q = new_questions.get(q_text)
-                        
-                        if new_q:
-                            answer = models.Answer(
-                                response_id=response.id,
-                                question_id=new_q.id,
-                                value=ans["value"]
-                            )
-                            db.add(answer)
-            
-            db.commit()
-    
-    print("Migração concluída com sucesso!")
-    db.close()
+    try:
+        migrate_users(db, users_json)
+        # Mapas de lookup montados uma vez só
+        users_map = dict(db.execute(select(models.User.username, models.User.id)).all())
+        creator_id = db.scalar(select(models.User.id).where(models.User.role == "admin").limit(1))
+
+        if os.path.exists(database_json):
+            forms_map, questions_map, apps_map = {}, {}, None
+            deferred = False
+            stream = JsonStream(database_json)
+            try:
+                for key, items in stream.sections():
+                    if key == "forms":
+                        forms_map, questions_map = migrate_forms(db, list(items), creator_id)
+                    elif key == "applications":
+                        apps_map = migrate_applications(db, list(items), forms_map, users_map)
+                    elif key == "responses":
+                        if apps_map is None:
+                            deferred = True  # responses antes de applications no arquivo: segunda passada
+                            continue
+                        migrate_responses(db, items, forms_map, questions_map, apps_map, users_map, stream, batch_size)
+            finally:
+                stream.close()
+
+            if deferred:
+                stream = JsonStream(database_json)
+                try:
+                    for key, items in stream.sections():
+                        if key == "responses":
+                            migrate_responses(db, items, forms_map, questions_map, apps_map or {}, users_map, stream, batch_size)
+                finally:
+                    stream.close()
+
+        print("Migração concluída com sucesso!")
+    finally:
+        db.close()
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="Importa users.json e database.json (legado) para o Postgres")
+    parser.add_argument("--database-json", default="database.json")
+    parser.add_argument("--users-json", default="users.json")
+    parser.add_argument("--batch-size", type=int, default=5000, help="respostas por lote")
+    args = parser.parse_args()
+    migrate(args.database_json, args.users_json, args.batch_size)
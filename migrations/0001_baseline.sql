@@ -0,0 +1,81 @@
+-- Schema base (equivalente ao create_all + apply_schema_changes.py passos 1-4).
+-- Idempotente: bancos criados antes do controle de versão só registram a versão.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    username VARCHAR,
+    password_hash VARCHAR,
+    role VARCHAR
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username);
+CREATE INDEX IF NOT EXISTS ix_users_id ON users (id);
+
+CREATE TABLE IF NOT EXISTS forms (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR,
+    description TEXT,
+    created_by INTEGER REFERENCES users (id)
+);
+CREATE INDEX IF NOT EXISTS ix_forms_title ON forms (title);
+CREATE INDEX IF NOT EXISTS ix_forms_id ON forms (id);
+
+CREATE TABLE IF NOT EXISTS applications (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR,
+    type VARCHAR,
+    url VARCHAR,
+    form_id INTEGER REFERENCES forms (id)
+);
+CREATE INDEX IF NOT EXISTS ix_applications_id ON applications (id);
+CREATE INDEX IF NOT EXISTS ix_applications_name ON applications (name);
+
+CREATE TABLE IF NOT EXISTS question_groups (
+    id SERIAL PRIMARY KEY,
+    form_id INTEGER REFERENCES forms (id),
+    name VARCHAR
+);
+CREATE INDEX IF NOT EXISTS ix_question_groups_id ON question_groups (id);
+
+CREATE TABLE IF NOT EXISTS application_evaluators (
+    application_id INTEGER NOT NULL REFERENCES applications (id),
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    PRIMARY KEY (application_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS application_group_weights (
+    id SERIAL PRIMARY KEY,
+    application_id INTEGER REFERENCES applications (id),
+    group_id INTEGER REFERENCES question_groups (id),
+    weight FLOAT DEFAULT 1.0
+);
+CREATE INDEX IF NOT EXISTS ix_application_group_weights_id ON application_group_weights (id);
+CREATE INDEX IF NOT EXISTS ix_app_group_weights_app_id ON application_group_weights (application_id);
+
+CREATE TABLE IF NOT EXISTS questions (
+    id SERIAL PRIMARY KEY,
+    form_id INTEGER REFERENCES forms (id),
+    text TEXT,
+    example TEXT,
+    scale_type VARCHAR
+);
+-- Bancos anteriores aos grupos de perguntas
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS group_id INTEGER REFERENCES question_groups (id);
+CREATE INDEX IF NOT EXISTS ix_questions_id ON questions (id);
+CREATE INDEX IF NOT EXISTS ix_questions_group_id ON questions (group_id);
+
+CREATE TABLE IF NOT EXISTS responses (
+    id SERIAL PRIMARY KEY,
+    application_id INTEGER REFERENCES applications (id),
+    form_id INTEGER REFERENCES forms (id),
+    evaluator_id INTEGER REFERENCES users (id),
+    created_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_responses_id ON responses (id);
+
+CREATE TABLE IF NOT EXISTS answers (
+    id SERIAL PRIMARY KEY,
+    response_id INTEGER REFERENCES responses (id),
+    question_id INTEGER REFERENCES questions (id),
+    value INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_answers_id ON answers (id);
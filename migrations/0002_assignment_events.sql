@@ -0,0 +1,11 @@
+-- Feed de mudanças de atribuição (GET /my-assignments/changes)
+
+CREATE TABLE IF NOT EXISTS assignment_events (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users (id),
+    application_id INTEGER REFERENCES applications (id),
+    kind VARCHAR,
+    created_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_assignment_events_user_id ON assignment_events (user_id);
+CREATE INDEX IF NOT EXISTS ix_assignment_events_id ON assignment_events (id);
@@ -0,0 +1,41 @@
+-- Idempotência de respostas: chave do cliente + unicidade (application_id, evaluator_id)
+
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR;
+
+-- Duplicatas (mesmo avaliador/aplicação) impedem a restrição única. Fica a primeira resposta de
+-- cada par; as demais, com as answers delas, são copiadas para archive.duplicate_responses e
+-- archive.duplicate_answers antes de sair, e a migração informa quantas foram (WARNING)
+CREATE TEMP TABLE dup_responses ON COMMIT DROP AS
+SELECT id FROM (
+    SELECT id, row_number() OVER (PARTITION BY application_id, evaluator_id ORDER BY id) AS rn
+    FROM responses
+) ranked WHERE rn > 1;
+
+DO $$
+DECLARE
+    n_responses INTEGER;
+    n_answers INTEGER;
+BEGIN
+    SELECT count(*) INTO n_responses FROM dup_responses;
+    IF n_responses = 0 THEN
+        RETURN;
+    END IF;
+    CREATE SCHEMA IF NOT EXISTS archive;
+    CREATE TABLE IF NOT EXISTS archive.duplicate_responses AS SELECT * FROM responses WITH NO DATA;
+    CREATE TABLE IF NOT EXISTS archive.duplicate_answers AS SELECT * FROM answers WITH NO DATA;
+    INSERT INTO archive.duplicate_responses SELECT * FROM responses WHERE id IN (SELECT id FROM dup_responses);
+    INSERT INTO archive.duplicate_answers SELECT * FROM answers WHERE response_id IN (SELECT id FROM dup_responses);
+    GET DIAGNOSTICS n_answers = ROW_COUNT;
+    DELETE FROM answers WHERE response_id IN (SELECT id FROM dup_responses);
+    DELETE FROM responses WHERE id IN (SELECT id FROM dup_responses);
+    RAISE WARNING '% resposta(s) duplicada(s) (% answers) movidas para archive.duplicate_responses/duplicate_answers',
+        n_responses, n_answers;
+END $$;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_responses_application_evaluator') THEN
+        ALTER TABLE responses ADD CONSTRAINT uq_responses_application_evaluator
+            UNIQUE (application_id, evaluator_id);
+    END IF;
+END $$;
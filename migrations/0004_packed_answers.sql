@@ -0,0 +1,3 @@
+-- Layout compacto de respostas (ver pack_answers.py para converter as linhas existentes)
+
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS answer_values SMALLINT[];
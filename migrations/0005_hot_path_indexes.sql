@@ -0,0 +1,8 @@
+-- Índices das consultas quentes (verificados por verify_query_plans.py).
+-- responses(application_id, evaluator_id) já é coberto por uq_responses_application_evaluator.
+
+CREATE INDEX IF NOT EXISTS ix_responses_created_at ON responses (created_at);
+CREATE INDEX IF NOT EXISTS ix_answers_response_id ON answers (response_id);
+CREATE INDEX IF NOT EXISTS ix_answers_question_id ON answers (question_id);
+CREATE INDEX IF NOT EXISTS ix_questions_form_id ON questions (form_id);
+CREATE INDEX IF NOT EXISTS ix_application_evaluators_user_id ON application_evaluators (user_id);
@@ -0,0 +1,149 @@
+-- responses e answers particionadas por faixa de application_id (cada aplicação é uma campanha
+-- de avaliação). A chave precisa estar em toda unicidade: PK vira (application_id, id) e a
+-- restrição (application_id, evaluator_id) do ON CONFLICT continua valendo. answers ganha
+-- application_id para ser particionada junto e podar as mesmas partições nos relatórios.
+-- Campanhas encerradas saem das partições via archive_campaigns.py.
+
+-- 1. Tabelas atuais saem do caminho (sequências preservadas, nomes de índices liberados)
+ALTER SEQUENCE responses_id_seq OWNED BY NONE;
+ALTER SEQUENCE answers_id_seq OWNED BY NONE;
+ALTER TABLE answers RENAME TO answers_unpartitioned;
+ALTER TABLE responses RENAME TO responses_unpartitioned;
+ALTER INDEX responses_pkey RENAME TO responses_unpartitioned_pkey;
+ALTER INDEX uq_responses_application_evaluator RENAME TO uq_responses_unpartitioned;
+ALTER INDEX ix_responses_id RENAME TO ix_responses_unpartitioned_id;
+ALTER INDEX ix_responses_created_at RENAME TO ix_responses_unpartitioned_created_at;
+ALTER INDEX answers_pkey RENAME TO answers_unpartitioned_pkey;
+ALTER INDEX ix_answers_id RENAME TO ix_answers_unpartitioned_id;
+ALTER INDEX ix_answers_response_id RENAME TO ix_answers_unpartitioned_response_id;
+ALTER INDEX ix_answers_question_id RENAME TO ix_answers_unpartitioned_question_id;
+
+-- 2. Tabelas particionadas
+CREATE TABLE responses (
+    id INTEGER NOT NULL DEFAULT nextval('responses_id_seq'),
+    application_id INTEGER NOT NULL REFERENCES applications (id),
+    form_id INTEGER REFERENCES forms (id),
+    evaluator_id INTEGER REFERENCES users (id),
+    created_at INTEGER,
+    idempotency_key VARCHAR,
+    answer_values SMALLINT[],
+    PRIMARY KEY (application_id, id),
+    CONSTRAINT uq_responses_application_evaluator UNIQUE (application_id, evaluator_id)
+) PARTITION BY RANGE (application_id);
+ALTER SEQUENCE responses_id_seq OWNED BY responses.id;
+CREATE INDEX ix_responses_id ON responses (id);
+CREATE INDEX ix_responses_created_at ON responses (created_at);
+
+CREATE TABLE answers (
+    id INTEGER NOT NULL DEFAULT nextval('answers_id_seq'),
+    application_id INTEGER NOT NULL,
+    response_id INTEGER NOT NULL,
+    question_id INTEGER REFERENCES questions (id),
+    value INTEGER,
+    PRIMARY KEY (application_id, id),
+    FOREIGN KEY (application_id, response_id) REFERENCES responses (application_id, id)
+) PARTITION BY RANGE (application_id);
+ALTER SEQUENCE answers_id_seq OWNED BY answers.id;
+CREATE INDEX ix_answers_id ON answers (id);
+CREATE INDEX ix_answers_response_id ON answers (response_id);
+CREATE INDEX ix_answers_question_id ON answers (question_id);
+
+-- 3. Uma partição a cada 1000 aplicações, criada (com a seguinte) quando a aplicação é inserida
+CREATE OR REPLACE FUNCTION ensure_response_partitions(app_id INTEGER) RETURNS void AS $$
+DECLARE
+    span CONSTANT INTEGER := 1000;
+    block INTEGER;
+    suffix TEXT;
+BEGIN
+    FOR block IN SELECT generate_series(app_id / span, app_id / span + 1) LOOP
+        suffix := lpad(block::text, 4, '0');
+        -- Partições arquivadas ficam no schema archive e não são recriadas
+        IF to_regclass('public.responses_p' || suffix) IS NULL
+           AND to_regclass('archive.responses_p' || suffix) IS NULL THEN
+            PERFORM pg_advisory_xact_lock(7302, block);
+            IF to_regclass('public.responses_p' || suffix) IS NULL THEN
+                EXECUTE format('CREATE TABLE responses_p%s PARTITION OF responses FOR VALUES FROM (%s) TO (%s)',
+                               suffix, block * span, (block + 1) * span);
+                EXECUTE format('CREATE TABLE answers_p%s PARTITION OF answers FOR VALUES FROM (%s) TO (%s)',
+                               suffix, block * span, (block + 1) * span);
+            END IF;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION applications_ensure_partitions() RETURNS trigger AS $$
+BEGIN
+    PERFORM ensure_response_partitions(NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_applications_ensure_partitions
+    AFTER INSERT ON applications
+    FOR EACH ROW EXECUTE FUNCTION applications_ensure_partitions();
+
+SELECT ensure_response_partitions(block * 1000)
+FROM (SELECT DISTINCT id / 1000 AS block FROM applications) blocks;
+SELECT ensure_response_partitions(0);
+
+-- 4. Cópia dos dados. Respostas sem aplicação não têm partição: elas e as answers sem resposta
+-- copiável vão para archive.orphan_responses / archive.orphan_answers, com aviso da contagem
+DO $$
+DECLARE
+    n_responses INTEGER;
+    n_answers INTEGER;
+BEGIN
+    SELECT count(*) INTO n_responses FROM responses_unpartitioned WHERE application_id IS NULL;
+    SELECT count(*) INTO n_answers FROM answers_unpartitioned a
+    WHERE NOT EXISTS (
+        SELECT 1 FROM responses_unpartitioned r WHERE r.id = a.response_id AND r.application_id IS NOT NULL
+    );
+    IF n_responses + n_answers = 0 THEN
+        RETURN;
+    END IF;
+    CREATE SCHEMA IF NOT EXISTS archive;
+    CREATE TABLE archive.orphan_responses AS
+        SELECT * FROM responses_unpartitioned WHERE application_id IS NULL;
+    CREATE TABLE archive.orphan_answers AS
+        SELECT * FROM answers_unpartitioned a
+        WHERE NOT EXISTS (
+            SELECT 1 FROM responses_unpartitioned r WHERE r.id = a.response_id AND r.application_id IS NOT NULL
+        );
+    RAISE WARNING '% resposta(s) sem aplicação e % answers sem resposta movidas para archive.orphan_responses/orphan_answers',
+        n_responses, n_answers;
+END $$;
+
+INSERT INTO responses (id, application_id, form_id, evaluator_id, created_at, idempotency_key, answer_values)
+SELECT id, application_id, form_id, evaluator_id, created_at, idempotency_key, answer_values
+FROM responses_unpartitioned
+WHERE application_id IS NOT NULL;
+
+INSERT INTO answers (id, application_id, response_id, question_id, value)
+SELECT a.id, r.application_id, a.response_id, a.question_id, a.value
+FROM answers_unpartitioned a
+JOIN responses_unpartitioned r ON r.id = a.response_id
+WHERE r.application_id IS NOT NULL;
+
+DROP TABLE answers_unpartitioned;
+DROP TABLE responses_unpartitioned;
+
+-- 5. Campanhas arquivadas: partições compactadas no schema archive + pontuações pré-calculadas
+CREATE SCHEMA IF NOT EXISTS archive;
+
+CREATE TABLE application_archives (
+    application_id INTEGER PRIMARY KEY REFERENCES applications (id),
+    partition_name VARCHAR NOT NULL,
+    response_count INTEGER NOT NULL,
+    answer_count INTEGER NOT NULL,
+    archived_at INTEGER NOT NULL
+);
+
+-- Mesma contagem por (grupo, valor) que score_applications faz sobre as linhas vivas
+CREATE TABLE application_score_summaries (
+    application_id INTEGER NOT NULL REFERENCES applications (id),
+    group_name VARCHAR NOT NULL,
+    value INTEGER NOT NULL,
+    answers INTEGER NOT NULL,
+    PRIMARY KEY (application_id, group_name, value)
+);
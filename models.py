@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, Float, Table
+from sqlalchemy import Column, Integer, SmallInteger, String, Text, ForeignKey, Float, Table, UniqueConstraint
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
 from database import Base
 import time
@@ -7,7 +8,7 @@ import time
 application_evaluators = Table(
     'application_evaluators', Base.metadata,
     Column('application_id', Integer, ForeignKey('applications.id'), primary_key=True),
-    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True)
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True, index=True)
 )
 
 class User(Base):
@@ -51,7 +52,7 @@ class Question(Base):
     __tablename__ = "questions"
 
     id = Column(Integer, primary_key=True, index=True)
-    form_id = Column(Integer, ForeignKey("forms.id"))
+    form_id = Column(Integer, ForeignKey("forms.id"), index=True)
     group_id = Column(Integer, ForeignKey("question_groups.id"), nullable=True)
     text = Column(Text)
     example = Column(Text, default="")
@@ -87,12 +88,22 @@ class ApplicationGroupWeight(Base):
 
 class Response(Base):
     __tablename__ = "responses"
+    # Particionada por faixa de application_id (migração 0006): no banco a PK é (application_id, id)
 
     id = Column(Integer, primary_key=True, index=True)
-    application_id = Column(Integer, ForeignKey("applications.id"))
+    application_id = Column(Integer, ForeignKey("applications.id"), nullable=False)
     form_id = Column(Integer, ForeignKey("forms.id"))
     evaluator_id = Column(Integer, ForeignKey("users.id"))
-    created_at = Column(Integer, default=lambda: int(time.time()))
+    created_at = Column(Integer, index=True, default=lambda: int(time.time()))
+    idempotency_key = Column(String, nullable=True)  # Idempotency-Key enviada pelo cliente
+    # Layout compacto (ANSWER_STORAGE=packed): valores alinhados às perguntas do form ordenadas por id,
+    # NULL onde não houve resposta. Quando preenchido, a resposta não tem linhas em answers.
+    answer_values = Column(ARRAY(SmallInteger), nullable=True)
+    
+    # Uma avaliação por avaliador e aplicação (alvo do INSERT ... ON CONFLICT)
+    __table_args__ = (
+        UniqueConstraint("application_id", "evaluator_id", name="uq_responses_application_evaluator"),
+    )
     
     application = relationship("Application", back_populates="responses")
     form = relationship("Form", back_populates="responses")
@@ -101,11 +112,42 @@ class Response(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    # Particionada junto com responses; no banco a FK é (application_id, response_id)
 
     id = Column(Integer, primary_key=True, index=True)
-    response_id = Column(Integer, ForeignKey("responses.id"))
-    question_id = Column(Integer, ForeignKey("questions.id"))
+    application_id = Column(Integer, nullable=False)
+    response_id = Column(Integer, ForeignKey("responses.id"), index=True)
+    question_id = Column(Integer, ForeignKey("questions.id"), index=True)
     value = Column(Integer)
     
     response = relationship("Response", back_populates="answers")
     question = relationship("Question")
+
+class AssignmentEvent(Base):
+    __tablename__ = "assignment_events"
+
+    # id é a sequência monotônica usada como cursor do feed de mudanças
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    application_id = Column(Integer, ForeignKey("applications.id"))
+    kind = Column(String)  # assigned, unassigned, completed
+    created_at = Column(Integer, default=lambda: int(time.time()))
+
+class ApplicationArchive(Base):
+    __tablename__ = "application_archives"
+
+    # Campanha encerrada: respostas saíram das partições vivas (archive_campaigns.py)
+    application_id = Column(Integer, ForeignKey("applications.id"), primary_key=True)
+    partition_name = Column(String)
+    response_count = Column(Integer)
+    answer_count = Column(Integer)
+    archived_at = Column(Integer, default=lambda: int(time.time()))
+
+class ApplicationScoreSummary(Base):
+    __tablename__ = "application_score_summaries"
+
+    # Contagem por (grupo, valor) das respostas arquivadas, somada às linhas vivas nos relatórios
+    application_id = Column(Integer, ForeignKey("applications.id"), primary_key=True)
+    group_name = Column(String, primary_key=True)
+    value = Column(Integer, primary_key=True)
+    answers = Column(Integer)
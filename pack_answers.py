@@ -0,0 +1,113 @@
+import argparse
+from sqlalchemy import text
+from database import SessionLocal
+
+# Converte as linhas de answers para o layout compacto responses.answer_values
+# (smallint[] alinhado às perguntas do formulário ordenadas por id).
+# A coluna vem da migração 0004_packed_answers (python schema_migrations.py).
+
+PACK_BATCH = text("""
+    UPDATE responses r
+    SET answer_values = ARRAY(
+        SELECT (
+            SELECT a.value FROM answers a
+            WHERE a.response_id = r.id AND a.question_id = q.id
+            ORDER BY a.id LIMIT 1
+        )::smallint
+        FROM questions q
+        WHERE q.form_id = r.form_id
+        ORDER BY q.id
+    )
+    WHERE r.id > :start AND r.id <= :end
+      AND r.answer_values IS NULL
+      AND EXISTS (SELECT 1 FROM answers a WHERE a.response_id = r.id)
+""")
+
+DELETE_PACKED_ROWS = text("""
+    DELETE FROM answers a
+    USING responses r
+    WHERE a.response_id = r.id
+      AND r.id > :start AND r.id <= :end
+      AND r.answer_values IS NOT NULL
+""")
+
+# Caminho de volta (--unpack): recria as linhas de answers a partir de answer_values e limpa a coluna.
+# Respostas que ainda têm linhas (compactadas com --keep-rows) não são duplicadas.
+UNPACK_BATCH = text("""
+    INSERT INTO answers (application_id, response_id, question_id, value)
+    SELECT r.application_id, r.id, q.id, v.value
+    FROM responses r
+    CROSS JOIN LATERAL unnest(r.answer_values) WITH ORDINALITY AS v(value, pos)
+    JOIN (
+        SELECT id, form_id, row_number() OVER (PARTITION BY form_id ORDER BY id) AS pos
+        FROM questions
+    ) q ON q.form_id = r.form_id AND q.pos = v.pos
+    WHERE r.id > :start AND r.id <= :end
+      AND r.answer_values IS NOT NULL
+      AND v.value IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM answers a WHERE a.response_id = r.id)
+""")
+
+CLEAR_PACKED = text("""
+    UPDATE responses SET answer_values = NULL
+    WHERE id > :start AND id <= :end AND answer_values IS NOT NULL
+""")
+
+def pack_answers(batch_size: int = 5000, keep_rows: bool = False):
+    db = SessionLocal()
+    try:
+        max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM responses")).scalar()
+        print(f"Compactando respostas (max id = {max_id}, lotes de {batch_size})...")
+
+        packed_total = 0
+        deleted_total = 0
+        for start in range(0, max_id, batch_size):
+            end = start + batch_size
+            packed_total += db.execute(PACK_BATCH, {"start": start, "end": end}).rowcount
+            if not keep_rows:
+                deleted_total += db.execute(DELETE_PACKED_ROWS, {"start": start, "end": end}).rowcount
+            # Commit por lote: transações curtas e progresso preservado se interrompido
+            db.commit()
+            print(f" -> ids até {min(end, max_id)}: {packed_total} respostas compactadas, {deleted_total} linhas removidas")
+
+        print("\nSucesso! Respostas convertidas para o layout compacto.")
+        print("Use ANSWER_STORAGE=packed para gravar novas respostas nesse formato.")
+    except Exception as e:
+        print(f"\n[ERRO] Falha ao compactar respostas: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def unpack_answers(batch_size: int = 5000):
+    db = SessionLocal()
+    try:
+        max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM responses")).scalar()
+        print(f"Voltando respostas para linhas de answers (max id = {max_id}, lotes de {batch_size})...")
+
+        rows_total = 0
+        cleared_total = 0
+        for start in range(0, max_id, batch_size):
+            end = start + batch_size
+            rows_total += db.execute(UNPACK_BATCH, {"start": start, "end": end}).rowcount
+            cleared_total += db.execute(CLEAR_PACKED, {"start": start, "end": end}).rowcount
+            db.commit()
+            print(f" -> ids até {min(end, max_id)}: {cleared_total} respostas convertidas, {rows_total} linhas criadas")
+
+        print("\nSucesso! Respostas de volta ao layout em linhas.")
+        print("Use ANSWER_STORAGE=rows (padrão) para gravar novas respostas nesse formato.")
+    except Exception as e:
+        print(f"\n[ERRO] Falha ao converter respostas: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte answers (linhas) para responses.answer_values (smallint[])")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--keep-rows", action="store_true", help="Não apaga as linhas de answers já convertidas")
+    parser.add_argument("--unpack", action="store_true", help="Caminho inverso: answer_values -> linhas de answers")
+    args = parser.parse_args()
+    if args.unpack:
+        unpack_answers(args.batch_size)
+    else:
+        pack_answers(args.batch_size, args.keep_rows)
@@ -0,0 +1,255 @@
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
+
+# Profiler por amostragem sob demanda, por requisição.
+# Um admin pede com o header "X-Profile: 1"; PROFILE_SAMPLE_RATE perfila uma fração das requisições.
+# Uma thread lê a pilha (sys._current_frames) só das threads que estão trabalhando para a requisição
+# perfilada, a cada PROFILE_INTERVAL_MS; as outras requisições não pagam nada além de um ContextVar.
+# Cada perfil vira PROFILE_DIR/<id>.collapsed (formato "a;b;c N" do flamegraph.pl / speedscope) e
+# <id>.json (rota, método, status, duração, amostras); as PROFILE_KEEP mais recentes ficam no disco.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Prefixos de path elegíveis para a amostragem (vazio = todos); o header vale para qualquer rota
+PROFILE_SAMPLE_PATHS = [p for p in os.getenv("PROFILE_SAMPLE_PATHS", "").split(",") if p.strip()]
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_HEADER = b"x-profile"
+MAX_DEPTH = 200
+
+log = logging.getLogger("saan.profiling")
+
+_ID_PATTERN = re.compile(r"^[\w-]+$")
+_ids = itertools.count(1)
+
+class Profile:
+    def __init__(self, method: str, path: str, trigger: str):
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_ids)}"
+        self.method = method
+        self.path = path
+        self.trigger = trigger      # "header" ou "sample"
+        self.route = None
+        self.status = None
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.threads = Counter()    # ident -> registros ativos (a mesma thread pode entrar aninhada)
+        self.stacks = Counter()     # pilha colapsada -> amostras
+        self.samples = 0
+
+    def meta(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "trigger": self.trigger,
+            "startedAt": int(self.started_at),
+            "durationMs": round(self.duration * 1000, 2),
+            "samples": self.samples,
+            "intervalMs": PROFILE_INTERVAL * 1000,
+            "distinctStacks": len(self.stacks),
+        }
+
+_current = ContextVar("saan_profile", default=None)
+
+# --- amostrador ---
+
+_lock = threading.Lock()
+_active = set()
+_sampler = None
+_labels = {}  # code -> rótulo "função (arquivo:linha)"
+
+def frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+    return label
+
+def collapse(frame) -> str:
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        stack.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+def _sample_loop():
+    global _sampler
+    while True:
+        frames = sys._current_frames()
+        # Sob o lock: depois de stop() o perfil não recebe mais amostras e pode ser salvo
+        with _lock:
+            if not _active:
+                _sampler = None
+                return
+            for profile in _active:
+                for ident in profile.threads:
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.stacks[collapse(frame)] += 1
+                        profile.samples += 1
+        del frames
+        time.sleep(PROFILE_INTERVAL)
+
+def start(profile: Profile):
+    global _sampler
+    with _lock:
+        _active.add(profile)
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="saan-profiler", daemon=True)
+            _sampler.start()
+
+def stop(profile: Profile):
+    with _lock:
+        _active.discard(profile)
+
+@contextmanager
+def track():
+    # Marca a thread atual como trabalhando para a requisição perfilada (se houver)
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    with _lock:
+        profile.threads[ident] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            profile.threads[ident] -= 1
+            if profile.threads[ident] <= 0:
+                del profile.threads[ident]
+
+def call(fn, *args, **kwargs):
+    # Para trabalho mandado ao threadpool fora da rota: run_in_threadpool(profiling.call, fn, ...)
+    with track():
+        return fn(*args, **kwargs)
+
+def profiled(endpoint):
+    if inspect.iscoroutinefunction(endpoint):
+        # Rota async: amostra o event loop enquanto ela roda (inclui o que outras requisições
+        # fizerem no loop nesse meio tempo; em idle aparece o select do loop)
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            with track():
+                return await endpoint(*args, **kwargs)
+    else:
+        # Rota sync: roda numa thread do threadpool; só ela é amostrada
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            with track():
+                return endpoint(*args, **kwargs)
+    return wrapper
+
+class ProfiledRoute(APIRoute):
+    # app.router.route_class: registra a thread de cada endpoint no perfil da requisição
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, profiled(endpoint), **kwargs)
+
+# --- arquivos ---
+
+def save(profile: Profile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, profile.id)
+    with open(base + ".collapsed", "w", encoding="utf-8") as f:
+        for stack, n in profile.stacks.most_common():
+            f.write(f"{stack} {n}\n")
+    with open(base + ".json", "w", encoding="utf-8") as f:
+        json.dump(profile.meta(), f, ensure_ascii=False)
+    prune()
+
+def list_profiles() -> list:
+    # Mais recentes primeiro
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    found = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                    found.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(found, key=lambda m: (m.get("startedAt", 0), m.get("id", "")), reverse=True)
+
+def prune():
+    for meta in list_profiles()[PROFILE_KEEP:]:
+        for ext in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, meta["id"] + ext))
+            except OSError:
+                pass
+
+def profile_path(profile_id: str):
+    # Só ids gerados aqui (sem "/" nem ".."): o id vem da URL
+    if not _ID_PATTERN.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + ".collapsed")
+    return path if os.path.exists(path) else None
+
+# --- middleware ---
+
+class ProfilerMiddleware:
+    def __init__(self, app, is_admin):
+        # is_admin(scope) -> bool: só admin pode pedir perfil pelo header
+        self.app = app
+        self.is_admin = is_admin
+
+    def trigger(self, scope):
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                if value.strip().lower() in (b"1", b"true", b"yes", b"on") and self.is_admin(scope):
+                    return "header"
+                break
+        path = scope["path"]
+        if PROFILE_SAMPLE_RATE > 0 and not path.startswith("/admin/profiles"):
+            if (not PROFILE_SAMPLE_PATHS or any(path.startswith(p) for p in PROFILE_SAMPLE_PATHS)) and random.random() < PROFILE_SAMPLE_RATE:
+                return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        trigger = self.trigger(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(scope["method"], scope["path"], trigger)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        start(profile)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.duration = time.perf_counter() - started
+            stop(profile)
+            _current.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None) or "unmatched"
+            profile.status = status[0]
+            await run_in_threadpool(save, profile)
+            log.info("Perfil salvo", extra=profile.meta())
@@ -0,0 +1,97 @@
+import logging
+import os
+import re
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Auditoria de consultas por requisição (QUERY_AUDIT=1, para desenvolvimento e verify_query_budgets.py).
+# Conta os statements de cada requisição, agrupa por formato (mesmo SQL com parâmetros diferentes)
+# e registra lazy loads do ORM. Acusa a rota quando ela passa do orçamento declarado em
+# main.QUERY_BUDGETS, repete o mesmo formato várias vezes (N+1) ou faz lazy load dentro de laço.
+QUERY_AUDIT = os.getenv("QUERY_AUDIT", "0").strip().lower() in ("1", "true", "yes", "on")
+REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "3"))  # mesmo formato > N vezes = N+1
+RECENT_AUDITS = 200
+
+log = logging.getLogger("saan.query_audit")
+
+# Listas de parâmetros (IN expandido, VALUES multi-linha) viram um marcador só
+_PARAM_LIST = re.compile(r"(%\(\w+\)s|\$\d+|\?)(\s*,\s*(%\(\w+\)s|\$\d+|\?))+")
+_VALUES_LIST = re.compile(r"(\([^()]*\))(\s*,\s*\([^()]*\))+")
+_SPACES = re.compile(r"\s+")
+_PARAM_NUMBER = re.compile(r"(%\(\w+?)_\d+(\)s)")
+
+def statement_shape(statement: str) -> str:
+    shape = _SPACES.sub(" ", statement).strip()
+    shape = _PARAM_NUMBER.sub(r"\1\2", shape)
+    shape = _PARAM_LIST.sub("<params>", shape)
+    return _VALUES_LIST.sub(r"\1, ...", shape)
+
+class RequestAudit:
+    __slots__ = ("statements", "lazy_loads")
+
+    def __init__(self):
+        self.statements = Counter()   # formato -> execuções
+        self.lazy_loads = Counter()   # "Classe.relacionamento" -> lazy loads
+
+    @property
+    def count(self) -> int:
+        return sum(self.statements.values())
+
+    def problems(self, budget):
+        found = []
+        if budget is not None and self.count > budget:
+            found.append(f"{self.count} consultas (orçamento {budget})")
+        for shape, n in self.statements.items():
+            if n > REPEAT_THRESHOLD:
+                found.append(f"mesmo formato {n}x (N+1?): {shape[:160]}")
+        for attr, n in self.lazy_loads.items():
+            if n > 1:
+                found.append(f"lazy load de {attr} {n}x (dentro de laço?)")
+        return found
+
+_current = ContextVar("saan_query_audit", default=None)
+
+# Últimas requisições auditadas: (método, rota, RequestAudit, problemas); usado pelo verify
+recent = deque(maxlen=RECENT_AUDITS)
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        audit = _current.get()
+        if audit is not None:
+            audit.statements[statement_shape(statement)] += 1
+
+@event.listens_for(Session, "do_orm_execute")
+def _orm_execute(orm_execute_state):
+    audit = _current.get()
+    if audit is None or not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    path = orm_execute_state.loader_strategy_path
+    attr = f"{orm_execute_state.lazy_loaded_from.class_.__name__}.{path[-1].key if path else '?'}"
+    audit.lazy_loads[attr] += 1
+
+class QueryAuditMiddleware:
+    def __init__(self, app, budgets):
+        # budgets: {"GET /forms": 2, ...}
+        self.app = app
+        self.budgets = budgets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        audit = RequestAudit()
+        token = _current.set(audit)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current.reset(token)
+            # O roteador do FastAPI deixa a rota no scope
+            template = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            problems = audit.problems(self.budgets.get(f"{method} {template}"))
+            recent.append((method, template, audit, problems))
+            for problem in problems:
+                log.warning("Orçamento de consultas", extra={"method": method, "route": template, "problem": problem})
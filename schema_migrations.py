@@ -0,0 +1,134 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import engine
+
+# Migrações versionadas do schema: arquivos migrations/NNNN_nome.sql aplicados em ordem,
+# cada um na sua transação, registrados em schema_migrations.
+#   python schema_migrations.py              aplica as pendentes
+#   python schema_migrations.py --status     mostra versão atual e pendentes
+#   python schema_migrations.py --wait 60    espera o banco aceitar conexões antes (entrypoint)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+MIGRATION_LOCK_ID = 7301  # pg_advisory_lock: só um processo migra por vez
+
+CREATE_VERSION_TABLE = text("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+""")
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+def load_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+LATEST_VERSION = max((v for v, _, _ in load_migrations()), default=0)
+
+def applied_versions(conn):
+    exists = conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar()
+    if not exists:
+        return set()
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def current_version(conn) -> int:
+    return max(applied_versions(conn), default=0)
+
+def wait_for_db(bind=engine, timeout: float = 60.0, interval: float = 0.5):
+    # Prova de prontidão real: tenta conectar até o banco responder (sem sleep fixo)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with bind.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except OperationalError as e:
+            if time.monotonic() >= deadline:
+                raise
+            print(f"[MIGRATE] Banco ainda não disponível: {str(e.orig).strip().splitlines()[0]}")
+            time.sleep(interval)
+
+def apply_migrations(bind=engine) -> int:
+    with bind.connect() as conn:
+        try:
+            with conn.begin():
+                conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+                conn.execute(CREATE_VERSION_TABLE)
+                done = applied_versions(conn)
+            applied = 0
+            for version, name, path in load_migrations():
+                if version in done:
+                    continue
+                print(f"[MIGRATE] Aplicando {version:04d}_{name}...")
+                with open(path, "r") as f:
+                    sql = f.read()
+                with conn.begin():
+                    # Cursor DBAPI sem parâmetros: o SQL pode ter % (format() em funções plpgsql)
+                    raw = conn.connection
+                    del raw.notices[:]
+                    raw.cursor().execute(sql)
+                    # RAISE WARNING das migrações (ex.: linhas movidas para o schema archive);
+                    # os NOTICE de "already exists, skipping" ficam de fora
+                    warnings = [n.split(":", 1)[1].strip() for n in raw.notices if n.startswith("WARNING")]
+                    conn.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                        {"v": version, "n": name}
+                    )
+                for warning in warnings:
+                    print(f"[MIGRATE]   {warning}")
+                applied += 1
+            print(f"[MIGRATE] Schema na versão {LATEST_VERSION} ({applied} migração(ões) aplicada(s))")
+            return applied
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+            conn.commit()
+
+def check_schema(bind=engine):
+    # Usado na subida do servidor: uma consulta, nenhuma DDL
+    with bind.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Schema do banco na versão {version}, o código espera {LATEST_VERSION}. "
+            f"Rode: python schema_migrations.py"
+        )
+    return version
+
+def print_status(bind=engine):
+    with bind.connect() as conn:
+        done = applied_versions(conn)
+    print(f"Versão atual: {max(done, default=0)} (código: {LATEST_VERSION})")
+    for version, name, _ in load_migrations():
+        print(f"  [{'x' if version in done else ' '}] {version:04d}_{name}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrações versionadas do schema do SAAN")
+    parser.add_argument("--status", action="store_true", help="Só mostra as migrações aplicadas e pendentes")
+    parser.add_argument("--wait", type=float, default=0, metavar="SEGUNDOS", help="Espera o banco ficar pronto antes")
+    args = parser.parse_args()
+
+    try:
+        if args.wait:
+            wait_for_db(timeout=args.wait)
+        if args.status:
+            print_status()
+        else:
+            apply_migrations()
+    except OperationalError as e:
+        print(f"[MIGRATE] Banco indisponível: {e.orig}")
+        sys.exit(1)
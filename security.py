@@ -0,0 +1,10 @@
+import hashlib
+
+# Hash de senha, compartilhado pela API (main.py) e pelos scripts offline (generate_dataset.py),
+# que não devem importar o app inteiro só para isso.
+
+def hash_password(password: str, salt: str = "static-salt") -> str:
+    return hashlib.sha256((salt + password).encode()).hexdigest()
+
+def verify_password(password: str, password_hash: str) -> bool:
+    return hash_password(password) == password_hash
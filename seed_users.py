@@ -1,13 +1,11 @@
 import json
 import os
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
+from database import SessionLocal
 import models
 
 def seed_users():
-    # Ensure tables exist
-    models.Base.metadata.create_all(bind=engine)
-    
+    # Tabelas criadas por schema_migrations.py (rodado antes no entrypoint)
     db = SessionLocal()
     try:
         if not os.path.exists("users.json"):
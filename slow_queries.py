@@ -0,0 +1,198 @@
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool
+
+import logs
+import tracing
+from query_audit import statement_shape
+
+# Captura de consultas lentas: todo statement acima de SLOW_QUERY_MS fica registrado com o formato
+# do SQL, o formato dos parâmetros (tipos, nunca valores), a rota, o request id e o trace id.
+# Parte delas ganha um EXPLAIN rodado depois, numa thread e conexão próprias: amostrado
+# (SLOW_QUERY_EXPLAIN_RATE), no máximo um por formato a cada SLOW_QUERY_EXPLAIN_INTERVAL e com fila
+# limitada, então uma rajada de lentidão não vira rajada de EXPLAINs.
+# Por padrão é só o plano estimado (EXPLAIN sem ANALYZE: planeja, não executa). Com
+# SLOW_QUERY_EXPLAIN_ANALYZE=1 os SELECTs recebem EXPLAIN (ANALYZE, BUFFERS), que executa a consulta
+# lenta de novo, e custa tanto quanto ela; escritas nunca recebem ANALYZE.
+SLOW_QUERY_ENABLED = os.getenv("SLOW_QUERY_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_KEEP = int(os.getenv("SLOW_QUERY_KEEP", "200"))
+SLOW_QUERY_EXPLAIN_ANALYZE = os.getenv("SLOW_QUERY_EXPLAIN_ANALYZE", "0").strip().lower() in ("1", "true", "yes", "on")
+# Com ANALYZE, use uma fração baixa (ex: 0.05): cada amostra repete a consulta lenta no banco
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "1"))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "300"))  # segundos por formato
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS = int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "10000"))
+EXPLAIN_QUEUE_SIZE = 50
+MAX_STATEMENT = 4000
+
+_WRITE = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|TRUNCATE|COPY|CREATE|ALTER|DROP|NEXTVAL|SETVAL)\b|\bFOR\s+(UPDATE|SHARE|NO KEY UPDATE|KEY SHARE)\b", re.IGNORECASE)
+_NUMERIC_PARAM = re.compile(r"\$(\d+)")
+
+log = logging.getLogger("saan.db.slow")
+
+# Capturas mais recentes (dicts); "plan" é preenchido depois pela thread de EXPLAIN
+captures = deque(maxlen=SLOW_QUERY_KEEP)
+
+def type_name(value) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (list, tuple)):
+        inner = type_name(value[0]) if value else "?"
+        return f"{inner}[{len(value)}]"
+    return type(value).__name__
+
+def parameters_shape(parameters, executemany: bool = False):
+    if executemany:
+        rows = list(parameters)
+        return {"rows": len(rows), "row": parameters_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {k: type_name(v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type_name(v) for v in parameters]
+    return None
+
+def current_route():
+    scope = logs.request_scope.get()
+    if scope is None:
+        return f"[{threading.current_thread().name}]"  # fora de requisição (fila de ingestão, scripts)
+    route = getattr(scope.get("route"), "path", None) or scope.get("path")
+    return f"{scope.get('method')} {route}"
+
+# --- EXPLAIN em segundo plano ---
+
+_explain_queue = queue.Queue(EXPLAIN_QUEUE_SIZE)
+_explain_engines = {}
+_last_explain = OrderedDict()  # formato -> monotonic do último EXPLAIN, do mais antigo ao mais recente
+_lock = threading.Lock()
+_worker = None
+
+def to_pyformat(statement: str, parameters):
+    # Statements do asyncpg usam $1, $2...; o EXPLAIN roda no psycopg2 (%s)
+    if not isinstance(parameters, (list, tuple)) or not _NUMERIC_PARAM.search(statement):
+        return statement, parameters
+    ordered = []
+
+    def replace(match):
+        ordered.append(parameters[int(match.group(1)) - 1])
+        return "%s"
+
+    return _NUMERIC_PARAM.sub(replace, statement.replace("%", "%%")), tuple(ordered)
+
+def explain_engine(url):
+    # Uma engine sem pool por banco de origem (primário ou réplica), sempre via psycopg2
+    key = url.render_as_string(hide_password=False)
+    engine = _explain_engines.get(key)
+    if engine is None:
+        engine = _explain_engines[key] = create_engine(url.set(drivername="postgresql+psycopg2"), poolclass=NullPool)
+    return engine
+
+def run_explain(url, statement: str, parameters) -> str:
+    analyze = SLOW_QUERY_EXPLAIN_ANALYZE and not _WRITE.search(statement)
+    options = "ANALYZE, BUFFERS" if analyze else "VERBOSE"
+    statement, parameters = to_pyformat(statement, parameters)
+    with explain_engine(url).connect() as conn:
+        # Nunca comita: sai do with com rollback
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {SLOW_QUERY_EXPLAIN_TIMEOUT_MS}")
+        rows = conn.exec_driver_sql(f"EXPLAIN ({options}) {statement}", parameters).fetchall()
+    return "\n".join(row[0] for row in rows)
+
+def _explain_loop():
+    while True:
+        capture, url, statement, parameters = _explain_queue.get()
+        try:
+            capture["plan"] = run_explain(url, statement, parameters)
+        except Exception as e:
+            capture["plan"] = None
+            capture["planError"] = f"{e.__class__.__name__}: {str(getattr(e, 'orig', e)).strip()}"[:500]
+        capture["planAt"] = int(time.time())
+
+def request_explain(capture: dict, url, statement: str, parameters):
+    global _worker
+    shape = capture["statement"]
+    now = time.monotonic()
+    with _lock:
+        last = _last_explain.get(shape)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return
+        if random.random() >= SLOW_QUERY_EXPLAIN_RATE:
+            return
+        try:
+            _explain_queue.put_nowait((capture, url, statement, parameters))
+        except queue.Full:
+            return
+        _last_explain[shape] = now
+        _last_explain.move_to_end(shape)
+        # Formatos variam (listas IN, VALUES multi-linha): os que já passaram do intervalo saem
+        while _last_explain and now - next(iter(_last_explain.values())) >= SLOW_QUERY_EXPLAIN_INTERVAL:
+            _last_explain.popitem(last=False)
+        capture["plan"] = "pendente"
+        if _worker is None:
+            _worker = threading.Thread(target=_explain_loop, name="saan-slow-explain", daemon=True)
+            _worker.start()
+
+# --- captura ---
+
+def record(conn, statement: str, parameters, executemany: bool, elapsed: float):
+    shape = statement_shape(statement)[:MAX_STATEMENT]
+    capture = {
+        "at": int(time.time()),
+        "durationMs": round(elapsed * 1000, 2),
+        "route": current_route(),
+        "requestId": logs.request_id.get(),
+        "traceId": tracing.current_trace_id(),
+        "database": conn.engine.url.render_as_string(hide_password=True),
+        "statement": shape,
+        "params": parameters_shape(parameters, executemany),
+        "plan": None,
+    }
+    captures.append(capture)
+    logs.log_limited(log, capture["route"], logging.WARNING, "Consulta lenta", durationMs=capture["durationMs"], route=capture["route"], statement=shape[:300])
+    if not executemany:
+        request_explain(capture, conn.engine.url, statement, parameters)
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("saan_slow_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["saan_slow_start"].pop()
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            record(conn, statement, parameters, executemany, elapsed)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("saan_slow_start"):
+            conn.info["saan_slow_start"].pop()
+
+def report(route=None, limit: int = 50) -> dict:
+    # Resumo por (rota, formato): contagem, tempo total/máximo e o plano mais recente; mais o histórico
+    recent = [c for c in list(captures) if route is None or c["route"] == route]
+    summary = {}
+    for c in recent:
+        item = summary.setdefault((c["route"], c["statement"]), {
+            "route": c["route"], "statement": c["statement"], "params": c["params"],
+            "count": 0, "totalMs": 0.0, "maxMs": 0.0, "lastAt": 0, "plan": None, "planAt": None,
+        })
+        item["count"] += 1
+        item["totalMs"] = round(item["totalMs"] + c["durationMs"], 2)
+        item["maxMs"] = max(item["maxMs"], c["durationMs"])
+        item["lastAt"] = max(item["lastAt"], c["at"])
+        if c.get("planAt") and c.get("plan") and (item["planAt"] or 0) <= c["planAt"]:
+            item["plan"], item["planAt"] = c["plan"], c["planAt"]
+    return {
+        "thresholdMs": SLOW_QUERY_MS,
+        "explainAnalyze": SLOW_QUERY_EXPLAIN_ANALYZE,
+        "summary": sorted(summary.values(), key=lambda i: i["totalMs"], reverse=True)[:limit],
+        "recent": list(reversed(recent))[:limit],
+    }
@@ -0,0 +1,349 @@
+import atexit
+import functools
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+import metrics
+from query_audit import statement_shape
+
+# Tracing distribuído: spans da requisição, da autenticação, de cada statement SQL, da pontuação
+# e da renderização do PDF. Propaga e aceita o header W3C "traceparent", então o trace continua
+# vindo de um proxy/cliente instrumentado. Spans prontos vão para uma fila limitada e uma thread
+# entrega ao exportador em lotes (fila cheia descarta e conta, nunca segura a requisição).
+#   TRACE_EXPORTER=none | memory | file | log | modulo:Classe   (none = desligado)
+#   TRACE_FILE=traces.jsonl        (exportador file: um span JSON por linha)
+#   TRACE_SAMPLE_RATE=1.0          (fração das requisições sem traceparent que viram trace)
+# Fora de uma requisição rastreada, span() não faz nada: scripts e benchmarks não pagam.
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").strip()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))  # por trace: N+1 não explode o exportador
+TRACE_QUEUE_SIZE = 10_000
+TRACE_FLUSH_INTERVAL = 1.0
+MEMORY_TRACES = 500
+MAX_STATEMENT = 1000
+
+TRACING_ENABLED = TRACE_EXPORTER.lower() not in ("", "none", "0", "off")
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+log = logging.getLogger("saan.tracing")
+
+class Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = 0  # spans criados (limite TRACE_MAX_SPANS)
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_error(self, exc: BaseException):
+        self.error = f"{exc.__class__.__name__}: {exc}"[:500]
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _processor.submit(self)
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+_current = ContextVar("saan_span", default=None)
+
+def current_span():
+    return _current.get()
+
+def current_trace_id():
+    s = _current.get()
+    return s.trace_id if s is not None else None
+
+def current_traceparent():
+    # Para levar o trace a trabalho em segundo plano (ex.: registro da fila de ingestão)
+    s = _current.get()
+    return s.traceparent if s is not None else None
+
+def parse_traceparent(value):
+    # -> (trace_id, parent_span_id, sampled) ou None
+    match = _TRACEPARENT.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+def start_span(name: str, parent=None, **attributes):
+    # Filho de `parent` (ou do span atual); sem trace ativo devolve None
+    parent = parent or _current.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    if trace.spans >= TRACE_MAX_SPANS:
+        return None
+    trace.spans += 1
+    return Span(trace, name, parent.span_id, attributes)
+
+def start_trace(name: str, traceparent=None, **attributes) -> Span:
+    # Span raiz; com traceparent válido continua o trace remoto como filho do span de lá
+    remote = parse_traceparent(traceparent)
+    trace = Trace(remote[0] if remote else secrets.token_hex(16))
+    trace.spans = 1
+    return Span(trace, name, remote[1] if remote else None, attributes)
+
+@contextmanager
+def activate(s):
+    # Torna `s` o span atual (filhos e statements SQL penduram nele) e fecha no fim
+    if s is None:
+        yield None
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.set_error(e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+def span(name: str, **attributes):
+    # with tracing.span("pdf.render", rows=10): ...
+    return activate(start_span(name, **attributes))
+
+def traced(name: str):
+    # Decorador para funções de estágio (jwt_decode, pontuação, PDF); sem trace ativo chama direto
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def background(name: str, traceparents, **attributes):
+    # Trabalho em segundo plano que atende várias requisições (lote da fila de ingestão): o span
+    # entra no trace da primeira e lista os outros traces em "links"
+    parents = [p for p in (parse_traceparent(tp) for tp in traceparents) if p and p[2]]
+    if not TRACING_ENABLED or not parents:
+        return activate(None)
+    first = parents[0]
+    links = sorted({trace_id for trace_id, _, _ in parents[1:]} - {first[0]})
+    if links:
+        attributes["links"] = links
+    return activate(start_trace(name, f"00-{first[0]}-{first[1]}-01", **attributes))
+
+# --- exportadores ---
+
+class MemoryExporter:
+    # Desenvolvimento: últimos MEMORY_TRACES traces, consultáveis em GET /admin/traces
+    def __init__(self, max_traces: int = MEMORY_TRACES):
+        self.max_traces = max_traces
+        self._traces = OrderedDict()  # trace_id -> [span dict]
+        self._lock = threading.Lock()
+
+    def export(self, spans):
+        with self._lock:
+            for s in spans:
+                self._traces.setdefault(s["traceId"], []).append(s)
+                self._traces.move_to_end(s["traceId"])
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def traces(self, limit: int = 50):
+        with self._lock:
+            items = list(self._traces.items())[-limit:]
+        return [{"traceId": t, "spans": sorted(spans, key=lambda s: s["startTimeUnixNano"])} for t, spans in reversed(items)]
+
+    def trace(self, trace_id: str):
+        with self._lock:
+            spans = list(self._traces.get(trace_id, []))
+        return sorted(spans, key=lambda s: s["startTimeUnixNano"])
+
+class FileExporter:
+    def __init__(self, path: str = TRACE_FILE):
+        self.path = path
+
+    def export(self, spans):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s, ensure_ascii=False, default=str) + "\n")
+
+class LogExporter:
+    # Um registro por span no logger saan.tracing (que já é assíncrono, ver logs.py)
+    def export(self, spans):
+        for s in spans:
+            log.info(s["name"], extra={"span": s})
+
+EXPORTERS = {"memory": MemoryExporter, "file": FileExporter, "log": LogExporter}
+
+def load_exporter(name: str):
+    # Nome conhecido ou "pacote.modulo:Classe" com um método export(lista de dicts)
+    if name.lower() in EXPORTERS:
+        return EXPORTERS[name.lower()]()
+    module, _, cls = name.partition(":")
+    return getattr(importlib.import_module(module), cls)()
+
+class BatchProcessor:
+    def __init__(self):
+        self.exporter = None
+        self._queue = queue.Queue(TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._export_lock = threading.Lock()
+
+    def start(self, exporter):
+        self.exporter = exporter
+        self._thread = threading.Thread(target=self._run, name="saan-trace-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def submit(self, s: Span):
+        if self.exporter is None:
+            return
+        try:
+            self._queue.put_nowait(s)
+        except queue.Full:
+            metrics.registry.inc("saan_trace_spans_dropped_total", ())
+
+    def flush(self):
+        # Entrega o que estiver na fila (também usado pelos testes antes de ler o MemoryExporter)
+        with self._export_lock:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait().to_dict())
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception:
+                    log.exception("Falha ao exportar spans", extra={"spans": len(batch)})
+
+    def _run(self):
+        while True:
+            time.sleep(TRACE_FLUSH_INTERVAL)
+            self.flush()
+
+_processor = BatchProcessor()
+exporter = None
+
+def setup():
+    global exporter
+    if TRACING_ENABLED and exporter is None:
+        exporter = load_exporter(TRACE_EXPORTER)
+        _processor.start(exporter)
+
+def flush():
+    if exporter is not None:
+        _processor.flush()
+
+# --- banco: um span por statement ---
+
+def instrument_engine(sync_engine):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        s = start_span("db.query")
+        if s is not None:
+            s.set(**{"db.system": "postgresql", "db.statement": statement_shape(statement)[:MAX_STATEMENT], "db.executemany": executemany})
+        conn.info.setdefault("saan_trace_spans", []).append(s)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        s = conn.info["saan_trace_spans"].pop()
+        if s is not None:
+            s.set(**{"db.rows": cursor.rowcount})
+            s.end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("saan_trace_spans"):
+            s = conn.info["saan_trace_spans"].pop()
+            if s is not None:
+                s.set_error(exception_context.original_exception)
+                s.end()
+
+# --- middleware ---
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        remote = parse_traceparent(traceparent)
+        sampled = remote[2] if remote else random.random() < TRACE_SAMPLE_RATE
+        if not sampled:
+            return await self.app(scope, receive, send)
+
+        root = start_trace(f"{scope['method']} {scope['path']}", traceparent, **{"http.method": scope["method"], "http.target": scope["path"]})
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set(**{"http.status_code": message["status"]})
+                message["headers"] = list(message.get("headers", [])) + [(b"traceparent", root.traceparent.encode())]
+            await send(message)
+
+        with activate(root):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                # Nome pelo template da rota (cardinalidade baixa), como em metrics.py
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                    root.set(**{"http.route": route})
+                if root.attributes.get("http.status_code", 500) >= 500 and root.error is None:
+                    root.error = "HTTP 5xx"
@@ -0,0 +1,160 @@
+import argparse
+import os
+import sys
+
+from sqlalchemy.engine import make_url
+
+from verify_query_plans import DATABASE_URL, recreate_database, drop_database
+
+# Orçamento de consultas por rota (main.QUERY_BUDGETS) e detecção de N+1.
+# Cria um banco descartável (<banco>_budgets), monta uma fixture pela API com várias aplicações,
+# avaliadores e respostas (laços N+1 aparecem como o mesmo formato de consulta repetido) e chama
+# as rotas com QUERY_AUDIT=1. Falha se alguma rota passar do orçamento, repetir consultas ou fizer
+# lazy load dentro de laço.
+#   python verify_query_budgets.py
+#   python verify_query_budgets.py --verbose --keep
+
+PASSWORD = "budget123"
+EVALUATORS = 6
+FORMS = 3
+APPS_PER_FORM = 2
+
+def log(msg, status="INFO"):
+    print(f"[{status}] {msg}")
+
+def login(main, username, role):
+    from fastapi.testclient import TestClient
+    client = TestClient(main.app)
+    client.post("/auth/register", json={"username": username, "password": PASSWORD, "role": role})
+    r = client.post("/auth/login", json={"username": username, "password": PASSWORD})
+    assert r.status_code == 200, r.text
+    return client
+
+def build_fixture(main):
+    admin = login(main, "budget_admin", "admin")
+    engineer = login(main, "budget_eng", "engenheiro")
+    stakeholder = login(main, "budget_stake", "stakeholder")
+    names = [f"budget_eval_{i}" for i in range(EVALUATORS)]
+    evaluators = [login(main, name, "avaliador") for name in names]
+
+    app_ids = []
+    for f in range(FORMS):
+        r = admin.post("/forms", json={"title": f"Budget {f}", "questions": [
+            {"text": f"Q{q}", "scaleType": "5-point", "group": main.STANDARD_GROUPS[q % 3]} for q in range(6)
+        ]})
+        assert r.status_code == 200, r.text
+        form_id = r.json()["formId"]
+        for a in range(APPS_PER_FORM):
+            r = engineer.post("/applications", json={"name": f"Budget App {f}-{a}", "appType": "web", "formId": form_id, "evaluators": names})
+            assert r.status_code == 200, r.text
+            app_ids.append(r.json()["application"]["id"])
+
+    # Metade dos avaliadores responde tudo; a outra metade fica com atribuições pendentes
+    for client in evaluators[: EVALUATORS // 2]:
+        for task in client.get("/my-assignments").json():
+            r = client.post("/responses", json={
+                "applicationId": task["applicationId"], "formId": task["formId"],
+                "answers": [{"questionId": q["id"], "value": 1 + q["id"] % 5} for q in task["form"]["questions"]]
+            })
+            assert r.status_code == 200, r.text
+    return admin, engineer, stakeholder, evaluators, names, app_ids
+
+def run_checks(verbose: bool):
+    import main
+    import query_audit
+
+    admin, engineer, stakeholder, evaluators, names, app_ids = build_fixture(main)
+    pending = evaluators[-1]
+    tasks = pending.get("/my-assignments").json()
+
+    def answers(task):
+        return [{"questionId": q["id"], "value": 3} for q in task["form"]["questions"]]
+
+    def cold(call):
+        # Primeira submissão de cada formulário depois de subir: validador fora do cache
+        def run():
+            main._form_validators.clear()
+            return call()
+        return run
+
+    calls = [
+        lambda: admin.get("/forms"),
+        lambda: admin.get("/forms", params={"fields": "id,title"}),
+        lambda: admin.get("/applications"),
+        lambda: admin.get("/users"),
+        lambda: admin.get("/auth/me"),
+        lambda: pending.get("/my-assignments"),
+        lambda: pending.get("/my-assignments/changes", params={"cursor": 0, "timeout": 0}),
+        lambda: pending.post("/responses", json={"applicationId": tasks[0]["applicationId"], "formId": tasks[0]["formId"], "answers": answers(tasks[0])}),
+        lambda: pending.post("/responses/batch", json={"responses": [
+            {"applicationId": t["applicationId"], "formId": t["formId"], "answers": answers(t)} for t in tasks[1:4]
+        ]}),
+        cold(lambda: pending.post("/responses", json={"applicationId": tasks[4]["applicationId"], "formId": tasks[4]["formId"], "answers": answers(tasks[4])})),
+        cold(lambda: pending.post("/responses/batch", json={"responses": [
+            {"applicationId": t["applicationId"], "formId": t["formId"], "answers": answers(t)} for t in tasks[5:]
+        ]})),
+        lambda: stakeholder.get("/reports/application-score", params={"applicationId": app_ids[0]}),
+        lambda: stakeholder.get("/reports/application-score", params={"name": "Budget App 0-0"}),
+        lambda: admin.get("/reports/export-pdf", params={"applicationId": app_ids[0]}),
+        lambda: engineer.put("/assignments", json={"assignments": [
+            {"applicationId": a, "evaluators": names[: EVALUATORS - 1]} for a in app_ids
+        ]}),
+        lambda: engineer.post("/applications", json={"name": "Budget App extra", "appType": "mobile", "formId": tasks[0]["formId"], "evaluators": names}),
+        lambda: admin.post("/forms", json={"title": "Budget extra", "questions": [
+            {"text": f"Q{q}", "scaleType": "5-point", "group": main.STANDARD_GROUPS[q % 4]} for q in range(12)
+        ]}),
+        lambda: admin.post("/auth/login", json={"username": "budget_admin", "password": PASSWORD}),
+    ]
+
+    failures = 0
+    for call in calls:
+        query_audit.recent.clear()
+        r = call()
+        method, template, audit, problems = query_audit.recent[-1]
+        label = f"{method} {template}"
+        budget = main.QUERY_BUDGETS.get(label)
+        if r.status_code >= 400:
+            failures += 1
+            log(f"{label} respondeu {r.status_code}: {r.text[:200]}", "FAIL")
+            continue
+        if budget is None:
+            problems = problems + ["rota sem orçamento em main.QUERY_BUDGETS"]
+        if problems:
+            failures += 1
+            log(f"{label}: {audit.count} consultas", "FAIL")
+            for problem in problems:
+                print(f"    {problem}")
+        else:
+            log(f"{label}: {audit.count}/{budget} consultas", "PASS")
+        if verbose or problems:
+            for shape, n in audit.statements.most_common():
+                print(f"    {n}x {shape[:140]}")
+
+    log(f"{len(calls)} rotas verificadas, {failures} com problema", "ERROR" if failures else "INFO")
+    return failures == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Falha se rotas passarem do orçamento de consultas ou tiverem N+1")
+    parser.add_argument("--verbose", action="store_true", help="mostra os formatos de consulta de cada rota")
+    parser.add_argument("--keep", action="store_true", help="Não apaga o banco de teste no final")
+    args = parser.parse_args()
+
+    budgets_url = make_url(DATABASE_URL)
+    budgets_url = budgets_url.set(database=f"{budgets_url.database}_budgets")
+    recreate_database(budgets_url)
+    # main/database leem o ambiente na importação
+    os.environ["DATABASE_URL"] = budgets_url.render_as_string(hide_password=False)
+    os.environ["QUERY_AUDIT"] = "1"
+
+    ok = False
+    try:
+        import database
+        from schema_migrations import apply_migrations
+        apply_migrations(database.engine)
+        ok = run_checks(args.verbose)
+    finally:
+        import database
+        database.engine.dispose()
+        if not args.keep:
+            drop_database(budgets_url)
+    sys.exit(0 if ok else 1)